@@ -4,9 +4,17 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from openai import OpenAI
 from dotenv import load_dotenv
 import uuid
-from collections import defaultdict
+import queue
+import socket
+import atexit
 from file_manager import FileManager
-from rag_manager import get_rag_manager
+from chat_store import SQLiteChatStore, MemoryChatStore
+from conversation_manager import ConversationManager
+from context_packer import pack_context
+from stream_coalescer import StreamCoalescer
+from rag_manager import get_rag_manager, start_rag_manager, peek_rag_manager, get_rag_status
+from ingestion_jobs import IngestionJobManager
+from rag_indexer import BackgroundIndexer
 
 # Load environment variables
 load_dotenv()
@@ -35,16 +43,124 @@ if not api_key:
 
 client = OpenAI(api_key=api_key)
 
-# Store conversation history
-conversations = {}
-# Store message history with IDs
-message_history = defaultdict(list)
+CHAT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant that speaks Hungarian."
+# Token budget for retrieved document context, per turn
+RAG_CONTEXT_TOKENS = 1200
+# Streamed deltas are sent at most every STREAM_FLUSH_INTERVAL seconds or once STREAM_FLUSH_BYTES are waiting
+STREAM_FLUSH_INTERVAL = 0.04
+STREAM_FLUSH_BYTES = 512
+
+def summarize_turns(summary, turns):
+    """Fold older conversation turns into the running summary (called from a worker thread)"""
+    transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    response = client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "You maintain a running summary of a conversation between a user and an assistant. "
+                "Merge the previous summary and the new turns into one concise summary in the language "
+                "of the conversation. Keep facts, names, numbers, decisions and open questions."
+            )},
+            {"role": "user", "content": f"Previous summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        temperature=0.2,
+        max_tokens=400
+    )
+    return response.choices[0].message.content
+
+# Chat history store: SQLite (WAL, write-behind) by default, CHAT_STORE=memory keeps it in-process only
+if os.getenv('CHAT_STORE', 'sqlite') == 'memory':
+    chat_store = MemoryChatStore()
+else:
+    chat_store = SQLiteChatStore(os.getenv(
+        'CHAT_STORE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_data', 'chat.sqlite3')
+    ))
+atexit.register(chat_store.close)
+
+# Store conversation history with message IDs: recent turns within a token budget, older ones
+# summarized; only recently active sessions are kept in memory
+conversations = ConversationManager(SYSTEM_PROMPT, store=chat_store, summarize=summarize_turns, model=CHAT_MODEL)
 
 # Initialize file manager
 file_manager = FileManager()
 
-# Initialize RAG manager
-rag_manager = get_rag_manager()
+# Initialize RAG manager in the background: the model and vector store take a while to load,
+# the UI and file manager are served right away and RAG features switch on once it is ready
+start_rag_manager()
+
+# Keep the vector index in step with uploads, deletes, renames, moves and copies
+rag_indexer = BackgroundIndexer(get_rag_manager)
+file_manager.add_change_listener(rag_indexer.handle_change)
+
+def run_blocking(func, *args, **kwargs):
+    """
+    Run CPU-bound work (embedding forward passes, vector search) in a real OS thread
+    Under eventlet the calling green thread yields until the result is ready, so one
+    user's RAG query never stalls the event loop that streams everyone else's tokens
+    """
+    if socketio.async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+# Socket.IO is not thread-safe under eventlet: worker threads queue their events
+# and a green thread on the event loop emits them
+pending_emits = queue.Queue()
+
+# Under eventlet an OS thread cannot wake a green thread directly, so each queued event
+# also writes a byte to this socket pair, which the hub watches like any other socket
+emit_wakeup_reader, emit_wakeup_writer = socket.socketpair()
+emit_wakeup_reader.setblocking(False)
+emit_wakeup_writer.setblocking(False)
+
+def emit_from_thread(event, data, room):
+    pending_emits.put((event, data, room))
+    try:
+        emit_wakeup_writer.send(b'\0')
+    except BlockingIOError:
+        pass  # Buffer full: a wake-up is already pending
+
+def next_pending_emit():
+    """Block until a worker thread queues an event (the drain loop never polls)"""
+    if socketio.async_mode != 'eventlet':
+        return pending_emits.get()
+    
+    from eventlet.hubs import trampoline
+    while True:
+        try:
+            return pending_emits.get_nowait()
+        except queue.Empty:
+            pass
+        # Events are queued before their byte is written, so nothing is missed between the check and the wait
+        trampoline(emit_wakeup_reader, read=True)
+        try:
+            while emit_wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+def drain_pending_emits():
+    while True:
+        event, data, room = next_pending_emit()
+        try:
+            socketio.emit(event, data, room=room)
+        except Exception as e:
+            print(f"Failed to emit {event}: {e}")
+
+socketio.start_background_task(drain_pending_emits)
+
+# Background document processing; progress goes only to the requesting users' rooms
+ingestion_jobs = IngestionJobManager(get_rag_manager, emit_from_thread)
+
+def rag_unavailable():
+    """Error response while the RAG manager is loading (503) or failed to load (500)"""
+    readiness = get_rag_status()
+    if readiness["state"] == "failed":
+        return jsonify({"error": f"RAG system not available: {readiness['error']}", "readiness": readiness}), 500
+    start_rag_manager()
+    return jsonify({"error": "RAG system is still loading, try again shortly", "readiness": readiness}), 503
 
 @app.route('/')
 def home():
@@ -52,12 +168,7 @@ def home():
     if 'user_id' not in session:
         session['user_id'] = str(uuid.uuid4())
     
-    # Initialize user's conversation history if it doesn't exist
     user_id = session['user_id']
-    if user_id not in conversations:
-        conversations[user_id] = [
-            {"role": "system", "content": "You are a helpful assistant that speaks Hungarian."}
-        ]
     
     return render_template('index.html', user_id=user_id)
 
@@ -73,26 +184,8 @@ def handle_connect():
             user_id = str(uuid.uuid4())
             session['user_id'] = user_id
             session.modified = True
-            
-            # Initialize empty history for new users
-            if user_id not in message_history:
-                message_history[user_id] = []
-            
-            if user_id not in conversations:
-                conversations[user_id] = [
-                    {"role": "system", "content": "You are a helpful assistant that speaks Hungarian."}
-                ]
         else:
             user_id = session['user_id']
-            
-            # Initialize history if it doesn't exist
-            if user_id not in message_history:
-                message_history[user_id] = []
-            
-            if user_id not in conversations:
-                conversations[user_id] = [
-                    {"role": "system", "content": "You are a helpful assistant that speaks Hungarian."}
-                ]
         
         # Join the room for this user
         join_room(user_id)
@@ -100,7 +193,7 @@ def handle_connect():
         # Send the connection confirmation with message history
         emit('connected', {
             'user_id': user_id,
-            'messages': message_history.get(user_id, [])
+            'messages': conversations.history(user_id)
         })
         
         print(f"User {user_id} connected")
@@ -126,6 +219,7 @@ def handle_message(data):
         message_id = data.get('message_id')
         regenerate = data.get('regenerate', False)
         use_rag = data.get('use_rag', False)  # RAG engedélyezése
+        rag_filters = data.get('rag_filters')  # Keresés szűkítése (mappa, fájltípus, források, dátum)
         
         if not message:
             emit('error', {'message': 'Message cannot be empty'}, room=user_id)
@@ -133,61 +227,48 @@ def handle_message(data):
             
         print(f"Received message from user {user_id}: {message}")
         
-        # Initialize conversation history if it doesn't exist
-        if user_id not in conversations:
-            conversations[user_id] = [
-                {"role": "system", "content": "You are a helpful assistant that speaks Hungarian."}
-            ]
-        
         # RAG context handling
         rag_context = ""
-        rag_results = None  # Initialize rag_results to None for each request
-        if use_rag and rag_manager and rag_manager.is_ready():
+        rag_sources = []  # Sources of the chunks actually packed into this turn's prompt
+        rag_manager = peek_rag_manager()
+        if use_rag and not rag_manager:
+            print("⏳ RAG system still loading, answering without documents")
+        # With the rag-service, is_ready is a socket round trip: keep it off the event loop
+        if use_rag and rag_manager and run_blocking(rag_manager.is_ready):
             try:
                 print(f"🔍 RAG search for message: '{message}'")
                 # Search for relevant documents
-                rag_results = rag_manager.search_documents(message, top_k=3)
+                rag_results = run_blocking(rag_manager.search_documents, message, top_k=3, filters=rag_filters)
                 print(f"🔍 RAG search returned {len(rag_results) if rag_results else 0} results")
                 if rag_results:
-                    rag_context = "\n\nRelevant information from documents:\n"
-                    for i, result in enumerate(rag_results[:3], 1):
-                        rag_context += f"\n{i}. From {result['source']}:\n{result['content'][:500]}...\n"
+                    # Whole sentences, deduplicated across chunks, within the context budget
+                    rag_context, packed_results = pack_context(rag_results, RAG_CONTEXT_TOKENS, conversations.counter)
+                    print(f"🔍 RAG context: {len(packed_results)} chunks, ~{conversations.counter.count(rag_context)} tokens")
+                    rag_sources = [{
+                        'source': result['source'],
+                        'content': result['content'][:200] + '...',
+                        'relevance_score': result['relevance_score']
+                    } for result in packed_results]
                     
-                    # Emit RAG sources to frontend
-                    emit('rag_sources', {
-                        'sources': [{
-                            'source': result['source'],
-                            'content': result['content'][:200] + '...',
-                            'relevance_score': result['relevance_score']
-                        } for result in rag_results]
-                    }, room=user_id)
+                    # Emit RAG sources to frontend (only what the model actually sees)
+                    if rag_sources:
+                        emit('rag_sources', {'sources': rag_sources}, room=user_id)
             except Exception as e:
                 print(f"RAG search error: {e}")
                 emit('rag_error', {'message': f'RAG search failed: {str(e)}'}, room=user_id)
         
         # If this is a regeneration, remove the last assistant message if it exists
-        if regenerate and conversations[user_id] and conversations[user_id][-1]["role"] == "assistant":
-            conversations[user_id].pop()
+        if regenerate:
+            conversations.pop_last_assistant(user_id)
         
-        # Add user message to conversation history
+        # Add user message to conversation history with its ID (without the RAG context,
+        # which is only sent with the current turn)
         if not regenerate:
-            # Add RAG context to the message if available
-            enhanced_message = message + rag_context if rag_context else message
-            user_message = {"role": "user", "content": enhanced_message}
-            conversations[user_id].append(user_message)
-            
-            # Add to message history with ID
-            if not message_id:
-                message_id = f"user-{uuid.uuid4()}"
-                
-            message_history[user_id].append({
-                'id': message_id,
-                'role': 'user',
-                'content': message,
-                'edited': False
-            })
+            conversations.add_message(user_id, "user", message, message_id=message_id)
         
-        print(f"Sending to OpenAI: {conversations[user_id]}")
+        # Bounded prompt: system prompt, running summary and the newest turns that fit the budget
+        prompt_messages = conversations.build_messages(user_id, context=rag_context)
+        print(f"Sending to OpenAI: {len(prompt_messages)} messages, ~{conversations.count_tokens(prompt_messages)} tokens")
         
         try:
             # Generate a unique ID for the assistant's response
@@ -195,8 +276,8 @@ def handle_message(data):
             
             # Get response from OpenAI
             response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=conversations[user_id],
+                model=CHAT_MODEL,
+                messages=prompt_messages,
                 temperature=0.7,
                 stream=True
             )
@@ -210,47 +291,57 @@ def handle_message(data):
                 'done': False
             }, room=user_id)
             
-            # Stream the response
-            for chunk in response:
-                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    assistant_response += content
-                    emit('stream', {
-                        'message_id': response_id,
-                        'content': content,
-                        'done': False
-                    }, room=user_id)
+            # Stream the response, coalescing token-sized deltas into fewer frames. The model
+            # stream is read in a worker thread, so the event loop stays free to flush text
+            # buffered while the model pauses; every frame goes through the emit queue in order
+            stream = StreamCoalescer(
+                lambda payload: emit_from_thread('stream', payload, user_id),
+                response_id,
+                interval=STREAM_FLUSH_INTERVAL,
+                max_bytes=STREAM_FLUSH_BYTES
+            )
+            streaming = [True]
+
+            def read_stream():
+                parts = []
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content is not None:
+                        content = chunk.choices[0].delta.content
+                        parts.append(content)
+                        stream.add(content)
+                return "".join(parts)
+
+            def flush_when_paused():
+                while streaming[0]:
+                    socketio.sleep(STREAM_FLUSH_INTERVAL)
+                    stream.flush_if_due()
+
+            socketio.start_background_task(flush_when_paused)
+            try:
+                assistant_response = run_blocking(read_stream)
+            finally:
+                streaming[0] = False
+                stream.flush()
             
-            # Add assistant response to conversation history
+            # Add assistant response to conversation history with RAG sources if available
             if assistant_response:
-                conversations[user_id].append({"role": "assistant", "content": assistant_response})
-                
-                # Add to message history with RAG sources if available
-                message_data = {
-                    'id': response_id,
-                    'role': 'assistant',
-                    'content': assistant_response,
-                    'edited': False
-                }
+                extra = {}
                 
                 # Add RAG sources if they exist
-                if rag_results is not None and rag_results:
-                    print(f"💾 Storing RAG sources for message {response_id}: {[r['source'] for r in rag_results]}")
-                    message_data['rag_sources'] = [{
-                        'source': result['source'],
-                        'content': result['content'][:200] + '...',
-                        'relevance_score': result['relevance_score']
-                    } for result in rag_results]
+                if rag_sources:
+                    print(f"💾 Storing RAG sources for message {response_id}: {[r['source'] for r in rag_sources]}")
+                    extra['rag_sources'] = rag_sources
                 else:
                     print(f"💾 No RAG sources to store for message {response_id}")
                 
-                message_history[user_id].append(message_data)
+                conversations.add_message(user_id, "assistant", assistant_response, message_id=response_id, **extra)
                 
-                emit('stream', {
+                # Queued behind the streamed frames, so the client never sees done before the text
+                emit_from_thread('stream', {
                     'message_id': response_id,
                     'content': '',
                     'done': True
-                }, room=user_id)
+                }, user_id)
                 
                 print(f"Assistant response: {assistant_response}")
             else:
@@ -274,6 +365,7 @@ def handle_update_message(data):
             
         message_id = data.get('message_id')
         new_content = data.get('new_content')
+        truncate = data.get('truncate', False)  # A későbbi üzenetek törlése: a beszélgetés innen folytatódik
         
         if not message_id or new_content is None:
             emit('error', {'message': 'Missing message_id or new_content'}, room=user_id)
@@ -281,34 +373,18 @@ def handle_update_message(data):
             
         print(f"Updating message {message_id} for user {user_id}")
         
-        # Find the message in the message history
-        message_found = False
-        original_content = None
+        # Constant-time lookup by ID; the history entry is also the prompt's turn, so one update covers both
+        updated = conversations.update_message(user_id, message_id, new_content)
         
-        for msg in message_history.get(user_id, []):
-            if msg['id'] == message_id:
-                original_content = msg['content']
-                msg['content'] = new_content
-                msg['edited'] = True
-                message_found = True
-                
-                # Update the conversation history
-                # Find and update the corresponding message in conversation history
-                if user_id in conversations:
-                    for i, conv_msg in enumerate(conversations[user_id]):
-                        if (conv_msg.get('role') == msg['role'] and 
-                            conv_msg.get('content') == original_content):
-                            conversations[user_id][i]['content'] = new_content
-                            print(f"Updated conversation history at index {i}: {msg['role']} message")
-                            break
-                
-                print(f"Updated message {message_id}: '{original_content}' -> '{new_content}'")
-                break
-        
-        if message_found:
+        if updated:
+            print(f"Updated {updated['role']} message {message_id}: '{new_content}'")
+            removed_ids = conversations.truncate(user_id, message_id, inclusive=False) if truncate else []
+            if removed_ids:
+                print(f"Removed {len(removed_ids)} messages after {message_id}")
             emit('message_updated', {
                 'message_id': message_id,
-                'new_content': new_content
+                'new_content': new_content,
+                'removed_ids': removed_ids
             }, room=user_id)
         else:
             emit('error', {'message': 'Message not found'}, room=user_id)
@@ -440,46 +516,72 @@ def bulk_delete_files():
 # RAG API Endpoints
 @app.route('/api/rag/process', methods=['POST'])
 def process_documents():
-    """Process all documents in uploads directory for RAG"""
+    """Start processing documents in uploads directory for RAG as a background job"""
     try:
-        if not rag_manager:
-            return jsonify({"error": "RAG system not available"}), 500
-        
-        # Process documents with progress tracking
-        progress_data = {"progress": 0, "status": "Starting..."}
+        # Jobs submitted while RAG is loading wait for it in their worker thread
+        if get_rag_status()["state"] == "failed":
+            return rag_unavailable()
+        start_rag_manager()
         
-        def progress_callback(progress, status):
-            progress_data["progress"] = progress
-            progress_data["status"] = status
-            # Emit progress to all connected clients
-            socketio.emit('rag_progress', progress_data)
-        
-        stats = rag_manager.process_documents(progress_callback)
+        # Concurrent clicks join the running job instead of starting another ingest
+        job, merged = ingestion_jobs.submit(session.get('user_id'))
         
         return jsonify({
             "success": True,
-            "message": "Documents processed successfully",
-            "stats": stats
-        })
+            "message": "Joined running processing job" if merged else "Document processing started",
+            "job_id": job.id,
+            "merged": merged,
+            "job": job.to_dict()
+        }), 202
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/rag/jobs/<job_id>', methods=['GET'])
+def get_rag_job(job_id):
+    """Get status of a document processing job"""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job.to_dict()
+    })
+
+@app.route('/api/rag/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_rag_job(job_id):
+    """Cancel a running document processing job"""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if not ingestion_jobs.cancel(job_id):
+        return jsonify({"error": f"Job already {job.status}"}), 409
+    
+    return jsonify({
+        "success": True,
+        "job": job.to_dict()
+    })
+
 @app.route('/api/rag/search', methods=['POST'])
 def search_documents():
     """Search documents using RAG"""
     try:
+        rag_manager = peek_rag_manager()
         if not rag_manager:
-            return jsonify({"error": "RAG system not available"}), 500
+            return rag_unavailable()
         
         data = request.get_json()
         query = data.get('query', '')
         top_k = data.get('top_k', 5)
+        min_score = data.get('min_score')
+        filters = data.get('filters')
         
         if not query:
             return jsonify({"error": "Query is required"}), 400
         
-        results = rag_manager.search_documents(query, top_k)
+        results = run_blocking(rag_manager.search_documents, query, top_k, min_score=min_score, filters=filters)
         
         return jsonify({
             "success": True,
@@ -487,34 +589,102 @@ def search_documents():
             "results": results
         })
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/rag/search/batch', methods=['POST'])
+def search_documents_batch():
+    """Search documents for several queries in one request"""
+    try:
+        rag_manager = peek_rag_manager()
+        if not rag_manager:
+            return rag_unavailable()
+        
+        data = request.get_json()
+        queries = data.get('queries', [])
+        top_k = data.get('top_k', 5)
+        min_score = data.get('min_score')
+        filters = data.get('filters')
+        
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+            return jsonify({"error": "Queries must be a non-empty list of non-empty strings"}), 400
+        
+        results = run_blocking(rag_manager.search_many, queries, top_k, min_score=min_score, filters=filters)
+        
+        return jsonify({
+            "success": True,
+            "results": [
+                {"query": query, "results": query_results}
+                for query, query_results in zip(queries, results)
+            ]
+        })
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/rag/stats', methods=['GET'])
 def get_rag_stats():
-    """Get RAG database statistics"""
+    """Get RAG database statistics and readiness (idle / loading / ready / failed)"""
     try:
+        rag_manager = peek_rag_manager()
         if not rag_manager:
-            return jsonify({"error": "RAG system not available"}), 500
+            readiness = get_rag_status()
+            if readiness["state"] == "failed":
+                return jsonify({"error": f"RAG system not available: {readiness['error']}", "readiness": readiness}), 500
+            start_rag_manager()
+            return jsonify({
+                "success": True,
+                "ready": False,
+                "readiness": get_rag_status(),
+                "stats": None
+            })
         
-        stats = rag_manager.get_database_stats()
+        stats = run_blocking(rag_manager.get_database_stats)
         
         return jsonify({
             "success": True,
+            "ready": True,
+            "readiness": get_rag_status(),
             "stats": stats
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/rag/warmup', methods=['POST'])
+def warm_up_rag():
+    """Load the RAG system if needed and run a dummy embedding so the first query is fast"""
+    try:
+        start_rag_manager()
+        # Waits for a load already in progress (or retries a failed one) off the event loop
+        rag_manager = run_blocking(get_rag_manager)
+        if not rag_manager:
+            return rag_unavailable()
+        
+        timings = run_blocking(rag_manager.warm_up)
+        
+        return jsonify({
+            "success": True,
+            "readiness": get_rag_status(),
+            "warmup": timings
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/rag/clear', methods=['POST'])
 def clear_rag_database():
     """Clear RAG database"""
     try:
+        rag_manager = peek_rag_manager()
         if not rag_manager:
-            return jsonify({"error": "RAG system not available"}), 500
+            return rag_unavailable()
         
-        success = rag_manager.clear_database()
+        success = run_blocking(rag_manager.clear_database)
         
         if success:
             return jsonify({
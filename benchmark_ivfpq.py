@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+IVF-PQ Benchmark Script
+Recall@k and latency of the IVF-PQ index against exact search, per nprobe / code size
+"""
+
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from ivfpq_index import IVFPQCollection
+
+
+def synthetic_vectors(rows, dim, clusters, seed=0):
+    """Clustered unit vectors, roughly shaped like sentence embeddings"""
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, dim)
+    vectors = centers[rng.randint(0, clusters, rows)] + 0.6 * rng.randn(rows, dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def store_vectors():
+    """Vectors of the chunks already indexed by the RAG manager"""
+    from rag_manager import get_rag_manager
+    rag = get_rag_manager()
+    if not rag:
+        return None
+    stored = rag.vectorstore._collection.get(include=["embeddings"])
+    return np.asarray(stored["embeddings"], dtype=np.float32)
+
+
+def run_benchmark(args):
+    print("📏 IVF-PQ benchmark")
+    print("=" * 50)
+
+    if args.from_store:
+        vectors = store_vectors()
+        if vectors is None or not len(vectors):
+            print("❌ No stored vectors found")
+            return False
+    else:
+        vectors = synthetic_vectors(args.rows + args.queries, args.dim, args.clusters)
+
+    # Held-out queries: the last rows are never indexed
+    queries, vectors = vectors[-args.queries:], vectors[:-args.queries]
+    rows, dim = vectors.shape
+    print(f"   Vectors: {rows} x {dim}, queries: {len(queries)}, k={args.k}")
+
+    start = time.perf_counter()
+    exact = queries @ vectors.T
+    truth = np.argsort(-exact, axis=1)[:, :args.k]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"   Exact search: {exact_ms:.2f} ms/query, {rows * dim * 4 / 2 ** 20:.1f} MiB float32 matrix")
+
+    ids = [str(i) for i in range(rows)]
+    for m in args.code_sizes:
+        if dim % m:
+            print(f"\n   ⚠️  Skipping code size {m}: does not divide dimension {dim}")
+            continue
+
+        path = tempfile.mkdtemp()
+        try:
+            collection = IVFPQCollection(path, nlist=args.nlist, m=m, refine_factor=args.refine_factor,
+                                         train_size=args.train_size, train_min_rows=rows + 1)
+            for start in range(0, rows, 10000):
+                collection.upsert(ids[start:start + 10000], vectors[start:start + 10000])
+
+            start = time.perf_counter()
+            collection.train()
+            train_s = time.perf_counter() - start
+            print(f"\n   Code size {m} bytes ({rows * m / 2 ** 20:.1f} MiB codes), trained in {train_s:.1f}s")
+            print(f"   {'nprobe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10}")
+
+            for nprobe in args.nprobe:
+                collection.nprobe = nprobe
+                collection.query(queries[:1], n_results=args.k, include=[])
+                start = time.perf_counter()
+                found = collection.query(queries, n_results=args.k, include=[])
+                latency = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = np.mean([
+                    len(set(map(int, got)) & set(expected.tolist())) / args.k
+                    for got, expected in zip(found["ids"], truth)
+                ])
+                print(f"   {nprobe:>8} {recall:>10.3f} {latency:>10.2f}")
+            collection.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    print("\n" + "=" * 50)
+    print("🎉 Benchmark completed!")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the IVF-PQ vector index")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--code-sizes", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--refine-factor", type=int, default=4)
+    parser.add_argument("--train-size", type=int, default=50000)
+    parser.add_argument("--from-store", action="store_true", help="Use the vectors already in the RAG store")
+    success = run_benchmark(parser.parse_args())
+    sys.exit(0 if success else 1)
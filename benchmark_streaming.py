@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Streaming Benchmark Script
+Socket.IO frames per answer and server CPU per connected user, one 'stream' event
+per model delta vs. coalesced deltas (stream_coalescer.StreamCoalescer)
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from collections import defaultdict
+
+from flask import Flask, request
+from flask_socketio import SocketIO, join_room
+
+from stream_coalescer import StreamCoalescer
+
+WORDS = ("the", "document", "index", "search", "query", "vector", "answer", "result",
+         "chunk", "model", "context", "source", "embedding", "store", "token", "user")
+
+
+def synthetic_answer(tokens, tokens_per_second, seed=0):
+    """(seconds since start, delta) pairs shaped like a model stream: word pieces at a jittered rate"""
+    rng = random.Random(seed)
+    deltas = []
+    now = 0.0
+    for _ in range(tokens):
+        word = rng.choice(WORDS)
+        if len(word) > 5 and rng.random() < 0.5:
+            # Longer words often arrive as two tokens
+            cut = rng.randint(2, len(word) - 2)
+            pieces = [" " + word[:cut], word[cut:]]
+        else:
+            pieces = [" " + word]
+        for piece in pieces:
+            now += rng.expovariate(tokens_per_second)
+            deltas.append((now, piece))
+        if rng.random() < 0.08:
+            now += rng.expovariate(tokens_per_second)
+            deltas.append((now, "."))
+    return deltas[:tokens]
+
+
+def create_server():
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+
+    @socketio.on("connect")
+    def connect():
+        join_room(request.args["user_id"])
+
+    return app, socketio
+
+
+def capture_frames(socketio):
+    """
+    Record the encoded Engine.IO frames sent to each client instead of writing them out
+    Everything up to the transport (room lookup, JSON and packet encoding) still runs
+    """
+    frames = defaultdict(list)
+
+    def send_eio_packet(eio_sid, eio_packet):
+        frames[eio_sid].append(eio_packet.encode())
+
+    socketio.server._send_eio_packet = send_eio_packet
+    return frames
+
+
+def stream_answer(socketio, user_id, message_id, deltas, coalesce, interval, max_bytes):
+    """Emit one answer the way app.handle_message does; returns the number of frames"""
+    def emit(payload):
+        socketio.emit("stream", payload, room=user_id)
+
+    emit({'message_id': message_id, 'content': '', 'done': False})
+    frames = 2
+    if coalesce:
+        # Replay the stream's timing on a simulated clock instead of sleeping
+        current = [0.0]
+        stream = StreamCoalescer(emit, message_id, interval=interval, max_bytes=max_bytes, clock=lambda: current[0])
+        next_tick = interval
+        for timestamp, content in deltas:
+            # The app's timer sends what is buffered every interval while the model is quiet
+            while interval > 0 and next_tick <= timestamp:
+                current[0] = next_tick
+                stream.flush_if_due()
+                next_tick += interval
+            current[0] = timestamp
+            stream.add(content)
+        stream.flush()
+        frames += stream.frames
+    else:
+        for _, content in deltas:
+            emit({'message_id': message_id, 'content': content, 'done': False})
+        frames += len(deltas)
+    emit({'message_id': message_id, 'content': '', 'done': True})
+    return frames
+
+
+def run_mode(socketio, clients, frames_sent, deltas, coalesce, args):
+    frames = 0
+    cpu = 0.0
+    for round_number in range(args.rounds):
+        start = time.process_time()
+        for user_id in clients:
+            frames += stream_answer(socketio, user_id, f"msg_{round_number}", deltas, coalesce,
+                                    args.interval / 1000, args.max_bytes)
+        cpu += time.process_time() - start
+
+        # Check what a client would render, outside the timed section
+        expected = "".join(content for _, content in deltas)
+        for user_id, client in clients.items():
+            received = [json.loads(frame[frame.index("["):]) for frame in frames_sent.pop(client.eio_sid, [])]
+            text = "".join(payload["content"] for name, payload in received if name == "stream")
+            if text != expected or not received[-1][1]["done"]:
+                print(f"❌ {user_id} received a different answer ({len(text)} vs {len(expected)} chars)")
+                return None
+
+    answers = args.rounds * len(clients)
+    return {"frames": frames / answers, "cpu_ms": cpu * 1000 / answers}
+
+
+def run_benchmark(args):
+    print("📡 Streaming benchmark")
+    print("=" * 50)
+
+    deltas = synthetic_answer(args.tokens, args.tokens_per_second)
+    duration = deltas[-1][0]
+    answer_bytes = sum(len(content.encode("utf-8")) for _, content in deltas)
+    print(f"   Answer: {len(deltas)} deltas, {answer_bytes} bytes, {duration:.1f}s at ~{args.tokens_per_second} tokens/s")
+    print(f"   Users: {args.users}, rounds: {args.rounds}, window: {args.interval} ms, max bytes: {args.max_bytes}")
+
+    app, socketio = create_server()
+    clients = {}
+    for i in range(args.users):
+        user_id = f"user_{i}"
+        clients[user_id] = socketio.test_client(app, query_string=f"user_id={user_id}")
+    frames_sent = capture_frames(socketio)
+
+    results = {}
+    for name, coalesce in (("per delta", False), ("coalesced", True)):
+        result = run_mode(socketio, clients, frames_sent, deltas, coalesce, args)
+        if result is None:
+            return False
+        results[name] = result
+        # CPU per second of streaming, i.e. the share of a core one streaming user costs
+        share = result["cpu_ms"] / 1000 / duration * 100
+        print(f"   {name:>10}: {result['frames']:7.1f} frames/answer, "
+              f"{result['cpu_ms']:7.2f} ms CPU per user answer ({share:.3f}% of a core while streaming)")
+
+    before, after = results["per delta"], results["coalesced"]
+    print("-" * 50)
+    print(f"✅ Frames: {before['frames'] / after['frames']:.1f}x fewer, "
+          f"CPU: {before['cpu_ms'] / after['cpu_ms']:.1f}x less per connected user")
+
+    for client in clients.values():
+        client.disconnect()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark coalesced Socket.IO token streaming")
+    parser.add_argument("--users", type=int, default=50, help="Connected users, each receiving one answer per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=400, help="Deltas per answer")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=40.0, help="Coalescing window in ms")
+    parser.add_argument("--max-bytes", type=int, default=512)
+    success = run_benchmark(parser.parse_args())
+    sys.exit(0 if success else 1)
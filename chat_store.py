@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Chat Store
+Durable storage for chat sessions (messages and running summaries)
+"""
+
+import json
+import time
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Message fields with their own column; anything else (e.g. rag_sources) goes to extra
+MESSAGE_COLUMNS = ("id", "role", "content", "edited", "tokens")
+
+
+class ChatStore(ABC):
+    """
+    Storage interface behind ConversationManager
+    Messages are addressed by session and position (list index) or message ID.
+    Writes may be deferred, but load_session must observe every earlier write
+    """
+
+    @abstractmethod
+    def load_session(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """{"messages": [...], "summary": str, "summarized": int}, or None for an unknown session"""
+
+    @abstractmethod
+    def append_message(self, user_id: str, position: int, message: Dict[str, Any]):
+        """Store a message at position (the end of the session)"""
+
+    @abstractmethod
+    def update_message(self, user_id: str, message: Dict[str, Any]):
+        """Rewrite a stored message, found by its ID"""
+
+    @abstractmethod
+    def truncate(self, user_id: str, position: int):
+        """Delete the messages at position and after"""
+
+    @abstractmethod
+    def save_summary(self, user_id: str, summary: str, summarized: int):
+        """Store the running summary and how many messages it covers"""
+
+    def flush(self):
+        """Write out deferred changes"""
+
+    def close(self):
+        self.flush()
+
+
+class MemoryChatStore(ChatStore):
+    """Process-local store: nothing survives a restart (development, tests)"""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, user_id: str) -> Dict[str, Any]:
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = {"messages": [], "positions": {}, "summary": "", "summarized": 0}
+        return session
+
+    def load_session(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return None
+            return {
+                "messages": [dict(message) for message in session["messages"]],
+                "summary": session["summary"],
+                "summarized": session["summarized"]
+            }
+
+    def append_message(self, user_id: str, position: int, message: Dict[str, Any]):
+        with self._lock:
+            session = self._session(user_id)
+            self._truncate(session, position)
+            session["messages"].append(dict(message))
+            session["positions"][message["id"]] = position
+
+    def update_message(self, user_id: str, message: Dict[str, Any]):
+        with self._lock:
+            session = self._session(user_id)
+            position = session["positions"].get(message["id"])
+            if position is not None:
+                session["messages"][position] = dict(message)
+
+    def truncate(self, user_id: str, position: int):
+        with self._lock:
+            self._truncate(self._session(user_id), position)
+
+    @staticmethod
+    def _truncate(session: Dict[str, Any], position: int):
+        for message in session["messages"][position:]:
+            session["positions"].pop(message["id"], None)
+        del session["messages"][position:]
+
+    def save_summary(self, user_id: str, summary: str, summarized: int):
+        with self._lock:
+            session = self._session(user_id)
+            session["summary"] = summary
+            session["summarized"] = summarized
+
+
+class SQLiteChatStore(ChatStore):
+    """
+    SQLite (WAL) chat store with write-behind batching
+    Changes are queued and written by a background thread every flush_interval seconds,
+    in one transaction per batch; a session is flushed before it is read back.
+    WAL lets several app processes share the file (pin each user to one process,
+    as Socket.IO's sticky sessions already do, since processes do not see each other's queues)
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 0.2):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '',
+                summarized INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                user_id TEXT NOT NULL, position INTEGER NOT NULL, message_id TEXT NOT NULL,
+                role TEXT NOT NULL, content TEXT NOT NULL, edited INTEGER NOT NULL DEFAULT 0,
+                tokens INTEGER, extra TEXT,
+                PRIMARY KEY (user_id, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS messages_id ON messages(user_id, message_id);
+        """)
+        self._conn.commit()
+
+        self._thread = threading.Thread(target=self._run, name="chat-store-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _message_row(user_id: str, position: int, message: Dict[str, Any]) -> tuple:
+        extra = {key: value for key, value in message.items() if key not in MESSAGE_COLUMNS}
+        return (
+            user_id, position, message["id"], message["role"], message["content"],
+            int(bool(message.get("edited"))), message.get("tokens"),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    def _queue(self, user_id: str, sql: str, params: tuple):
+        with self._pending_lock:
+            self._pending.append((user_id, sql, params))
+
+    def append_message(self, user_id: str, position: int, message: Dict[str, Any]):
+        self._queue(
+            user_id,
+            "INSERT OR REPLACE INTO messages (user_id, position, message_id, role, content, edited, tokens, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._message_row(user_id, position, message)
+        )
+
+    def update_message(self, user_id: str, message: Dict[str, Any]):
+        _, _, message_id, role, content, edited, tokens, extra = self._message_row(user_id, 0, message)
+        self._queue(
+            user_id,
+            "UPDATE messages SET role = ?, content = ?, edited = ?, tokens = ?, extra = ? "
+            "WHERE user_id = ? AND message_id = ?",
+            (role, content, edited, tokens, extra, user_id, message_id)
+        )
+
+    def truncate(self, user_id: str, position: int):
+        self._queue(user_id, "DELETE FROM messages WHERE user_id = ? AND position >= ?", (user_id, position))
+
+    def save_summary(self, user_id: str, summary: str, summarized: int):
+        self._queue(
+            user_id,
+            "INSERT INTO sessions (user_id, summary, summarized, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, "
+            "summarized = excluded.summarized, updated = excluded.updated",
+            (user_id, summary, summarized, time.time())
+        )
+
+    def load_session(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            with self._pending_lock:
+                dirty = any(pending[0] == user_id for pending in self._pending)
+            if dirty:
+                self._flush_locked()
+
+            session = self._conn.execute(
+                "SELECT summary, summarized FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT message_id, role, content, edited, tokens, extra FROM messages "
+                "WHERE user_id = ? ORDER BY position", (user_id,)
+            ).fetchall()
+
+        if session is None and not rows:
+            return None
+
+        messages = []
+        for message_id, role, content, edited, tokens, extra in rows:
+            message = {"id": message_id, "role": role, "content": content, "edited": bool(edited), "tokens": tokens}
+            if extra:
+                message.update(json.loads(extra))
+            messages.append(message)
+
+        summary, summarized = session if session else ("", 0)
+        return {"messages": messages, "summary": summary, "summarized": summarized}
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # Taking the batch under the connection lock keeps concurrent flushes in queue order
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        touched = {user_id for user_id, _, _ in pending}
+        try:
+            with self._conn:
+                for _, sql, params in pending:
+                    self._conn.execute(sql, params)
+                # Every session with messages has a sessions row (updated = last write)
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT INTO sessions (user_id, updated) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET updated = excluded.updated",
+                    [(user_id, now) for user_id in touched]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(pending)} chat changes: {e}")
+            # Keep them for the next attempt, ahead of anything queued meanwhile
+            with self._pending_lock:
+                self._pending = pending + self._pending
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            messages, = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {"sessions": sessions, "messages": messages, "pending_writes": pending}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Context Packer
+Fits retrieved chunks into a token budget for one chat turn: only whole sentences are
+kept, and sentences repeated across chunks (e.g. the chunk overlap) are sent once
+"""
+
+import re
+from typing import List, Dict, Any, Tuple
+
+from embedding_cache import normalize_text
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+# Longer "sentences" (tables, JSON, run-on text) are split at word boundaries
+MAX_SENTENCE_CHARS = 400
+
+CONTEXT_HEADER = "Relevant information from documents:"
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences and lines of text, none longer than MAX_SENTENCE_CHARS"""
+    sentences = []
+    for part in SENTENCE_BREAK.split(text):
+        part = part.strip()
+        while len(part) > MAX_SENTENCE_CHARS:
+            cut = part.rfind(" ", 0, MAX_SENTENCE_CHARS)
+            if cut <= 0:
+                cut = MAX_SENTENCE_CHARS
+            sentences.append(part[:cut].strip())
+            part = part[cut:].strip()
+        if part:
+            sentences.append(part)
+    return sentences
+
+
+def pack_context(results: List[Dict[str, Any]], max_tokens: int, counter) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Pack search results (in rank order) into at most max_tokens of prompt text
+    Every chunk first gets an equal share of the budget, whatever is left then goes to
+    the best ranked chunks that still have sentences. A sentence already seen in a
+    better ranked chunk, or contained in one (overlap fragments), is skipped.
+    counter is a conversation_manager.TokenCounter
+    Returns the context text ("" when nothing fits) and the results it draws from
+    """
+    budget = max_tokens - counter.count(CONTEXT_HEADER) - 2
+    if budget <= 0 or not results:
+        return "", []
+
+    seen = set()
+    seen_text = ""
+    candidates = []
+    for result in results:
+        sentences = []
+        for sentence in split_sentences(result["content"]):
+            key = normalize_text(sentence).casefold()
+            if key in seen or (len(key) >= 20 and key in seen_text):
+                continue
+            seen.add(key)
+            sentences.append((sentence, counter.count(sentence) + 1))
+        seen_text += "\n" + "\n".join(normalize_text(s).casefold() for s, _ in sentences)
+
+        label = f"From {result['source']}:"
+        candidates.append({
+            "result": result,
+            "label": label,
+            "label_tokens": counter.count(label) + 3,
+            "sentences": sentences,
+            "taken": 0,
+            "used": 0
+        })
+
+    remaining = budget
+    share = budget // len(candidates)
+    for limit in (share, None):
+        for candidate in candidates:
+            sentences = candidate["sentences"]
+            allowance = remaining if limit is None else min(remaining, limit - candidate["used"])
+            while candidate["taken"] < len(sentences):
+                tokens = sentences[candidate["taken"]][1]
+                if candidate["taken"] == 0:
+                    tokens += candidate["label_tokens"]
+                if tokens > allowance:
+                    break
+                allowance -= tokens
+                remaining -= tokens
+                candidate["used"] += tokens
+                candidate["taken"] += 1
+
+    packed = [candidate for candidate in candidates if candidate["taken"]]
+    if not packed:
+        return "", []
+
+    context = f"\n\n{CONTEXT_HEADER}\n"
+    for i, candidate in enumerate(packed, 1):
+        text = " ".join(sentence for sentence, _ in candidate["sentences"][:candidate["taken"]])
+        context += f"\n{i}. {candidate['label']}\n{text}\n"
+    return context, [candidate["result"] for candidate in packed]
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Conversation Manager
+Token-budgeted chat history: recent turns are sent verbatim, older turns are folded
+into a running summary in the background, so the prompt stays bounded
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Any
+
+from chat_store import ChatStore, MemoryChatStore
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when available, otherwise estimates ~4 characters per token
+    tiktoken may download its BPE file on first use, so the encoding is loaded on a
+    background thread and counts are estimated until it is ready
+    """
+
+    # Role and separator tokens every chat message carries
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = None
+        self._loaded = threading.Event()
+        if tiktoken is None:
+            self._loaded.set()
+        else:
+            threading.Thread(target=self._load, name="tiktoken-load", daemon=True).start()
+
+    def _load(self):
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self._encoding = encoding
+        except Exception as e:
+            # The BPE files are downloaded on first use; keep estimating when that is not possible
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        finally:
+            self._loaded.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the encoding has been loaded or given up on; True when tiktoken counts are used"""
+        self._loaded.wait(timeout)
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._encoding
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count_message(self, content: str) -> int:
+        return self.count(content) + self.MESSAGE_OVERHEAD
+
+
+class Conversation:
+    """
+    One user's chat turns plus the running summary of the oldest ones
+    Each turn is a message record (id, role, content, edited, tokens, optional rag_sources)
+    and caches its token count; turns[:summarized] are represented by summary.
+    positions maps message ID -> index in turns, so messages are found in constant time
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.turns: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarized = 0
+        self.pending_tokens = 0  # tokens of turns[summarized:]
+        self.summary_cut: Optional[int] = None  # end of the slice being summarized, None when idle
+        self.retry_after = 0.0
+        self.lock = threading.Lock()
+
+
+class ConversationManager:
+    """
+    Keeps per-user conversations and builds prompts within max_prompt_tokens
+    Once the unsummarized turns exceed summary_trigger_tokens, the oldest of them are
+    summarized in a worker thread until about keep_recent_tokens remain verbatim,
+    at most summary_input_tokens of turns per summarizer call.
+    Turns that do not fit the budget are left out even before their summary is ready.
+    Every change is written through to store; up to max_hot_sessions conversations stay
+    in memory, least recently used ones are dropped and reloaded from the store on demand
+    """
+
+    def __init__(self, system_prompt: str, store: Optional[ChatStore] = None,
+                 summarize: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+                 model: str = "gpt-3.5-turbo", max_prompt_tokens: int = 3000,
+                 summary_trigger_tokens: int = 2000, keep_recent_tokens: int = 1000,
+                 summary_input_tokens: int = 3000, summary_retry_seconds: float = 60.0,
+                 max_hot_sessions: int = 1000):
+        self.system_prompt = system_prompt
+        self.store = store if store is not None else MemoryChatStore()
+        self.summarize = summarize
+        self.counter = TokenCounter(model)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_trigger_tokens = summary_trigger_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self.summary_input_tokens = summary_input_tokens
+        self.summary_retry_seconds = summary_retry_seconds
+        self.system_tokens = self.counter.count_message(system_prompt)
+        self.max_hot_sessions = max_hot_sessions
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+
+    def get(self, user_id: str) -> Conversation:
+        with self._lock:
+            conversation = self._conversations.get(user_id)
+            if conversation is not None:
+                self._conversations.move_to_end(user_id)
+                return conversation
+
+            conversation = self._load(user_id)
+            self._conversations[user_id] = conversation
+            self._evict()
+            return conversation
+
+    def _load(self, user_id: str) -> Conversation:
+        conversation = Conversation(user_id)
+        stored = self.store.load_session(user_id)
+        if not stored:
+            return conversation
+
+        for turn in stored["messages"]:
+            if turn.get("tokens") is None:
+                turn["tokens"] = self.counter.count_message(turn["content"])
+        conversation.turns = stored["messages"]
+        conversation.positions = {turn["id"]: index for index, turn in enumerate(conversation.turns)}
+        conversation.summarized = min(stored["summarized"], len(conversation.turns))
+        if stored["summary"] and conversation.summarized:
+            conversation.summary = stored["summary"]
+            conversation.summary_tokens = self.counter.count_message(self._summary_message(conversation.summary))
+        else:
+            conversation.summarized = 0
+        conversation.pending_tokens = sum(turn["tokens"] for turn in conversation.turns[conversation.summarized:])
+        return conversation
+
+    def _evict(self):
+        """Drop the least recently used conversations beyond max_hot_sessions (call with self._lock held)"""
+        excess = len(self._conversations) - self.max_hot_sessions
+        if excess <= 0:
+            return
+        # A conversation with a summary in flight stays until the summary is stored
+        for user_id in [user_id for user_id, conversation in self._conversations.items()
+                        if conversation.summary_cut is None][:excess]:
+            del self._conversations[user_id]
+
+    def history(self, user_id: str) -> List[Dict[str, Any]]:
+        """Messages for the chat UI, oldest first"""
+        conversation = self.get(user_id)
+        with conversation.lock:
+            return [
+                {key: value for key, value in turn.items() if key != "tokens"}
+                for turn in conversation.turns
+            ]
+
+    def add_message(self, user_id: str, role: str, content: str, message_id: Optional[str] = None,
+                    **extra) -> Dict[str, Any]:
+        """
+        Append a message record; extra fields (e.g. rag_sources) are stored with it
+        A message_id already used in this conversation is replaced by a fresh one
+        """
+        conversation = self.get(user_id)
+        turn = {
+            "id": message_id,
+            "role": role,
+            "content": content,
+            "edited": False,
+            "tokens": self.counter.count_message(content)
+        }
+        turn.update(extra)
+        with conversation.lock:
+            if not turn["id"] or turn["id"] in conversation.positions:
+                turn["id"] = f"{role}-{uuid.uuid4()}"
+            conversation.positions[turn["id"]] = len(conversation.turns)
+            conversation.turns.append(turn)
+            conversation.pending_tokens += turn["tokens"]
+            self.store.append_message(user_id, len(conversation.turns) - 1, turn)
+            self._maybe_summarize(conversation)
+        return turn
+
+    def pop_last_assistant(self, user_id: str) -> bool:
+        """Drop the last turn if it is an assistant answer (regeneration)"""
+        conversation = self.get(user_id)
+        with conversation.lock:
+            if not conversation.turns or conversation.turns[-1]["role"] != "assistant":
+                return False
+            self._truncate(conversation, len(conversation.turns) - 1)
+            return True
+
+    def update_message(self, user_id: str, message_id: str, new_content: str) -> Optional[Dict[str, Any]]:
+        """Replace the content of a message; returns the updated record, None if not found"""
+        conversation = self.get(user_id)
+        with conversation.lock:
+            index = conversation.positions.get(message_id)
+            if index is None:
+                return None
+
+            turn = conversation.turns[index]
+            self._touch(conversation, index)
+            tokens = self.counter.count_message(new_content)
+            if index >= conversation.summarized:
+                conversation.pending_tokens += tokens - turn["tokens"]
+            turn["content"] = new_content
+            turn["tokens"] = tokens
+            turn["edited"] = True
+            self.store.update_message(user_id, turn)
+            return turn
+
+    def truncate(self, user_id: str, message_id: str, inclusive: bool = True) -> List[str]:
+        """
+        Drop every message after message_id, and the message itself when inclusive
+        Returns the removed message IDs
+        """
+        conversation = self.get(user_id)
+        with conversation.lock:
+            index = conversation.positions.get(message_id)
+            if index is None:
+                return []
+            return self._truncate(conversation, index if inclusive else index + 1)
+
+    def _truncate(self, conversation: Conversation, index: int) -> List[str]:
+        """Drop turns[index:] (call with conversation.lock held)"""
+        if index >= len(conversation.turns):
+            return []
+        self._touch(conversation, index)
+        removed = conversation.turns[index:]
+        del conversation.turns[index:]
+        for turn in removed:
+            del conversation.positions[turn["id"]]
+            conversation.pending_tokens -= turn["tokens"]
+        self.store.truncate(conversation.user_id, index)
+        return [turn["id"] for turn in removed]
+
+    def build_messages(self, user_id: str, context: str = "") -> List[Dict[str, str]]:
+        """
+        System prompt, running summary and as many of the newest turns as fit the budget
+        The newest turn is always included; context (retrieved documents) is appended to
+        it for this prompt only and never stored in the history
+        """
+        conversation = self.get(user_id)
+        with conversation.lock:
+            messages = [{"role": "system", "content": self.system_prompt}]
+            budget = self.max_prompt_tokens - self.system_tokens - self.counter.count(context)
+            if conversation.summary:
+                messages.append({"role": "system", "content": self._summary_message(conversation.summary)})
+                budget -= conversation.summary_tokens
+
+            recent = []
+            for turn in reversed(conversation.turns[conversation.summarized:]):
+                if recent and turn["tokens"] > budget:
+                    break
+                recent.append({"role": turn["role"], "content": turn["content"]})
+                budget -= turn["tokens"]
+
+            if context and recent:
+                recent[0]["content"] += context
+            messages.extend(reversed(recent))
+            return messages
+
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.counter.count_message(message["content"]) for message in messages)
+
+    def stats(self, user_id: str) -> Dict[str, Any]:
+        conversation = self.get(user_id)
+        with conversation.lock:
+            return {
+                "turns": len(conversation.turns),
+                "summarized_turns": conversation.summarized,
+                "summary_tokens": conversation.summary_tokens,
+                "pending_tokens": conversation.pending_tokens,
+                "summarizing": conversation.summary_cut is not None
+            }
+
+    @staticmethod
+    def _summary_message(summary: str) -> str:
+        return f"Summary of the earlier conversation:\n{summary}"
+
+    def _touch(self, conversation: Conversation, index: int):
+        """
+        A turn is about to change: if it is already summarized, or inside the slice being
+        summarized, the summary is dropped so the next run rebuilds it from the current turns
+        (call with conversation.lock held)
+        """
+        limit = conversation.summary_cut if conversation.summary_cut is not None else conversation.summarized
+        if index >= limit:
+            return
+        conversation.summary = ""
+        conversation.summary_tokens = 0
+        conversation.summarized = 0
+        conversation.summary_cut = None
+        conversation.pending_tokens = sum(turn["tokens"] for turn in conversation.turns)
+        self.store.save_summary(conversation.user_id, "", 0)
+
+    def _maybe_summarize(self, conversation: Conversation):
+        """Schedule a background summary of the oldest turns (call with conversation.lock held)"""
+        if (self.summarize is None or conversation.summary_cut is not None
+                or conversation.pending_tokens <= self.summary_trigger_tokens
+                or time.monotonic() < conversation.retry_after):
+            return
+
+        # Fold the oldest turns until about keep_recent_tokens remain; the newest two always stay verbatim
+        # (a long backlog, e.g. after an edit reset the summary, is worked off over several calls)
+        start = cut = conversation.summarized
+        remaining = conversation.pending_tokens
+        taken = 0
+        last = len(conversation.turns) - 2
+        while cut < last and remaining > self.keep_recent_tokens:
+            tokens = conversation.turns[cut]["tokens"]
+            if cut > start and taken + tokens > self.summary_input_tokens:
+                break
+            remaining -= tokens
+            taken += tokens
+            cut += 1
+        if cut == start:
+            return
+
+        conversation.summary_cut = cut
+        turns = [{"role": turn["role"], "content": turn["content"]} for turn in conversation.turns[start:cut]]
+        self._executor.submit(self._summarize, conversation, conversation.summary, turns, start, cut)
+
+    def _summarize(self, conversation: Conversation, summary: str, turns: List[Dict[str, str]], start: int, cut: int):
+        try:
+            new_summary = self.summarize(summary, turns).strip()
+        except Exception as e:
+            logger.error(f"Conversation summary failed: {e}")
+            new_summary = None
+
+        with conversation.lock:
+            # An edit inside the slice reset the summary meanwhile; this result is stale
+            if conversation.summary_cut != cut or conversation.summarized != start:
+                return
+            conversation.summary_cut = None
+            if not new_summary:
+                conversation.retry_after = time.monotonic() + self.summary_retry_seconds
+                return
+
+            conversation.summary = new_summary
+            conversation.summary_tokens = self.counter.count_message(self._summary_message(new_summary))
+            conversation.pending_tokens -= sum(turn["tokens"] for turn in conversation.turns[start:cut])
+            conversation.summarized = cut
+            self.store.save_summary(conversation.user_id, new_summary, cut)
+            logger.info(f"Summarized {cut - start} turns into {conversation.summary_tokens} tokens")
+            self._maybe_summarize(conversation)
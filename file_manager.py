@@ -4,12 +4,15 @@
 import os
 import json
 import shutil
+import logging
 from datetime import datetime
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from flask import jsonify, request, send_file
 import mimetypes
 
+logger = logging.getLogger(__name__)
+
 class FileManager:
     def __init__(self, base_path="_databricks/uploads"):
         self.base_path = Path(base_path)
@@ -25,6 +28,25 @@ class FileManager:
         
         # Max file size: 50MB
         self.max_file_size = 50 * 1024 * 1024
+        
+        # Callbacks notified of changes: callback(event, path, new_path=None)
+        self.change_listeners = []
+    
+    def add_change_listener(self, callback):
+        """Register a callback for 'created', 'deleted' and 'moved' events (paths relative to base_path)"""
+        self.change_listeners.append(callback)
+    
+    def _notify_change(self, event, path, new_path=None):
+        """Notify listeners of a change; listener errors never fail the file operation"""
+        for callback in self.change_listeners:
+            try:
+                callback(event, path, new_path)
+            except Exception:
+                logger.exception(f"File change listener failed for {event} {path}")
+    
+    def _relative(self, path):
+        """Path relative to base_path in POSIX form"""
+        return path.relative_to(self.base_path).as_posix()
     
     def is_allowed_file(self, filename):
         """Check if file extension is allowed"""
@@ -197,6 +219,7 @@ class FileManager:
                 counter += 1
             
             file.save(str(file_path))
+            self._notify_change('created', self._relative(file_path))
             
             return {
                 'success': True,
@@ -219,6 +242,7 @@ class FileManager:
                 target_path.unlink()
             else:
                 shutil.rmtree(str(target_path))
+            self._notify_change('deleted', self._relative(target_path))
             
             return {'success': True, 'message': 'Item deleted successfully'}, 200
             
@@ -241,6 +265,7 @@ class FileManager:
                 return {'success': False, 'error': 'Item with this name already exists'}, 409
             
             old_path.rename(new_path)
+            self._notify_change('moved', self._relative(old_path), self._relative(new_path))
             
             if new_path.is_file():
                 item_info = self.get_file_info(new_path)
@@ -376,6 +401,7 @@ class FileManager:
                     shutil.copytree(source, dest_file)
                     
                 copied_files.append(str(dest_file.relative_to(self.base_path)))
+                self._notify_change('created', self._relative(dest_file))
             
             return {
                 'success': True,
@@ -413,6 +439,7 @@ class FileManager:
                 
                 shutil.move(str(source), str(dest_file))
                 moved_files.append(str(dest_file.relative_to(self.base_path)))
+                self._notify_change('moved', self._relative(source), self._relative(dest_file))
             
             return {
                 'success': True,
@@ -436,6 +463,7 @@ class FileManager:
                     else:
                         shutil.rmtree(full_path)
                     deleted_files.append(file_path)
+                    self._notify_change('deleted', self._relative(full_path))
             
             return {
                 'success': True,
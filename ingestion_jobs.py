@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Ingestion Jobs
+Runs RAG document processing as a background job with status, progress and cancellation
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJob:
+    """State of a single ingestion run"""
+
+    TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Queued"
+        self.stats = None
+        self.error = None
+        self.subscribers = set()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "stats": self.stats,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class IngestionJobManager:
+    """
+    Runs at most one ingestion job at a time
+    Concurrent submissions merge into the running job; progress events are
+    rate-limited and sent only to the rooms of the users who requested the job
+    """
+
+    def __init__(self, get_rag_manager: Callable, emit: Callable[[str, Dict[str, Any], str], None],
+                 min_emit_interval: float = 0.5, max_finished_jobs: int = 50):
+        self.get_rag_manager = get_rag_manager
+        self.emit = emit
+        self.min_emit_interval = min_emit_interval
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._active: Optional[IngestionJob] = None
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: Optional[str]) -> Tuple[IngestionJob, bool]:
+        """
+        Start an ingestion job, or join the one already running
+        Returns (job, merged)
+        """
+        with self._lock:
+            if self._active is not None and not self._active.finished:
+                if user_id:
+                    self._active.subscribers.add(user_id)
+                return self._active, True
+
+            job = IngestionJob()
+            if user_id:
+                job.subscribers.add(user_id)
+            self._jobs[job.id] = job
+            self._active = job
+            self._prune()
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"rag-ingest-{job.id[:8]}", daemon=True)
+        thread.start()
+        return job, False
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; the job stops after its current batch"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        job.message = "Cancelling..."
+        return True
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished_jobs"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        last_emit = [0.0]
+
+        def progress_callback(progress, status):
+            job.progress = progress
+            job.message = status
+            now = time.monotonic()
+            if now - last_emit[0] >= self.min_emit_interval:
+                last_emit[0] = now
+                self._emit(job, "rag_progress", {"job_id": job.id, "progress": progress, "status": status})
+
+        try:
+            rag_manager = self.get_rag_manager()
+            if rag_manager is None:
+                raise RuntimeError("RAG system not available")
+
+            job.stats = rag_manager.process_documents(progress_callback, cancel_event=job.cancel_event)
+            if job.stats.get("cancelled"):
+                job.status = "cancelled"
+                job.message = "Processing cancelled"
+            else:
+                # The approximate vector index is trained here, once enough vectors exist
+                try:
+                    rag_manager.train_vector_index_if_due()
+                except Exception as e:
+                    logger.error(f"Vector index training after job {job.id} failed: {e}")
+                job.status = "completed"
+                job.progress = 100
+                job.message = "Processing complete"
+
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            job.message = "Processing failed"
+
+        finally:
+            job.finished_at = time.time()
+            self._emit(job, "rag_progress", {"job_id": job.id, "progress": job.progress, "status": job.message})
+            self._emit(job, "rag_job_finished", job.to_dict())
+
+    def _emit(self, job: IngestionJob, event: str, data: Dict[str, Any]):
+        for room in list(job.subscribers):
+            try:
+                self.emit(event, data, room)
+            except Exception as e:
+                logger.warning(f"Failed to emit {event} for job {job.id}: {e}")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+IVF-PQ Index
+Approximate nearest neighbour search (inverted file + product quantization) in NumPy
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from numpy_vector_store import NumpyCollection, NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0, block_rows: int = 16384) -> np.ndarray:
+    """Lloyd's k-means (squared L2) returning k centroids; empty clusters are reseeded from random points"""
+    rng = np.random.RandomState(seed)
+    centroids = x[rng.choice(len(x), k, replace=len(x) < k)].astype(np.float32)
+    for _ in range(iterations):
+        assign = nearest_centroids(x, centroids, block_rows)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Per-cluster sums via one sort + reduceat instead of a scatter-add
+        order = np.argsort(assign, kind="stable")
+        starts = np.searchsorted(assign[order], np.arange(k))
+        sums = np.add.reduceat(x[order], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()))]
+    return centroids
+
+
+def nearest_centroids(x: np.ndarray, centroids: np.ndarray, block_rows: int = 16384) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for every row, computed in blocks"""
+    half_norms = 0.5 * (centroids ** 2).sum(axis=1)
+    assign = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), block_rows):
+        block = np.asarray(x[start:start + block_rows], dtype=np.float32)
+        # argmin ||x - c||^2 == argmax x.c - ||c||^2 / 2
+        assign[start:start + block_rows] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assign
+
+
+class IVFPQCollection(NumpyCollection):
+    """
+    NumpyCollection searched through an IVF-PQ index
+    Vectors are assigned to one of nlist coarse centroids and their residuals are
+    encoded as m one-byte product-quantizer codes, stored row-aligned with the
+    embedding matrix (append-only, like the matrix itself). A query scans only the
+    nprobe nearest lists with table lookups, then re-ranks the best
+    n_results * refine_factor candidates exactly against the memory-mapped matrix.
+    Search stays exact until train() is called; training_due turns True once
+    train_min_rows live vectors exist (RAGManager then trains from its background
+    ingestion threads, never inside an upsert). Rows are encoded only by writers
+    (upsert, train, compact); queries score rows not encoded yet exactly
+    """
+
+    def __init__(self, path: Path, nlist: int = 1024, nprobe: int = 16, m: int = 16,
+                 refine_factor: int = 4, train_size: int = 50000, train_min_rows: int = 10000,
+                 dtype: str = "float32", block_rows: int = 65536):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.m = m
+        self.refine_factor = refine_factor
+        self.train_size = train_size
+        self.train_min_rows = train_min_rows
+        self.model_path = Path(path) / "ivfpq_model.npz"
+        self.codes_path = Path(path) / "ivfpq_codes.bin"
+        self.lists_path = Path(path) / "ivfpq_lists.bin"
+
+        self.coarse = None
+        self.codebooks = None
+        self._codes = None
+        self._assign = None
+        self._list_order = None
+        self._list_offsets = None
+        super().__init__(path, dtype=dtype, block_rows=block_rows)
+
+    @property
+    def trained(self) -> bool:
+        return self.coarse is not None
+
+    @property
+    def training_due(self) -> bool:
+        """Enough live vectors to train the index, and it is not trained yet"""
+        with self._lock:
+            self._refresh()
+            return not self.trained and int(self._live.sum()) >= self.train_min_rows
+
+    def _refresh(self):
+        version = self._version
+        super()._refresh()
+        if version != self._version or self._codes is None:
+            self._load_index()
+
+    def _load_index(self):
+        """Load the trained model and map the code/list files (rows beyond them are encoded lazily)"""
+        if self.model_path.exists():
+            model = np.load(self.model_path)
+            self.coarse = model["coarse"]
+            self.codebooks = model["codebooks"]
+            self.nlist = len(self.coarse)
+            self.m = len(self.codebooks)
+        else:
+            self.coarse = None
+            self.codebooks = None
+
+        encoded = 0
+        if self.trained and self.lists_path.exists():
+            encoded = min(self.lists_path.stat().st_size // 4, self.codes_path.stat().st_size // self.m, self._row_count)
+        if encoded:
+            self._codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(encoded, self.m))
+            self._assign = np.memmap(self.lists_path, dtype=np.int32, mode="r", shape=(encoded,))
+        else:
+            self._codes = np.zeros((0, self.m), dtype=np.uint8)
+            self._assign = np.zeros(0, dtype=np.int32)
+        self._list_order = None
+
+    def train(self, sample_size: Optional[int] = None, iterations: int = 20):
+        """
+        Train coarse centroids and PQ codebooks from a random sample of live vectors, then encode every row
+        The store stays available for queries and upserts while k-means runs; only
+        sampling and installing the new model hold its lock
+        """
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live)
+            if not len(live_rows):
+                raise ValueError("Cannot train an IVF-PQ index without vectors")
+            m, dim = self.m, self.dim
+            if dim % m:
+                raise ValueError(f"Dimension {dim} is not divisible by m={m}")
+
+            sample_size = min(sample_size or self.train_size, len(live_rows))
+            rng = np.random.RandomState(0)
+            sample_rows = np.sort(rng.choice(live_rows, sample_size, replace=False))
+            sample = np.asarray(self._matrix[sample_rows], dtype=np.float32)
+
+        nlist = min(self.nlist, sample_size)
+        logger.info(f"Training IVF-PQ index (nlist={nlist}, m={m}) on {sample_size} vectors")
+        coarse = kmeans(sample, nlist, iterations)
+        residuals = sample - coarse[nearest_centroids(sample, coarse)]
+        sub_dim = dim // m
+        codebooks = np.stack([
+            kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], min(256, sample_size), iterations, seed=j + 1)
+            for j in range(m)
+        ])
+
+        with self._lock:
+            self._refresh()
+            tmp_path = self.model_path.with_suffix(".tmp.npz")
+            np.savez(tmp_path, coarse=coarse, codebooks=codebooks)
+            os.replace(tmp_path, self.model_path)
+            for file_path in (self.codes_path, self.lists_path):
+                if file_path.exists():
+                    file_path.unlink()
+            self._load_index()
+            self._encode_pending()
+            # Other processes pick up the new model on their next refresh
+            self._commit()
+
+    def _encode(self, vectors: np.ndarray):
+        """Coarse list and PQ codes of each vector"""
+        assign = nearest_centroids(vectors, self.coarse)
+        residuals = vectors - self.coarse[assign]
+        sub_dim = self.dim // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest_centroids(residuals[:, j * sub_dim:(j + 1) * sub_dim], self.codebooks[j])
+        return assign, codes
+
+    def _encode_pending(self):
+        """Encode matrix rows appended since the last encode and append their codes"""
+        encoded = len(self._assign)
+        if not self.trained or encoded >= self._row_count:
+            return
+
+        for file_path, size in ((self.codes_path, encoded * self.m), (self.lists_path, encoded * 4)):
+            if file_path.exists() and file_path.stat().st_size != size:
+                os.truncate(file_path, size)
+        with open(self.codes_path, "ab") as codes_file, open(self.lists_path, "ab") as lists_file:
+            for start in range(encoded, self._row_count, self.block_rows):
+                end = min(start + self.block_rows, self._row_count)
+                assign, codes = self._encode(np.asarray(self._matrix[start:end], dtype=np.float32))
+                codes_file.write(codes.tobytes())
+                lists_file.write(assign.astype(np.int32).tobytes())
+
+        self._codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(self._row_count, self.m))
+        self._assign = np.memmap(self.lists_path, dtype=np.int32, mode="r", shape=(self._row_count,))
+        self._list_order = None
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        with self._lock:
+            super().upsert(ids, embeddings, documents, metadatas)
+            if self.trained:
+                self._encode_pending()
+
+    add = upsert
+
+    def _inverted_lists(self):
+        """Rows grouped by coarse list (rebuilt lazily after adds)"""
+        if self._list_order is None:
+            assign = np.asarray(self._assign)
+            self._list_order = np.argsort(assign, kind="stable")
+            self._list_offsets = np.searchsorted(assign[self._list_order], np.arange(len(self.coarse) + 1))
+        return self._list_order, self._list_offsets
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            if not self.trained:
+                return super().query(query_embeddings, n_results, where, include)
+            if include is None:
+                include = ["metadatas", "documents", "distances"]
+
+            queries = self._normalize_queries(query_embeddings)
+            live = self._live_mask(where)
+            allowed = np.flatnonzero(live) if where else None
+            shortlist_size = n_results * self.refine_factor
+            # Rows another process appended but has not encoded yet are scored exactly
+            tail = np.arange(len(self._assign), self._row_count)
+            tail = tail[live[tail]]
+
+            # A selective filter leaves few enough rows to score them all exactly
+            if allowed is not None and len(allowed) <= max(self.block_rows, shortlist_size):
+                return self._query_result(*self._exact_top(queries, n_results, live, allowed), include)
+
+            order, offsets = self._inverted_lists()
+            nprobe = min(self.nprobe, len(self.coarse))
+            sub_dim = self.dim // self.m
+
+            coarse_scores = queries @ self.coarse.T
+            best_scores = np.full((len(queries), n_results), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), n_results), dtype=np.int64)
+            for qi, query in enumerate(queries):
+                probes = np.argpartition(-coarse_scores[qi], nprobe - 1)[:nprobe]
+                rows = np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+                rows = rows[live[rows]]
+
+                if len(rows) > shortlist_size:
+                    # Inner product decomposes into q.centroid + sum over subspaces of q_j.codeword_j
+                    tables = np.einsum("md,mkd->mk", query.reshape(self.m, sub_dim), self.codebooks)
+                    codes = np.asarray(self._codes[rows])
+                    approx = coarse_scores[qi][np.asarray(self._assign[rows])] + tables[np.arange(self.m), codes].sum(axis=1)
+                    shortlist = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+                    rows = rows[shortlist]
+
+                # Exact re-rank of the shortlist (and the unencoded rows) against the stored vectors
+                rows = np.sort(np.concatenate([rows, tail]))
+                if not len(rows):
+                    continue
+                exact = np.asarray(self._matrix[rows], dtype=np.float32) @ query
+                k = min(n_results, len(rows))
+                top = np.argpartition(-exact, k - 1)[:k]
+                best_scores[qi, :k] = exact[top]
+                best_rows[qi, :k] = rows[top]
+
+            # Under a filter the probed lists may hold fewer than n_results matches; fall back to exact
+            wanted = min(n_results, len(allowed) if allowed is not None else len(self._rows))
+            short = np.flatnonzero(np.isfinite(best_scores).sum(axis=1) < wanted)
+            if len(short):
+                scores, rows = self._exact_top(queries[short], n_results, live, allowed)
+                best_scores[short] = -np.inf
+                best_scores[short, :scores.shape[1]] = scores
+                best_rows[short, :rows.shape[1]] = rows
+
+            return self._query_result(best_scores, best_rows, include)
+
+    def compact(self):
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live)
+            if len(live_rows) == self._row_count:
+                return
+            if self.trained:
+                self._encode_pending()
+                codes = np.asarray(self._codes[live_rows])
+                assign = np.asarray(self._assign[live_rows])
+            super().compact()
+
+            if self.trained:
+                for file_path, data in ((self.codes_path, codes), (self.lists_path, assign)):
+                    tmp_path = file_path.with_suffix(".tmp")
+                    with open(tmp_path, "wb") as f:
+                        f.write(data.tobytes())
+                    os.replace(tmp_path, file_path)
+            self._load_index()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "trained": self.trained,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "code_size_bytes": self.m,
+            "encoded_rows": len(self._assign) if self._assign is not None else 0
+        }
+
+
+class IVFPQVectorStore(NumpyVectorStore):
+    """NumpyVectorStore whose collection is searched through an IVF-PQ index"""
+
+    def __init__(self, path: Path, compact_ratio: float = 0.3, **index_options):
+        self.path = Path(path)
+        self.compact_ratio = compact_ratio
+        self._collection = IVFPQCollection(self.path, **index_options)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Lexical Index
+Persistent inverted index with Hungarian-aware tokenization and BM25 scoring
+"""
+
+import re
+import math
+import zlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Function words that carry no retrieval signal (Hungarian plus a few English ones)
+STOPWORDS = {
+    "a", "az", "egy", "és", "is", "hogy", "nem", "de", "meg", "van", "volt", "lesz", "ez", "azt",
+    "ezt", "ezek", "azok", "mint", "csak", "vagy", "már", "még", "el", "ki", "be", "fel", "le",
+    "se", "sem", "ha", "mert", "pedig", "ami", "aki", "amely", "amit", "akkor", "igen", "mi",
+    "mit", "kell", "lehet", "való", "által", "után", "előtt", "alatt", "szerint", "között",
+    "the", "of", "and", "to", "in", "for", "on", "with"
+}
+
+# Case endings, longest first; stripped at most once
+CASE_SUFFIXES = sorted([
+    "ból", "ből", "ról", "ről", "tól", "től", "nak", "nek", "ban", "ben", "hoz", "hez", "höz",
+    "val", "vel", "nál", "nél", "ért", "ként", "kor", "ig", "ba", "be", "ra", "re", "on", "en",
+    "ön", "ul", "ül", "vá", "vé", "t"
+], key=len, reverse=True)
+
+# Plural and possessive endings, longest first; stripped at most once after case endings
+NUMBER_SUFFIXES = sorted([
+    "aink", "eink", "jaik", "jeik", "aik", "eik", "jai", "jei", "juk", "jük", "ink", "unk", "ünk",
+    "ai", "ei", "ok", "ek", "ök", "ak", "uk", "ük", "ja", "je", "já", "jé", "k", "i"
+], key=len, reverse=True)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_accents(word: str) -> str:
+    """Strip diacritics so accented and unaccented spellings match"""
+    return "".join(ch for ch in unicodedata.normalize("NFD", word) if not unicodedata.combining(ch))
+
+
+def stem(word: str) -> str:
+    """Light Hungarian stemmer: one case ending, one plural/possessive ending, then a final a/e"""
+    if len(word) < 4 or not word.isalpha():
+        return word
+
+    for suffix in CASE_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            # A bare -t is only the accusative after a vowel (számlát, adót)
+            if suffix == "t" and word[-2] not in "aáeéiíoóöőuúüű":
+                continue
+            word = word[:-len(suffix)]
+            break
+
+    for suffix in NUMBER_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+
+    # Suffixes lengthen a final a/e (számla -> számlát), so drop it in every form
+    if word[-1] in "aáeé" and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split into words, drop stopwords, stem and fold accents"""
+    tokens = []
+    for word in _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower()):
+        if word in STOPWORDS or word == "_":
+            continue
+        tokens.append(fold_accents(stem(word)))
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts
+    Postings are kept in memory as growable uint32 doc / uint16 tf arrays, loaded
+    lazily per term, and persisted as zlib-compressed delta-encoded blobs in SQLite.
+    Deleted chunks are tombstoned and dropped from postings by compact()
+    """
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                ord INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, length INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS docs_chunk ON docs(chunk_id);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT PRIMARY KEY, docs BLOB NOT NULL, tfs BLOB NOT NULL);
+        """)
+        self._conn.commit()
+
+        self._reset()
+        self._load_docs()
+
+    def _reset(self):
+        # Per-document state, indexed by ordinal
+        self._chunk_ids: List[Optional[str]] = []
+        self._lengths = array("I")
+        self._live = bytearray()
+        self._ord_by_chunk: Dict[str, int] = {}
+        self._total_length = 0
+        self._live_count = 0
+        self._dirty_docs: Dict[int, Tuple[str, int, int]] = {}
+
+        # term -> (doc ordinals, term frequencies); loaded on first use
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._dirty_terms = set()
+
+    def reload(self) -> bool:
+        """
+        Re-read the index written by another process; False (nothing reloaded) while
+        this process has unflushed changes
+        """
+        with self._lock:
+            if self._dirty_docs or self._dirty_terms:
+                return False
+            self._reset()
+            self._load_docs()
+            return True
+
+    def _load_docs(self):
+        for ord_, chunk_id, length, deleted in self._conn.execute(
+            "SELECT ord, chunk_id, length, deleted FROM docs ORDER BY ord"
+        ):
+            while len(self._chunk_ids) < ord_:
+                self._chunk_ids.append(None)
+                self._lengths.append(0)
+                self._live.append(0)
+            self._chunk_ids.append(chunk_id)
+            self._lengths.append(length)
+            self._live.append(0 if deleted else 1)
+            if not deleted:
+                self._ord_by_chunk[chunk_id] = ord_
+                self._total_length += length
+                self._live_count += 1
+
+    def _get_postings(self, term: str, create: bool = False) -> Optional[Tuple[array, array]]:
+        postings = self._postings.get(term)
+        if postings is not None:
+            return postings
+
+        row = self._conn.execute("SELECT docs, tfs FROM postings WHERE term = ?", (term,)).fetchone()
+        if row is not None:
+            docs = array("I", np.cumsum(np.frombuffer(zlib.decompress(row[0]), dtype=np.uint32), dtype=np.uint32).tobytes())
+            tfs = array("H")
+            tfs.frombytes(zlib.decompress(row[1]))
+            postings = (docs, tfs)
+        elif create:
+            postings = (array("I"), array("H"))
+        else:
+            return None
+
+        self._postings[term] = postings
+        return postings
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def add_many(self, chunk_ids: List[str], texts: List[str]):
+        """Index chunks, replacing earlier versions of the same chunk IDs"""
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                self.remove_many([chunk_id])
+                tokens = tokenize(text)
+                ord_ = len(self._chunk_ids)
+                self._chunk_ids.append(chunk_id)
+                self._lengths.append(len(tokens))
+                self._live.append(1)
+                self._ord_by_chunk[chunk_id] = ord_
+                self._total_length += len(tokens)
+                self._live_count += 1
+                self._dirty_docs[ord_] = (chunk_id, len(tokens), 0)
+
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    docs, tfs = self._get_postings(term, create=True)
+                    # Ordinals only grow, so appending keeps postings sorted
+                    docs.append(ord_)
+                    tfs.append(min(tf, 65535))
+                    self._dirty_terms.add(term)
+
+    def remove_many(self, chunk_ids: Iterable[str]):
+        """Tombstone chunks; their postings are dropped on the next compact()"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                ord_ = self._ord_by_chunk.pop(chunk_id, None)
+                if ord_ is None:
+                    continue
+                self._live[ord_] = 0
+                self._total_length -= self._lengths[ord_]
+                self._live_count -= 1
+                self._dirty_docs[ord_] = (chunk_id, self._lengths[ord_], 1)
+
+    def search(self, query: str, k: int = 10, allowed_chunk_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        BM25 top-k for a query
+        Returns dicts with chunk_id, score, coverage (fraction of query terms matched) and
+        relative_score (score as a fraction of the highest BM25 score any document could
+        reach for this query, so it is comparable across queries)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            if self._live_count == 0:
+                return []
+
+            live = np.frombuffer(bytes(self._live), dtype=np.uint8).astype(bool)
+            if allowed_chunk_ids is not None:
+                allowed = np.zeros(len(live), dtype=bool)
+                ords = [self._ord_by_chunk[c] for c in allowed_chunk_ids if c in self._ord_by_chunk]
+                allowed[ords] = True
+                live &= allowed
+
+            lengths = np.frombuffer(self._lengths.tobytes(), dtype=np.uint32).astype(np.float32)
+            avg_length = self._total_length / self._live_count
+            scores = np.zeros(len(live), dtype=np.float32)
+            matched = np.zeros(len(live), dtype=np.int32)
+            # Every term's tf factor saturates at k1 + 1; a term no document has gets the highest idf
+            max_score = 0.0
+
+            for term in terms:
+                postings = self._get_postings(term)
+                if postings is None or not len(postings[0]):
+                    max_score += math.log(1 + (self._live_count + 0.5) / 0.5) * (self.k1 + 1)
+                    continue
+                docs = np.frombuffer(postings[0].tobytes(), dtype=np.uint32)
+                tfs = np.frombuffer(postings[1].tobytes(), dtype=np.uint16).astype(np.float32)
+                keep = live[docs]
+                docs, tfs = docs[keep], tfs[keep]
+                idf = math.log(1 + (self._live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                max_score += idf * (self.k1 + 1)
+                if not len(docs):
+                    continue
+
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avg_length)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+                matched[docs] += 1
+
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                "chunk_id": self._chunk_ids[ord_],
+                "score": float(scores[ord_]),
+                "coverage": float(matched[ord_]) / len(terms),
+                "relative_score": float(scores[ord_]) / max_score
+            }
+            for ord_ in candidates
+        ]
+
+    def flush(self):
+        """Persist changed documents and postings"""
+        with self._lock:
+            if self._dirty_docs:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO docs (ord, chunk_id, length, deleted) VALUES (?, ?, ?, ?)",
+                    [(ord_, chunk_id, length, deleted) for ord_, (chunk_id, length, deleted) in self._dirty_docs.items()]
+                )
+                self._dirty_docs = {}
+
+            rows = []
+            for term in self._dirty_terms:
+                docs, tfs = self._postings[term]
+                deltas = np.diff(np.frombuffer(docs.tobytes(), dtype=np.uint32), prepend=np.uint32(0)).astype(np.uint32)
+                rows.append((term, zlib.compress(deltas.tobytes()), zlib.compress(tfs.tobytes())))
+            if rows:
+                self._conn.executemany("INSERT OR REPLACE INTO postings (term, docs, tfs) VALUES (?, ?, ?)", rows)
+            self._dirty_terms = set()
+            self._conn.commit()
+
+            # Rewrite postings once tombstones make up a large part of the index
+            dead = len(self._chunk_ids) - self._live_count
+            if dead > 1000 and dead > self._live_count * 0.3:
+                self.compact()
+
+    def compact(self):
+        """Drop tombstoned documents from every posting list and renumber documents"""
+        with self._lock:
+            logger.info("Compacting lexical index")
+            remap = np.full(len(self._chunk_ids), -1, dtype=np.int64)
+            live_ords = [ord_ for ord_ in range(len(self._chunk_ids)) if self._live[ord_]]
+            remap[live_ords] = np.arange(len(live_ords))
+
+            # Terms added since the last flush exist only in memory
+            terms = {term for (term,) in self._conn.execute("SELECT term FROM postings")} | self._dirty_terms
+            new_postings = {}
+            for term in terms:
+                docs, tfs = self._get_postings(term)
+                docs_np = np.frombuffer(docs.tobytes(), dtype=np.uint32)
+                keep = remap[docs_np] >= 0
+                if keep.any():
+                    new_postings[term] = (
+                        array("I", remap[docs_np][keep].astype(np.uint32).tobytes()),
+                        array("H", np.frombuffer(tfs.tobytes(), dtype=np.uint16)[keep].tobytes())
+                    )
+
+            self._chunk_ids = [self._chunk_ids[ord_] for ord_ in live_ords]
+            self._lengths = array("I", [self._lengths[ord_] for ord_ in live_ords])
+            self._live = bytearray([1] * len(live_ords))
+            self._ord_by_chunk = {chunk_id: ord_ for ord_, chunk_id in enumerate(self._chunk_ids)}
+            self._postings = new_postings
+
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._dirty_docs = {
+                ord_: (chunk_id, self._lengths[ord_], 0) for ord_, chunk_id in enumerate(self._chunk_ids)
+            }
+            self._dirty_terms = set(new_postings)
+            self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+            self._reset()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self._live_count,
+            "tombstones": len(self._chunk_ids) - self._live_count,
+            "loaded_terms": len(self._postings)
+        }
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection
+MinHash signatures + LSH banding to collapse near-identical chunks at ingestion time
+"""
+
+import re
+import zlib
+import logging
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Optional, Dict, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUMBER = re.compile(r"\d+")
+
+
+def numbers_key(text: str) -> str:
+    """
+    Digest of the numbers in text, in order
+    Templated documents (invoices, statements) are near-identical apart from their
+    numbers, so chunks only collapse when these match as well
+    """
+    numbers = "\x00".join(NUMBER.findall(text))
+    return hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class MinHasher:
+    """MinHash signatures over character shingles using multiply-shift hashing"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Odd multipliers keep multiply-shift hashing universal
+        self._a = rng.randint(1, 2 ** 62, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 2 ** 62, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """32-bit hashes of the distinct character shingles of normalized text"""
+        text = " ".join(text.lower().split())
+        size = self.shingle_size
+        if len(text) <= size:
+            grams = {text}
+        else:
+            grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+        return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint32 values)"""
+        hashes = self.shingles(text)
+        # (shingles x permutations) in one pass; the high 32 bits of a*x+b are the permuted hash
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Persistent LSH index over stored chunks, plus which files reference each stored chunk
+    A chunk is a near-duplicate of a stored one when their estimated Jaccard similarity
+    reaches threshold and both contain the same numbers; duplicates are not stored
+    again, only referenced
+    """
+
+    def __init__(self, path: Path, num_perm: int = 128, bands: int = 16, threshold: float = 0.85):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (chunk_id TEXT PRIMARY KEY, signature BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, chunk_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets(band, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_chunk ON buckets(chunk_id);
+            CREATE TABLE IF NOT EXISTS refs (
+                chunk_id TEXT NOT NULL, relative_path TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, relative_path)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS refs_path ON refs(relative_path);
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(signatures)")}
+        if "numbers" not in columns:
+            # Chunks indexed before numbers were tracked (NULL) are never matched
+            self._conn.execute("ALTER TABLE signatures ADD COLUMN numbers TEXT")
+        self._conn.commit()
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            band_bytes = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append(int.from_bytes(hashlib.blake2b(band_bytes, digest_size=7).digest(), "big"))
+        return keys
+
+    def find_duplicate(self, signature: np.ndarray, numbers: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        Most similar stored chunk at or above threshold with the same numbers_key, if any
+        Chunks in exclude are never matched (e.g. the previous version of the file being
+        re-indexed, so an edit is stored instead of collapsing into the old text)
+        """
+        exclude = set(exclude)
+        with self._lock:
+            candidates = set()
+            for band, bucket in enumerate(self._band_keys(signature)):
+                rows = self._conn.execute(
+                    "SELECT chunk_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                ).fetchall()
+                candidates.update(row[0] for row in rows)
+
+            best_id, best_score = None, self.threshold
+            for chunk_id in candidates - exclude:
+                row = self._conn.execute(
+                    "SELECT signature, numbers FROM signatures WHERE chunk_id = ?", (chunk_id,)
+                ).fetchone()
+                if row is None or row[1] != numbers:
+                    continue
+                score = float(np.mean(np.frombuffer(row[0], dtype=np.uint32) == signature))
+                if score >= best_score:
+                    best_id, best_score = chunk_id, score
+            return best_id
+
+    def add(self, chunk_id: str, signature: np.ndarray, numbers: str):
+        """Register a stored chunk so later near-duplicates resolve to it"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (chunk_id, signature, numbers) VALUES (?, ?, ?)",
+                (chunk_id, signature.astype(np.uint32).tobytes(), numbers)
+            )
+            self._conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, chunk_id) VALUES (?, ?, ?)",
+                [(band, bucket, chunk_id) for band, bucket in enumerate(self._band_keys(signature))]
+            )
+
+    def add_reference(self, chunk_id: str, relative_path: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO refs (chunk_id, relative_path) VALUES (?, ?)", (chunk_id, relative_path)
+            )
+
+    def remove_reference(self, chunk_id: str, relative_path: str) -> List[str]:
+        """
+        Drop one file's reference to a chunk and return the files still referencing it
+        When none remain the chunk is also dropped from the LSH index
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM refs WHERE chunk_id = ? AND relative_path = ?", (chunk_id, relative_path)
+            )
+            remaining = self.references(chunk_id)
+            if not remaining:
+                self._conn.execute("DELETE FROM signatures WHERE chunk_id = ?", (chunk_id,))
+                self._conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+            return remaining
+
+    def discard(self, chunk_id: str):
+        """Forget a chunk entirely (signature, buckets and references), e.g. when its vector is gone"""
+        with self._lock:
+            self._conn.execute("DELETE FROM signatures WHERE chunk_id = ?", (chunk_id,))
+            self._conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+            self._conn.execute("DELETE FROM refs WHERE chunk_id = ?", (chunk_id,))
+
+    def rename_references(self, old_relative_path: str, new_relative_path: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE OR REPLACE refs SET relative_path = ? WHERE relative_path = ?",
+                (new_relative_path, old_relative_path)
+            )
+
+    def chunks_for(self, relative_path: str) -> List[str]:
+        """Chunks referenced by a file"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM refs WHERE relative_path = ?", (relative_path,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def references(self, chunk_id: str) -> List[str]:
+        """Files referencing a chunk, in a stable order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT relative_path FROM refs WHERE chunk_id = ? ORDER BY relative_path", (chunk_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM signatures; DELETE FROM buckets; DELETE FROM refs;")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            chunks = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            references = self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {"indexed_chunks": chunks, "references": references}
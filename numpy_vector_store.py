@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+NumPy Vector Store
+Exact cosine search over an append-only, memory-mapped embedding matrix
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Metadata fields with SQLite expression indexes, so filters on them avoid a table scan
+INDEXED_FIELDS = ("relative_path", "source", "folder", "file_type", "modified")
+
+_SQL_OPERATORS = {"$eq": "=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma-style metadata filter into an SQL condition over the JSON metadata column"""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(clause) for clause in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+
+        if not re.fullmatch(r"\w+", key):
+            raise ValueError(f"Invalid metadata field: {key}")
+        # The path is inlined (not bound) so SQLite can use the expression indexes
+        field = f"json_extract(metadata, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op in _SQL_OPERATORS:
+                clauses.append(f"{field} {_SQL_OPERATORS[op]} ?")
+                params.append(operand)
+            elif op == "$ne":
+                clauses.append(f"{field} IS NOT ?")
+                params.append(operand)
+            elif op in ("$in", "$nin"):
+                operand = list(operand)
+                placeholders = ",".join("?" * len(operand))
+                if op == "$in":
+                    clauses.append(f"{field} IN ({placeholders})" if operand else "0")
+                else:
+                    clauses.append(f"({field} IS NULL OR {field} NOT IN ({placeholders}))" if operand else "1")
+                params.extend(operand)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class NumpyCollection:
+    """
+    Chroma-collection-compatible store: vectors live in one contiguous memory-mapped
+    matrix file, IDs, documents and metadata in a side SQLite table
+    Upserts and deletes tombstone old rows; compact() rewrites the matrix without them.
+    Other processes opening the same directory share the page cache and pick up
+    changes through a version counter
+    """
+
+    # Distances are 1 - cosine similarity
+    metadata = {"hnsw:space": "cosine"}
+
+    def __init__(self, path: Path, dtype: str = "float32", block_rows: int = 65536):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.matrix_path = self.path / "embeddings.bin"
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.path / "metadata.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, document TEXT,
+                metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS chunks_id ON chunks(chunk_id) WHERE deleted = 0;
+        """)
+        for field in INDEXED_FIELDS:
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS chunks_{field} ON chunks(json_extract(metadata, '$.{field}'))"
+            )
+        self._conn.commit()
+
+        # The dtype of an existing matrix wins over the configured one
+        self.dtype = np.dtype(self._meta("dtype") or dtype)
+        self._version = None
+        self._matrix = None
+        self._refresh()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, **values):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    def _refresh(self):
+        """Reload row state if this or another process changed the store"""
+        version = self._meta("version")
+        if version == self._version and self._matrix is not None:
+            return
+
+        self._version = version
+        self.dim = int(self._meta("dim") or 0)
+        self._row_count = int(self._meta("rows") or 0)
+        self._live = np.zeros(self._row_count, dtype=bool)
+        self._rows = {}
+        for row, chunk_id in self._conn.execute("SELECT row, chunk_id FROM chunks WHERE deleted = 0"):
+            self._live[row] = True
+            self._rows[chunk_id] = row
+
+        self._map_matrix()
+
+    def _map_matrix(self):
+        if self._row_count and self.dim:
+            self._matrix = np.memmap(self.matrix_path, dtype=self.dtype, mode="r", shape=(self._row_count, self.dim))
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+
+    def _commit(self):
+        self._set_meta(version=int(self._version or 0) + 1, rows=self._row_count, dim=self.dim, dtype=self.dtype.name)
+        self._conn.commit()
+        self._version = self._meta("version")
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Append vectors; earlier rows with the same IDs are tombstoned"""
+        if not ids:
+            return
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms > 0, norms, 1)).astype(self.dtype)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._lock:
+            self._refresh()
+            if not self.dim:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+
+            self._tombstone(ids)
+
+            # Bytes past the committed row count are left over from an interrupted write
+            expected_size = self._row_count * self.dim * self.dtype.itemsize
+            if self.matrix_path.exists() and self.matrix_path.stat().st_size != expected_size:
+                os.truncate(self.matrix_path, expected_size)
+            with open(self.matrix_path, "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            first_row = self._row_count
+            self._conn.executemany(
+                "INSERT INTO chunks (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (first_row + i, chunk_id, document, json.dumps(metadata, ensure_ascii=False))
+                    for i, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                ]
+            )
+            self._row_count += len(ids)
+            self._commit()
+
+            # Extend in-memory state instead of reloading every row
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            self._rows.update((chunk_id, first_row + i) for i, chunk_id in enumerate(ids))
+            self._map_matrix()
+
+    add = upsert
+
+    def _tombstone(self, ids: List[str]):
+        rows = [(self._rows.pop(chunk_id),) for chunk_id in ids if chunk_id in self._rows]
+        if rows:
+            self._conn.executemany("UPDATE chunks SET deleted = 1 WHERE row = ?", rows)
+            for (row,) in rows:
+                self._live[row] = False
+
+    def _select_rows(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Live rows matching IDs and a metadata filter, in insertion order"""
+        if where:
+            sql, params = where_to_sql(where)
+            rows = [row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND {sql} ORDER BY row", params
+            )]
+            if ids is not None:
+                wanted = {self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows}
+                rows = [row for row in rows if row in wanted]
+            return rows
+        if ids is not None:
+            return sorted(self._rows[chunk_id] for chunk_id in set(ids) if chunk_id in self._rows)
+        return sorted(self._rows.values())
+
+    def _load_rows(self, rows: List[int], include: List[str]) -> Dict[str, Any]:
+        """IDs plus the requested fields of the given rows, in the given order"""
+        records = {}
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for row, chunk_id, document, metadata in self._conn.execute(
+                f"SELECT row, chunk_id, document, metadata FROM chunks WHERE row IN ({placeholders})", part
+            ):
+                records[row] = (chunk_id, document, metadata)
+
+        result = {
+            "ids": [records[row][0] for row in rows],
+            "documents": [records[row][1] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(records[row][2]) for row in rows] if "metadatas" in include else None,
+            "embeddings": None
+        }
+        if "embeddings" in include:
+            result["embeddings"] = self._matrix[rows].astype(np.float32).tolist() if rows else []
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        if include is None:
+            include = ["metadatas", "documents"]
+        with self._lock:
+            self._refresh()
+            rows = self._select_rows(ids, where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._load_rows(rows, include)
+
+    def update(self, ids: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+               documents: Optional[List[str]] = None):
+        with self._lock:
+            self._refresh()
+            if metadatas is not None:
+                self._conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE row = ?",
+                    [
+                        (json.dumps(metadata, ensure_ascii=False), self._rows[chunk_id])
+                        for chunk_id, metadata in zip(ids, metadatas) if chunk_id in self._rows
+                    ]
+                )
+            if documents is not None:
+                self._conn.executemany(
+                    "UPDATE chunks SET document = ? WHERE row = ?",
+                    [(document, self._rows[chunk_id]) for chunk_id, document in zip(ids, documents) if chunk_id in self._rows]
+                )
+            self._commit()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._refresh()
+            if where:
+                ids = self._load_rows(self._select_rows(ids, where), [])["ids"]
+            self._tombstone(ids or [])
+            self._commit()
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Exact top-n cosine search for each query
+        A filter is resolved to rows first (through the metadata indexes), so only
+        matching vectors are scored and every query still gets n_results matches
+        """
+        if include is None:
+            include = ["metadatas", "documents", "distances"]
+        queries = self._normalize_queries(query_embeddings)
+
+        with self._lock:
+            self._refresh()
+            live = self._live_mask(where)
+            rows = np.flatnonzero(live) if where else None
+            return self._query_result(*self._exact_top(queries, n_results, live, rows), include)
+
+    def _exact_top(self, queries: np.ndarray, n_results: int, live: np.ndarray,
+                   rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-query top-n scores and rows among live rows, in blocks of block_rows
+        Each block keeps only its top-n (argpartition), so memory stays bounded.
+        With rows given, only those rows are gathered and scored
+        """
+        # Gathering scattered rows only pays off when they are a small part of the matrix
+        if rows is not None and len(rows) * 2 > self._row_count:
+            rows = None
+        total = self._row_count if rows is None else len(rows)
+
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, self.block_rows):
+            end = min(start + self.block_rows, total)
+            mask = None
+            if rows is None:
+                mask = live[start:end]
+                if not mask.any():
+                    continue
+                block_rows = np.arange(start, end)
+                vectors = self._matrix[start:end]
+            else:
+                block_rows = rows[start:end]
+                vectors = self._matrix[block_rows]
+
+            scores = queries @ np.asarray(vectors, dtype=np.float32).T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            k = min(n_results, end - start)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, block_rows[top]], axis=1)
+
+            # Keep the running candidate set at n_results per query
+            if best_scores.shape[1] > n_results:
+                keep = np.argpartition(-best_scores, n_results - 1, axis=1)[:, :n_results]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        return best_scores, best_rows
+
+    @staticmethod
+    def _normalize_queries(query_embeddings: List[List[float]]) -> np.ndarray:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries / np.where(norms > 0, norms, 1)
+
+    def _live_mask(self, where: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """Boolean mask over rows that are live and match the filter"""
+        if not where:
+            return self._live
+        live = np.zeros_like(self._live)
+        live[self._select_rows(where=where)] = True
+        return live
+
+    def _query_result(self, best_scores: np.ndarray, best_rows: np.ndarray, include: List[str]) -> Dict[str, Any]:
+        """Chroma-style query result from per-query candidate scores and rows (-inf marks no match)"""
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for scores, rows in zip(best_scores, best_rows):
+            valid = np.isfinite(scores)
+            loaded = self._load_rows(rows[valid].tolist(), include)
+            result["ids"].append(loaded["ids"])
+            result["documents"].append(loaded["documents"])
+            result["metadatas"].append(loaded["metadatas"])
+            result["embeddings"].append(loaded["embeddings"])
+            result["distances"].append((1.0 - scores[valid]).tolist())
+        for field in ("documents", "metadatas", "embeddings", "distances"):
+            if field not in include:
+                result[field] = None
+        return result
+
+    def compact(self):
+        """Rewrite the matrix and row table without tombstoned rows"""
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live)
+            if len(live_rows) == self._row_count:
+                return
+
+            logger.info(f"Compacting vector matrix ({self._row_count - len(live_rows)} deleted rows)")
+            tmp_path = self.matrix_path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(live_rows), self.block_rows):
+                    f.write(np.asarray(self._matrix[live_rows[start:start + self.block_rows]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._conn.execute("DELETE FROM chunks WHERE deleted = 1")
+            self._conn.execute("CREATE TEMP TABLE renumber (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            self._conn.executemany(
+                "INSERT INTO renumber (old, new) VALUES (?, ?)",
+                [(int(old), new) for new, old in enumerate(live_rows)]
+            )
+            # Shift rows out of the way first so renumbering never collides
+            self._conn.execute("UPDATE chunks SET row = -1 - row")
+            self._conn.execute("UPDATE chunks SET row = (SELECT new FROM renumber WHERE old = -1 - chunks.row)")
+            self._conn.execute("DROP TABLE renumber")
+            self._row_count = len(live_rows)
+            self._matrix = None
+            os.replace(tmp_path, self.matrix_path)
+            self._commit()
+            self._refresh()
+
+    def close(self):
+        with self._lock:
+            self._matrix = None
+            self._conn.close()
+
+
+class NumpyVectorStore:
+    """Minimal vector store wrapper exposing the parts of LangChain's Chroma that RAGManager uses"""
+
+    def __init__(self, path: Path, dtype: str = "float32", block_rows: int = 65536, compact_ratio: float = 0.3):
+        self.path = Path(path)
+        self.compact_ratio = compact_ratio
+        self._collection = NumpyCollection(self.path, dtype=dtype, block_rows=block_rows)
+
+    def delete(self, ids: Optional[List[str]] = None):
+        self._collection.delete(ids=ids)
+
+    def delete_collection(self):
+        self._collection.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def persist(self):
+        """Compact once deleted rows make up compact_ratio of the matrix"""
+        collection = self._collection
+        dead = collection._row_count - collection.count()
+        if dead and dead >= collection._row_count * self.compact_ratio:
+            collection.compact()
@@ -0,0 +1,16 @@
+"""
+RAG service settings, read from the environment (.env is loaded by main.py)
+"""
+
+import os
+
+# Unix socket the app processes connect to (set the same value for the app)
+SOCKET_PATH = os.getenv("RAG_SERVICE_SOCKET", "/tmp/rag-service.sock")
+
+# Data directory shared with the app; None uses the RAG manager default (_databricks)
+BASE_DIR = os.getenv("RAG_BASE_DIR") or None
+
+# Micro-batching: concurrent searches are collected until the batch is full
+# or the oldest request has waited MAX_BATCH_WAIT_MS, then run as one model call
+MAX_BATCH_SIZE = int(os.getenv("RAG_SERVICE_MAX_BATCH_SIZE", "32"))
+MAX_BATCH_WAIT_MS = float(os.getenv("RAG_SERVICE_MAX_BATCH_WAIT_MS", "5"))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+RAG Service
+Standalone embedding/search worker shared by every app process
+Usage: python rag-service/main.py   (then start the app with the same RAG_SERVICE_SOCKET)
+"""
+
+import os
+import sys
+import logging
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SERVICE_DIR))
+sys.path.insert(0, SERVICE_DIR)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import settings
+from services.rag_service import RAGService
+from rag_manager import RAGManager
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    print("🚀 Starting RAG service...")
+    rag_manager = RAGManager(settings.BASE_DIR)
+    if not rag_manager.is_ready():
+        print("❌ RAG manager failed to initialize")
+        return 1
+
+    service = RAGService(rag_manager, settings.MAX_BATCH_SIZE, settings.MAX_BATCH_WAIT_MS)
+    print(f"✅ Listening on {settings.SOCKET_PATH} "
+          f"(max batch {settings.MAX_BATCH_SIZE}, max wait {settings.MAX_BATCH_WAIT_MS} ms)")
+    try:
+        service.serve_forever(settings.SOCKET_PATH)
+    except KeyboardInterrupt:
+        print("\n👋 RAG service stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
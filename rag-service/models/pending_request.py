@@ -0,0 +1,35 @@
+"""
+A request waiting in the micro-batcher queue
+"""
+
+import time
+import threading
+from typing import Any, Dict, Optional
+
+
+class PendingRequest:
+    """Payload plus a slot for the result, filled in by the batch worker"""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self.enqueued_at = time.monotonic()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+
+    def set_result(self, result: Any):
+        self.result = result
+        self._done.set()
+
+    def set_error(self, error: BaseException):
+        self.error = error
+        self._done.set()
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,89 @@
+"""
+Dynamic micro-batching
+Requests that arrive while the worker is busy, or within the max wait of each
+other, are handed to the batch handler together
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+from models.pending_request import PendingRequest
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Single worker thread that drains a request queue in batches"""
+
+    def __init__(self, handler: Callable[[List[PendingRequest]], None],
+                 max_batch_size: int = 32, max_batch_wait_ms: float = 5.0, name: str = "batcher"):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_wait = max(0.0, max_batch_wait_ms) / 1000.0
+        self._queue: "queue.Queue[PendingRequest]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, payload: Dict[str, Any]) -> Any:
+        """Queue a request and block until its batch has been processed"""
+        request = PendingRequest(payload)
+        self._queue.put(request)
+        return request.wait()
+
+    def _collect(self) -> List[PendingRequest]:
+        batch = [self._queue.get()]
+        # The wait is measured from the oldest request, so no request waits longer than max_batch_wait
+        deadline = batch[0].enqueued_at + self.max_batch_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Whatever queued up while the previous batch ran is taken without waiting
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self.handler(batch)
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} requests failed: {e}")
+                for request in batch:
+                    request.set_error(e)
+            else:
+                for request in batch:
+                    if not request.is_done():
+                        request.set_error(RuntimeError("Request was not answered by the batch handler"))
+
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "average_batch_size": round(self.requests / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest_batch,
+                "max_batch_size": self.max_batch_size,
+                "max_batch_wait_ms": self.max_batch_wait * 1000,
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,154 @@
+"""
+Shared embedding/search worker
+One process owns the embedding model and the vector store; app processes call it
+over a Unix socket (see rag_client.RemoteRAGManager). Concurrent searches are
+micro-batched so throughput grows with batch size instead of with model copies
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from rag_client import send_message, recv_message
+from models.pending_request import PendingRequest
+from services.batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class RAGService:
+    """Dispatches socket requests to a RAGManager, batching the searches"""
+
+    # Methods of RAGManager the app may call directly
+    FORWARDED_METHODS = {
+        "is_ready", "get_supported_file_types", "index_paths", "remove_paths",
+        "move_path", "delete_by_source", "clear_database", "train_vector_index",
+        "train_vector_index_if_due", "warm_up",
+    }
+
+    def __init__(self, rag_manager, max_batch_size: int = 32, max_batch_wait_ms: float = 5.0):
+        self.rag_manager = rag_manager
+        self.batcher = MicroBatcher(self._search_batch, max_batch_size, max_batch_wait_ms, name="search-batcher")
+
+    def search_many(self, queries: List[str], top_k: int = None, min_score: float = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        if not queries:
+            return []
+        return self.batcher.submit({
+            "queries": list(queries), "top_k": top_k, "min_score": min_score, "filters": filters,
+        })
+
+    def search_documents(self, query: str, top_k: int = None, min_score: float = None,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many([query], top_k, min_score, filters)[0]
+
+    def _search_batch(self, requests: List[PendingRequest]):
+        """Requests sharing top_k / min_score / filters become one search_many call (one forward pass)"""
+        groups = OrderedDict()
+        for request in requests:
+            payload = request.payload
+            key = (payload["top_k"], payload["min_score"], json.dumps(payload["filters"], sort_keys=True))
+            groups.setdefault(key, []).append(request)
+
+        for group in groups.values():
+            first = group[0].payload
+            queries = [query for request in group for query in request.payload["queries"]]
+            try:
+                results = self.rag_manager.search_many(queries, first["top_k"], first["min_score"], first["filters"])
+            except Exception as e:
+                for request in group:
+                    request.set_error(e)
+                continue
+
+            offset = 0
+            for request in group:
+                count = len(request.payload["queries"])
+                request.set_result(results[offset:offset + count])
+                offset += count
+
+    def get_database_stats(self) -> Dict[str, Any]:
+        stats = self.rag_manager.get_database_stats()
+        stats["rag_service"] = self.batcher.stats()
+        return stats
+
+    def dispatch(self, method: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        if method in ("search_documents", "search_many", "get_database_stats"):
+            return getattr(self, method)(*args, **kwargs)
+        if method in self.FORWARDED_METHODS:
+            return getattr(self.rag_manager, method)(*args, **kwargs)
+        raise ValueError(f"Unknown method: {method}")
+
+    def handle_connection(self, conn: socket.socket):
+        message = recv_message(conn)
+        if message is None:
+            return
+
+        method = message.get("method")
+        try:
+            if method == "process_documents":
+                result = self._process_documents(conn)
+            else:
+                result = self.dispatch(method, message.get("args", []), message.get("kwargs", {}))
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            logger.error(f"RAG service call {method} failed: {e}")
+            response = {"ok": False, "error": str(e), "type": type(e).__name__}
+
+        send_message(conn, response)
+
+    def _process_documents(self, conn: socket.socket) -> Dict[str, Any]:
+        """Ingestion with progress frames; a {"cancel": true} frame from the client stops it"""
+        send_lock = threading.Lock()
+        cancel_event = threading.Event()
+
+        def watch_for_cancel():
+            try:
+                while True:
+                    message = recv_message(conn)
+                    if message is None:
+                        break
+                    if message.get("cancel"):
+                        cancel_event.set()
+            except OSError:
+                pass
+            # A client that went away cannot receive the result; stop the job as well
+            cancel_event.set()
+
+        def progress_callback(progress, status):
+            with send_lock:
+                try:
+                    send_message(conn, {"progress": progress, "status": status})
+                except OSError:
+                    cancel_event.set()
+
+        threading.Thread(target=watch_for_cancel, name="ingest-cancel-watch", daemon=True).start()
+        return self.rag_manager.process_documents(progress_callback, cancel_event=cancel_event)
+
+    def serve_forever(self, socket_path: str):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        service = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    service.handle_connection(self.request)
+                except OSError as e:
+                    logger.warning(f"RAG service connection dropped: {e}")
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        with Server(socket_path, Handler) as server:
+            logger.info(f"RAG service listening on {socket_path}")
+            try:
+                server.serve_forever()
+            finally:
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+RAG Client
+Talks to the shared rag-service worker over a Unix socket (length-prefixed JSON frames)
+"""
+
+import json
+import socket
+import struct
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]):
+    """Send one frame: 4-byte big-endian length + UTF-8 JSON"""
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Receive one frame; None when the peer closed the connection"""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+class RAGServiceError(RuntimeError):
+    """Error raised by the rag-service worker"""
+
+
+class RemoteRAGManager:
+    """
+    Stand-in for RAGManager that forwards calls to the rag-service worker
+    The app process then loads neither the embedding model nor the vector store;
+    one worker serves every app process and batches their concurrent searches
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 300.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _call(self, method: str, *args, **kwargs):
+        with self._connect() as sock:
+            send_message(sock, {"method": method, "args": list(args), "kwargs": kwargs})
+            return self._read_result(recv_message(sock))
+
+    @staticmethod
+    def _read_result(response: Optional[Dict[str, Any]]):
+        if response is None:
+            raise RAGServiceError("RAG service closed the connection")
+        if response.get("ok"):
+            return response.get("result")
+        # Invalid input (e.g. search filters) keeps its type so callers can answer 400
+        if response.get("type") == "ValueError":
+            raise ValueError(response.get("error"))
+        raise RAGServiceError(response.get("error"))
+
+    def is_ready(self) -> bool:
+        try:
+            return bool(self._call("is_ready"))
+        except (OSError, RAGServiceError) as e:
+            logger.warning(f"RAG service not reachable: {e}")
+            return False
+
+    def search_documents(self, query: str, top_k: int = None, min_score: float = None,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._call("search_documents", query, top_k, min_score, filters)
+
+    def search_many(self, queries: List[str], top_k: int = None, min_score: float = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        return self._call("search_many", queries, top_k, min_score, filters)
+
+    def get_database_stats(self) -> Dict[str, Any]:
+        try:
+            return self._call("get_database_stats")
+        except (OSError, RAGServiceError) as e:
+            return {"status": "error", "error": f"RAG service not reachable: {e}"}
+
+    def get_supported_file_types(self) -> List[str]:
+        return self._call("get_supported_file_types")
+
+    def index_paths(self, relative_paths: List[str]) -> Dict[str, Any]:
+        return self._call("index_paths", relative_paths)
+
+    def remove_paths(self, relative_paths: List[str]) -> int:
+        return self._call("remove_paths", relative_paths)
+
+    def move_path(self, old_relative_path: str, new_relative_path: str) -> int:
+        return self._call("move_path", old_relative_path, new_relative_path)
+
+    def delete_by_source(self, relative_path: str):
+        return self._call("delete_by_source", relative_path)
+
+    def clear_database(self) -> bool:
+        return self._call("clear_database")
+
+    def warm_up(self) -> Dict[str, Any]:
+        return self._call("warm_up")
+
+    def train_vector_index(self, sample_size: Optional[int] = None) -> bool:
+        return self._call("train_vector_index", sample_size)
+
+    def train_vector_index_if_due(self) -> bool:
+        return self._call("train_vector_index_if_due")
+
+    def process_documents(self, progress_callback=None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Run ingestion in the worker; progress frames are relayed to progress_callback
+        and setting cancel_event asks the worker to stop after its current batch
+        """
+        with self._connect() as sock:
+            send_message(sock, {"method": "process_documents", "args": [], "kwargs": {}})
+            sock.settimeout(0.5)
+            cancel_sent = False
+            while True:
+                try:
+                    response = recv_message(sock)
+                except socket.timeout:
+                    if cancel_event is not None and cancel_event.is_set() and not cancel_sent:
+                        send_message(sock, {"cancel": True})
+                        cancel_sent = True
+                    continue
+
+                if response is not None and "progress" in response:
+                    if progress_callback:
+                        progress_callback(response["progress"], response.get("status", ""))
+                    continue
+                return self._read_result(response)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+RAG Indexer
+Applies FileManager change events to the vector index in a background thread
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundIndexer:
+    """
+    Consumes 'created', 'deleted' and 'moved' file events and updates only the affected chunks
+    Consecutive 'created' events are indexed together; moves only re-tag chunk metadata
+    If the RAG manager fails to initialize, events are held and initialization is retried
+    with exponential backoff (retry_seconds doubling up to max_retry_seconds), not per event
+    """
+
+    def __init__(self, get_rag_manager: Callable, retry_seconds: float = 30, max_retry_seconds: float = 900):
+        self.get_rag_manager = get_rag_manager
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="rag-indexer", daemon=True)
+        self._thread.start()
+
+    def handle_change(self, event: str, path: str, new_path: Optional[str] = None):
+        """FileManager change listener: queue the event and return immediately"""
+        self._events.put((event, path, new_path))
+
+    def _drain(self, events: list):
+        """Append whatever else is queued, so bursts (bulk uploads, copies) are handled together"""
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run(self):
+        failures = 0
+        while True:
+            events = [self._events.get()]
+            self._drain(events)
+
+            rag_manager = self.get_rag_manager()
+            while rag_manager is None:
+                delay = min(self.retry_seconds * 2 ** failures, self.max_retry_seconds)
+                failures += 1
+                logger.warning(f"RAG manager unavailable; retrying {len(events)} file changes in {delay:.0f}s")
+                time.sleep(delay)
+                self._drain(events)
+                rag_manager = self.get_rag_manager()
+            failures = 0
+
+            try:
+                self._apply(rag_manager, events)
+                rag_manager.train_vector_index_if_due()
+            except Exception as e:
+                logger.error(f"Failed to apply file changes to RAG index: {e}")
+
+    def _apply(self, rag_manager, events):
+        created = []
+        for event, path, new_path in events:
+            if event == 'created':
+                created.append(path)
+                continue
+
+            # Keep ordering: index pending creations before a delete or move can touch them
+            if created:
+                rag_manager.index_paths(created)
+                created = []
+
+            if event == 'deleted':
+                rag_manager.remove_paths([path])
+            elif event == 'moved':
+                rag_manager.move_path(path, new_path)
+            else:
+                logger.warning(f"Unknown file change event: {event}")
+
+        if created:
+            rag_manager.index_paths(created)
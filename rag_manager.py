@@ -5,28 +5,286 @@ State-of-the-art RAG rendszer LangChain + ChromaDB + Sentence Transformers haszn
 """
 
 import os
+import copy
 import json
+import hashlib
+import queue
 import logging
-from typing import List, Tuple, Optional, Dict, Any
-from pathlib import Path
+import sqlite3
+import multiprocessing
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait as futures_wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Optional, Dict, Any, TYPE_CHECKING
+from pathlib import Path, PurePosixPath
+import time
 import traceback
+from datetime import datetime, timedelta
 
-# RAG dependencies
-try:
-    from langchain_community.document_loaders import PyPDFLoader, TextLoader, JSONLoader
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    from langchain_community.vectorstores import Chroma
-    from langchain.docstore.document import Document
+import numpy as np
+
+# RAG dependencies (LangChain, sentence-transformers/torch, Chroma) are imported where
+# they are used, so importing this module - and starting the web app - stays fast
+if TYPE_CHECKING:
     from langchain.schema import Document as LangChainDocument
-except ImportError as e:
-    print(f"RAG dependencies not installed: {e}")
-    print("Run: pip install -r requirements.txt")
+
+from embedding_cache import EmbeddingCache, CachedEmbeddings, normalize_text
+from near_duplicates import NearDuplicateIndex, numbers_key
+from lexical_index import LexicalIndex, tokenize
+from numpy_vector_store import NumpyVectorStore
+from ivfpq_index import IVFPQVectorStore
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class IngestionManifest:
+    """
+    Persisted record of ingested files: size, mtime, content hash and chunk IDs
+    per file, keyed by the path relative to the uploads directory
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        # Files per folder, and folder filter prefix -> matching folders (valid until the folders change)
+        self._folder_counts: Dict[str, int] = {}
+        self._folders_under: Dict[str, List[str]] = {}
+        self._load()
+    
+    def _load(self):
+        """Load manifest from disk, starting empty if it is missing or unreadable"""
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    self.files = data.get("files", {})
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable ingestion manifest {self.path}: {e}")
+                self.files = {}
+        self._count_folders()
+    
+    def _count_folders(self):
+        self._folder_counts = {}
+        for key in self.files:
+            folder = self._folder(key)
+            self._folder_counts[folder] = self._folder_counts.get(folder, 0) + 1
+        self._folders_under = {}
+    
+    @staticmethod
+    def _folder(key: str) -> str:
+        folder = PurePosixPath(key).parent.as_posix()
+        return "" if folder == "." else folder
+    
+    def reload(self):
+        """Re-read the manifest, e.g. after another process changed it"""
+        self.files = {}
+        self._load()
+    
+    def save(self):
+        """Atomically write manifest to disk"""
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(key)
+    
+    def set(self, key: str, entry: Dict[str, Any]):
+        if key not in self.files:
+            folder = self._folder(key)
+            self._folder_counts[folder] = self._folder_counts.get(folder, 0) + 1
+            if self._folder_counts[folder] == 1:
+                self._folders_under = {}
+        self.files[key] = entry
+    
+    def remove(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.files.pop(key, None)
+        if entry is not None:
+            folder = self._folder(key)
+            self._folder_counts[folder] -= 1
+            if not self._folder_counts[folder]:
+                del self._folder_counts[folder]
+                self._folders_under = {}
+        return entry
+    
+    def keys(self) -> List[str]:
+        return list(self.files.keys())
+    
+    def folders_under(self, prefix: str) -> List[str]:
+        """Indexed folders equal to or below prefix ("" is the uploads root), sorted"""
+        folders = self._folders_under.get(prefix)
+        if folders is None:
+            folders = sorted(
+                folder for folder in list(self._folder_counts)
+                if not prefix or folder == prefix or folder.startswith(prefix + "/")
+            )
+            self._folders_under[prefix] = folders
+        return folders
+    
+    def clear(self):
+        self.files = {}
+        self._count_folders()
+
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping with hit/miss counters"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class IndexGeneration:
+    """
+    Index change counter shared by every process using the same index directory
+    Kept in SQLite (WAL) next to the manifest; reading it is one primary-key lookup
+    """
+    
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)"
+        )
+        self._conn.execute("INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0)")
+        self._conn.commit()
+    
+    def current(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+    
+    def bump(self) -> int:
+        """Increment the counter; returns the new value"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("UPDATE generation SET value = value + 1 WHERE id = 0")
+            return self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+
+
+def file_sha256(file_path: Path, block_size: int = 1024 * 1024) -> str:
+    """Compute SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(relative_path: str, chunk_index: int, content: str) -> str:
+    """Stable chunk ID derived from (relative path, chunk index, content hash)"""
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{relative_path}\x00{chunk_index}\x00{content_hash}".encode('utf-8')).hexdigest()[:32]
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int,
+                               lambda_mult: float = 0.5) -> List[int]:
+    """
+    Greedy MMR selection: each step takes the candidate maximising
+    lambda * relevance - (1 - lambda) * (highest similarity to an already selected candidate)
+    The candidate similarity matrix is computed once; returns indices in selection order
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+    
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+    
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(len(relevance), dtype=bool)
+    available[selected[0]] = False
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+def load_document(file_path: Path) -> List["LangChainDocument"]:
+    """
+    Load a single document based on file type
+    Module-level so loader processes can run it
+    """
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+    from langchain.schema import Document as LangChainDocument
+    
+    try:
+        if file_path.suffix.lower() == '.pdf':
+            loader = PyPDFLoader(str(file_path))
+        elif file_path.suffix.lower() == '.txt':
+            loader = TextLoader(str(file_path), encoding='utf-8')
+        elif file_path.suffix.lower() == '.md':
+            loader = TextLoader(str(file_path), encoding='utf-8')
+        elif file_path.suffix.lower() == '.json':
+            # For JSON files, try to extract text content
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            # Convert JSON to text
+            if isinstance(data, dict):
+                text_content = json.dumps(data, indent=2, ensure_ascii=False)
+            elif isinstance(data, list):
+                text_content = json.dumps(data, indent=2, ensure_ascii=False)
+            else:
+                text_content = str(data)
+            
+            # Create document manually
+            return [LangChainDocument(
+                page_content=text_content,
+                metadata={"source": file_path.name}
+            )]
+        else:
+            logger.warning(f"Unsupported file type: {file_path.suffix}")
+            return []
+        
+        return loader.load()
+    
+    except Exception as e:
+        logger.error(f"Failed to load document {file_path}: {e}")
+        raise
+
+
 class RAGManager:
     """
     Professional RAG Manager for document processing and retrieval
@@ -41,9 +299,10 @@ class RAGManager:
         self.uploads_dir = self.base_dir / "uploads"
         self.vector_db_dir = self.base_dir / "vector_db"
         self.config_dir = self.base_dir / "config"
+        self.embedding_cache_dir = self.base_dir / "embedding_cache"
         
         # Create directories if they don't exist
-        for dir_path in [self.uploads_dir, self.vector_db_dir, self.config_dir]:
+        for dir_path in [self.uploads_dir, self.vector_db_dir, self.config_dir, self.embedding_cache_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
         
         # Configuration
@@ -52,11 +311,63 @@ class RAGManager:
             "chunk_size": 1000,
             "chunk_overlap": 200,
             "top_k": 5,
-            "collection_name": "documents"
+            "min_relevance_score": 0.25,
+            "adaptive_k_ratio": 0.75,
+            "embedding_batch_size": 64,
+            "ingest_max_in_flight": 4,
+            "loader_workers": os.cpu_count() or 1,
+            "loader_timeout": 300,
+            "collection_name": "documents",
+            "vector_backend": "chroma",  # chroma | numpy (memory-mapped exact search) | ivfpq (approximate)
+            "numpy_dtype": "float32",  # float32 | float16 (halves matrix size)
+            "numpy_block_rows": 65536,
+            "ivf_nlist": 1024,
+            "ivf_nprobe": 16,
+            "pq_code_size": 16,  # bytes per vector; must divide the embedding dimension
+            "ivf_refine_factor": 4,
+            "ivf_train_size": 50000,
+            "ivf_train_min_rows": 10000,  # trained after an ingestion job or indexer run reaches it
+            "embedding_cache_max_mb": 512,
+            "dedup_enabled": True,
+            "dedup_threshold": 0.85,
+            "query_embedding_cache_size": 1024,
+            "search_cache_size": 1024,
+            "search_mode": "hybrid",  # hybrid | vector | lexical
+            "rrf_k": 60,
+            "lexical_candidates": 20,
+            "lexical_min_coverage": 0.5,
+            "lexical_shortcut": True,
+            "lexical_shortcut_max_terms": 3,
+            "mmr_enabled": True,  # Diversify results so overlapping/duplicate chunks don't crowd the prompt
+            "mmr_fetch_k": 20,
+            "mmr_lambda": 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
         }
         
+        # Ingestion manifest (tracks which files are already embedded)
+        self.manifest = IngestionManifest(self.config_dir / "ingestion_manifest.json")
+        
+        # Serializes full runs and incremental updates that touch the manifest
+        self._index_lock = threading.RLock()
+        
+        # Query-side caches; every index change bumps the generation so cached results are never stale.
+        # The counter is shared through config_dir, so an ingest in another process invalidates them too
+        self._generation = IndexGeneration(self.config_dir / "index_generation.sqlite3")
+        self._index_generation = self._generation.current()
+        self._query_embedding_cache = LRUCache(self.config["query_embedding_cache_size"])
+        self._search_cache = LRUCache(self.config["search_cache_size"])
+        
+        # MinHash/LSH index of stored chunks and the files referencing each of them
+        self.near_duplicates = NearDuplicateIndex(
+            self.config_dir / "near_duplicates.sqlite3",
+            threshold=self.config["dedup_threshold"]
+        )
+        
+        # BM25 index over the same chunks, for exact terms (invoice numbers, names) embeddings miss
+        self.lexical_index = LexicalIndex(self.config_dir / "lexical_index.sqlite3")
+        
         # Initialize components
         self.embeddings = None
+        self.embedding_cache = None
         self.vectorstore = None
         self.text_splitter = None
         
@@ -65,11 +376,26 @@ class RAGManager:
     def _initialize_components(self):
         """Initialize RAG components"""
         try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            
             # Initialize embeddings
             logger.info(f"Loading embedding model: {self.config['embedding_model']}")
-            self.embeddings = HuggingFaceEmbeddings(
+            base_embeddings = HuggingFaceEmbeddings(
                 model_name=self.config["embedding_model"],
-                model_kwargs={'device': 'cpu'}  # Use CPU for compatibility
+                model_kwargs={'device': 'cpu'},  # Use CPU for compatibility
+                encode_kwargs={'normalize_embeddings': True}  # Distances map directly to cosine similarity
+            )
+            
+            # Serve already-seen chunk texts from the on-disk embedding cache
+            self.embedding_cache = EmbeddingCache(
+                self.embedding_cache_dir / "embeddings.sqlite3",
+                max_bytes=self.config["embedding_cache_max_mb"] * 1024 * 1024
+            )
+            self.embeddings = CachedEmbeddings(
+                base_embeddings,
+                self.embedding_cache,
+                model_name=self.config["embedding_model"]
             )
             
             # Initialize text splitter
@@ -83,8 +409,24 @@ class RAGManager:
             # Initialize or load vector store
             self._load_or_create_vectorstore()
             
+            # An empty store with a populated manifest (new or switched backend) needs a full re-index
+            if self.vectorstore._collection.count() == 0 and self.manifest.keys():
+                logger.info("Vector store is empty; all files will be re-indexed")
+                self.manifest.clear()
+                self.manifest.save()
+                self.near_duplicates.clear()
+                self.lexical_index.clear()
+            
+            # Chunks indexed before the lexical index existed
+            if len(self.lexical_index) == 0 and self.vectorstore._collection.count() > 0:
+                self._rebuild_lexical_index()
+            
             logger.info("RAG Manager initialized successfully")
             
+        except ImportError as e:
+            logger.error(f"RAG dependencies not installed: {e}")
+            logger.error("Run: pip install -r requirements.txt")
+            raise
         except Exception as e:
             logger.error(f"Failed to initialize RAG components: {e}")
             logger.error(traceback.format_exc())
@@ -93,7 +435,28 @@ class RAGManager:
     def _load_or_create_vectorstore(self):
         """Load existing vector store or create new one"""
         try:
-            if (self.vector_db_dir / "chroma.sqlite3").exists():
+            if self.config["vector_backend"] == "numpy":
+                logger.info("Loading memory-mapped NumPy vector store")
+                self.vectorstore = NumpyVectorStore(
+                    self.vector_db_dir / "numpy" / self.config["collection_name"],
+                    dtype=self.config["numpy_dtype"],
+                    block_rows=self.config["numpy_block_rows"]
+                )
+            elif self.config["vector_backend"] == "ivfpq":
+                logger.info("Loading IVF-PQ vector store")
+                self.vectorstore = IVFPQVectorStore(
+                    self.vector_db_dir / "ivfpq" / self.config["collection_name"],
+                    nlist=self.config["ivf_nlist"],
+                    nprobe=self.config["ivf_nprobe"],
+                    m=self.config["pq_code_size"],
+                    refine_factor=self.config["ivf_refine_factor"],
+                    train_size=self.config["ivf_train_size"],
+                    train_min_rows=self.config["ivf_train_min_rows"],
+                    dtype=self.config["numpy_dtype"],
+                    block_rows=self.config["numpy_block_rows"]
+                )
+            elif (self.vector_db_dir / "chroma.sqlite3").exists():
+                from langchain_community.vectorstores import Chroma
                 logger.info("Loading existing vector store")
                 self.vectorstore = Chroma(
                     persist_directory=str(self.vector_db_dir),
@@ -101,6 +464,7 @@ class RAGManager:
                     collection_name=self.config["collection_name"]
                 )
             else:
+                from langchain_community.vectorstores import Chroma
                 logger.info("Creating new vector store")
                 self.vectorstore = Chroma(
                     persist_directory=str(self.vector_db_dir),
@@ -115,174 +479,1193 @@ class RAGManager:
         """Get list of supported file types"""
         return ['.pdf', '.txt', '.json', '.md']
     
-    def process_documents(self, progress_callback=None) -> Dict[str, Any]:
+    def process_documents(self, progress_callback=None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
-        Process all documents in uploads directory
+        Process new and changed documents anywhere in the uploads tree
+        Unchanged files are skipped, chunks of changed or deleted files are removed
+        Files stream through load -> split -> embed -> upsert in fixed-size batches,
+        so memory stays bounded and chunks become searchable batch by batch
+        Setting cancel_event stops the run after the current batch
         Returns processing statistics
         """
-        stats = {
+        stats = self._new_stats()
+        
+        with self._index_lock:
+            try:
+                # Walk the whole uploads tree lazily, comparing each file against the manifest
+                seen_keys = set()
+                changed_files = self._detect_changes(self._scan_files(self.uploads_dir), stats, seen_keys)
+                
+                # Remove chunks of files that no longer exist
+                for key in self.manifest.keys():
+                    if key not in seen_keys:
+                        self._remove_manifest_entry(key)
+                        stats["removed_files"] += 1
+                        logger.info(f"Removed chunks of deleted file: {key}")
+                
+                if not changed_files:
+                    self.manifest.save()
+                    logger.info("No new or changed files found in uploads directory")
+                    if progress_callback:
+                        progress_callback(100, "Processing complete")
+                    return stats
+                
+                self._index_changed_files(changed_files, stats, progress_callback, cancel_event)
+                
+                logger.info(f"Successfully processed {stats['processed_files']} files, created {stats['total_chunks']} chunks")
+                
+            except Exception as e:
+                error_msg = f"Document processing failed: {str(e)}"
+                logger.error(error_msg)
+                logger.error(traceback.format_exc())
+                stats["errors"].append(error_msg)
+        
+        return stats
+    
+    def index_paths(self, relative_paths: List[str]) -> Dict[str, Any]:
+        """
+        Index specific files or folders (relative to uploads directory), e.g. after an upload or copy
+        Unchanged files are skipped like in process_documents
+        """
+        stats = self._new_stats()
+        
+        with self._index_lock:
+            try:
+                files = (
+                    item
+                    for relative_path in relative_paths
+                    for item in self._scan_files(self.uploads_dir / relative_path)
+                )
+                changed_files = self._detect_changes(files, stats)
+                if changed_files:
+                    self._index_changed_files(changed_files, stats)
+                else:
+                    self.manifest.save()
+                
+            except Exception as e:
+                error_msg = f"Indexing {relative_paths} failed: {str(e)}"
+                logger.error(error_msg)
+                stats["errors"].append(error_msg)
+        
+        return stats
+    
+    def remove_paths(self, relative_paths: List[str]) -> int:
+        """Remove chunks of deleted files or folders (relative to uploads directory); returns removed file count"""
+        removed = 0
+        with self._index_lock:
+            for key in self._manifest_keys_under(relative_paths):
+                self._remove_manifest_entry(key)
+                removed += 1
+            if removed:
+                self.manifest.save()
+                logger.info(f"Removed chunks of {removed} deleted files")
+        return removed
+    
+    def move_path(self, old_relative_path: str, new_relative_path: str) -> int:
+        """
+        Re-tag chunks of a renamed or moved file or folder without re-embedding
+        Returns the number of files whose chunks were updated
+        """
+        moved = 0
+        old_prefix = PurePosixPath(old_relative_path).as_posix()
+        new_prefix = PurePosixPath(new_relative_path).as_posix()
+        supported_extensions = self.get_supported_file_types()
+        
+        with self._index_lock:
+            for old_key in self._manifest_keys_under([old_prefix]):
+                new_key = new_prefix + old_key[len(old_prefix):]
+                new_file_path = self.uploads_dir / new_key
+                
+                # A rename to an unsupported extension just drops the file from the index
+                if new_file_path.suffix.lower() not in supported_extensions:
+                    self._remove_manifest_entry(old_key)
+                    continue
+                
+                entry = self.manifest.remove(old_key)
+                self.near_duplicates.rename_references(old_key, new_key)
+                chunk_ids = list(set(entry.get("chunk_ids", [])))
+                if chunk_ids:
+                    stored = self.vectorstore._collection.get(ids=chunk_ids, include=["metadatas"])
+                    metadatas = []
+                    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+                        # Shared (deduplicated) chunks keep their location if another file owns them
+                        if metadata.get("relative_path") == old_key:
+                            metadata.update(self._file_metadata(new_file_path))
+                        metadata["sources"] = json.dumps(self.near_duplicates.references(chunk_id), ensure_ascii=False)
+                        metadatas.append(metadata)
+                    self.vectorstore._collection.update(ids=stored["ids"], metadatas=metadatas)
+                    self._bump_generation()
+                
+                self.manifest.set(new_key, entry)
+                moved += 1
+            
+            self.near_duplicates.commit()
+            self.manifest.save()
+        
+        # Files that were not indexed before (e.g. renamed to a supported extension) get indexed now
+        self.index_paths([new_relative_path])
+        
+        logger.info(f"Re-tagged chunks of {moved} moved files: {old_relative_path} -> {new_relative_path}")
+        return moved
+    
+    def upsert_chunks(self, chunks: List["LangChainDocument"], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Insert or replace chunks in the vector store
+        Without explicit ids, IDs are derived from the chunks' relative_path,
+        chunk_index and content, so repeating a call never duplicates chunks
+        Returns the chunk IDs
+        """
+        if ids is None:
+            ids = [
+                make_chunk_id(
+                    chunk.metadata.get("relative_path", chunk.metadata.get("source", "")),
+                    chunk.metadata.get("chunk_index", 0),
+                    chunk.page_content
+                )
+                for chunk in chunks
+            ]
+        
+        batch_size = self.config["embedding_batch_size"]
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            self._embed_and_upsert(
+                ids[start:start + batch_size],
+                [chunk.page_content for chunk in batch],
+                [chunk.metadata for chunk in batch]
+            )
+        self.lexical_index.flush()
+        return ids
+    
+    def delete_by_source(self, relative_path: str):
+        """Delete all chunks of one file (path relative to uploads directory) and forget it in the manifest"""
+        with self._index_lock:
+            entry = self.manifest.remove(relative_path)
+            chunk_ids = set(self.near_duplicates.chunks_for(relative_path))
+            if entry:
+                chunk_ids.update(entry.get("chunk_ids", []))
+            self._release_chunks(relative_path, list(chunk_ids))
+            self._delete_source_chunks(relative_path)
+            self.lexical_index.flush()
+            self.manifest.save()
+    
+    def _new_stats(self) -> Dict[str, Any]:
+        return {
             "total_files": 0,
             "processed_files": 0,
+            "skipped_files": 0,
+            "removed_files": 0,
             "failed_files": 0,
             "total_chunks": 0,
+            "cancelled": False,
             "errors": []
         }
+    
+    def _scan_files(self, root: Path):
+        """
+        Lazily yield (path, stat) for supported files at or below root
+        Walks with os.scandir and an explicit stack, so huge or deep trees are
+        never listed in full and need no recursion; symlinked folders are not followed
+        """
+        supported_extensions = set(self.get_supported_file_types())
         
-        try:
-            # Get all files in uploads directory
-            supported_extensions = self.get_supported_file_types()
-            files = [
-                f for f in self.uploads_dir.iterdir() 
-                if f.is_file() and f.suffix.lower() in supported_extensions
-            ]
-            
-            stats["total_files"] = len(files)
-            
-            if not files:
-                logger.info("No supported files found in uploads directory")
-                return stats
-            
-            documents = []
-            
-            for i, file_path in enumerate(files):
-                try:
-                    if progress_callback:
-                        progress = (i / len(files)) * 100
-                        progress_callback(progress, f"Processing {file_path.name}")
-                    
-                    logger.info(f"Processing file: {file_path.name}")
-                    
-                    # Load document based on file type
-                    docs = self._load_document(file_path)
-                    
-                    if docs:
-                        # Add metadata
-                        for doc in docs:
-                            doc.metadata.update({
-                                "source": file_path.name,
-                                "file_path": str(file_path),
-                                "file_size": file_path.stat().st_size,
-                                "file_type": file_path.suffix.lower()
-                            })
-                        
-                        documents.extend(docs)
-                        stats["processed_files"] += 1
-                        logger.info(f"Successfully loaded {len(docs)} documents from {file_path.name}")
-                    
-                except Exception as e:
-                    error_msg = f"Failed to process {file_path.name}: {str(e)}"
-                    logger.error(error_msg)
-                    stats["failed_files"] += 1
-                    stats["errors"].append(error_msg)
-            
-            if documents:
-                # Split documents into chunks
-                if progress_callback:
-                    progress_callback(80, "Splitting documents into chunks")
+        if root.is_file():
+            if root.suffix.lower() in supported_extensions:
+                yield root, root.stat()
+            return
+        
+        pending_dirs = [str(root)]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in supported_extensions:
+                                yield Path(entry.path), entry.stat()
+                        except OSError as e:
+                            logger.warning(f"Skipping {entry.path}: {e}")
+            except OSError as e:
+                logger.warning(f"Cannot scan directory {directory}: {e}")
+    
+    def _detect_changes(self, files, stats: Dict[str, Any], seen_keys: Optional[set] = None) -> list:
+        """
+        Compare (path, stat) pairs against the manifest: size + mtime first, content hash only if those differ
+        Returns (file_path, key, file_stat, content_hash) for new and changed files
+        """
+        changed_files = []
+        for file_path, file_stat in files:
+            key = self._manifest_key(file_path)
+            stats["total_files"] += 1
+            if seen_keys is not None:
+                seen_keys.add(key)
+            try:
+                entry = self.manifest.get(key)
+                if entry and entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime:
+                    stats["skipped_files"] += 1
+                    continue
+                
+                content_hash = file_sha256(file_path)
+                if entry and entry["sha256"] == content_hash:
+                    # Touched but not modified
+                    entry.update({"size": file_stat.st_size, "mtime": file_stat.st_mtime})
+                    stats["skipped_files"] += 1
+                    continue
                 
-                logger.info(f"Splitting {len(documents)} documents into chunks")
-                chunks = self.text_splitter.split_documents(documents)
-                stats["total_chunks"] = len(chunks)
+                changed_files.append((file_path, key, file_stat, content_hash))
                 
-                # Add to vector store
-                if progress_callback:
-                    progress_callback(90, "Adding chunks to vector database")
+            except Exception as e:
+                error_msg = f"Failed to process {file_path.name}: {str(e)}"
+                logger.error(error_msg)
+                stats["failed_files"] += 1
+                stats["errors"].append(error_msg)
+        
+        return changed_files
+    
+    def _index_changed_files(self, changed_files: list, stats: Dict[str, Any], progress_callback=None,
+                             cancel_event: Optional[threading.Event] = None):
+        """Stream changed files through load -> split -> embed -> upsert in fixed-size batches"""
+        failed_keys = set()
+        started_keys = set()
+        completed_keys = set()
+        files_done = 0
+        batch_count = 0
+        
+        for batch in self._iter_ingestion_batches(changed_files, stats, failed_keys):
+            if cancel_event is not None and cancel_event.is_set():
+                stats["cancelled"] = True
+                logger.info("Document processing cancelled")
+                break
+            
+            batch_count += 1
+            started_keys.update(key for key, _ in batch["started"])
+            try:
+                # Files unknown to the manifest may have orphaned chunks and near-duplicate
+                # references from an interrupted run
+                for key, file_path in batch["started"]:
+                    if not self.manifest.get(key):
+                        self._release_chunks(key, self.near_duplicates.chunks_for(key))
+                        self._delete_source_chunks(key)
                 
-                logger.info(f"Adding {len(chunks)} chunks to vector store")
-                self.vectorstore.add_documents(chunks)
-                self.vectorstore.persist()
+                # Near-duplicates of stored chunks become references instead of new vectors
+                ids, texts, metadatas, shared_ids = self._collapse_duplicates(batch)
                 
-                if progress_callback:
-                    progress_callback(100, "Processing complete")
+                # Deterministic IDs make this an idempotent upsert
+                if ids:
+                    self._embed_and_upsert(ids, texts, metadatas)
+                self._retag_chunks(shared_ids)
+                self.near_duplicates.commit()
                 
-                logger.info(f"Successfully processed {stats['processed_files']} files, created {stats['total_chunks']} chunks")
+            except Exception as e:
+                error_msg = f"Failed to index batch {batch_count}: {str(e)}"
+                logger.error(error_msg)
+                stats["errors"].append(error_msg)
+                failed_keys.update(batch["keys"])
             
-        except Exception as e:
-            error_msg = f"Document processing failed: {str(e)}"
-            logger.error(error_msg)
-            logger.error(traceback.format_exc())
-            stats["errors"].append(error_msg)
+            for key, entry in batch["completed"]:
+                files_done += 1
+                completed_keys.add(key)
+                if key in failed_keys:
+                    continue
+                
+                # Only chunks that no longer exist in the new version are released
+                old_entry = self.manifest.get(key)
+                if old_entry:
+                    new_ids = set(entry["chunk_ids"])
+                    self._release_chunks(key, [
+                        chunk_id for chunk_id in old_entry.get("chunk_ids", [])
+                        if chunk_id not in new_ids
+                    ])
+                self.manifest.set(key, entry)
+                stats["processed_files"] += 1
+                stats["total_chunks"] += len(entry["chunk_ids"])
+            
+            if progress_callback:
+                progress = (files_done / len(changed_files)) * 100
+                progress_callback(
+                    min(progress, 99),
+                    f"Indexed batch {batch_count} ({len(batch['ids'])} chunks, {files_done}/{len(changed_files)} files)"
+                )
         
-        return stats
+        # Files that failed part-way may have left chunks behind; forget them so the next run retries cleanly
+        for key in failed_keys:
+            self.delete_by_source(key)
+        stats["failed_files"] += len(failed_keys)
+        
+        # A cancelled run leaves files it had started on half-indexed; drop them too
+        for key in started_keys - completed_keys - failed_keys:
+            self.delete_by_source(key)
+        
+        self.manifest.save()
+        self.lexical_index.flush()
+        self.vectorstore.persist()
+        
+        if progress_callback and not stats["cancelled"]:
+            progress_callback(100, "Processing complete")
     
-    def _load_document(self, file_path: Path) -> List[LangChainDocument]:
-        """Load a single document based on file type"""
-        try:
-            if file_path.suffix.lower() == '.pdf':
-                loader = PyPDFLoader(str(file_path))
-            elif file_path.suffix.lower() == '.txt':
-                loader = TextLoader(str(file_path), encoding='utf-8')
-            elif file_path.suffix.lower() == '.md':
-                loader = TextLoader(str(file_path), encoding='utf-8')
-            elif file_path.suffix.lower() == '.json':
-                # For JSON files, try to extract text content
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+    def _iter_file_chunks(self, changed_files, stats: Dict[str, Any], failed_keys: set):
+        """Split loaded files one at a time, yielding (key, file_path, manifest entry, chunks)"""
+        for (file_path, key, file_stat, content_hash), docs, load_error in self._iter_loaded_files(changed_files):
+            try:
+                if load_error is not None:
+                    raise load_error
                 
-                # Convert JSON to text
-                if isinstance(data, dict):
-                    text_content = json.dumps(data, indent=2, ensure_ascii=False)
-                elif isinstance(data, list):
-                    text_content = json.dumps(data, indent=2, ensure_ascii=False)
-                else:
-                    text_content = str(data)
+                # Add metadata
+                for doc in docs:
+                    doc.metadata.update(self._file_metadata(file_path))
+                    doc.metadata["file_size"] = file_stat.st_size
+                    doc.metadata["modified"] = file_stat.st_mtime
+                
+                chunks = self.text_splitter.split_documents(docs) if docs else []
+                for chunk_index, chunk in enumerate(chunks):
+                    chunk.metadata["chunk_index"] = chunk_index
+                
+                entry = {
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "sha256": content_hash,
+                    "chunk_ids": [
+                        make_chunk_id(key, chunk_index, chunk.page_content)
+                        for chunk_index, chunk in enumerate(chunks)
+                    ]
+                }
+                yield key, file_path, entry, chunks
                 
-                # Create document manually
-                return [LangChainDocument(
-                    page_content=text_content,
-                    metadata={"source": file_path.name}
-                )]
+            except Exception as e:
+                error_msg = f"Failed to process {file_path.name}: {str(e)}"
+                logger.error(error_msg)
+                stats["errors"].append(error_msg)
+                failed_keys.add(key)
+    
+    def _iter_loaded_files(self, changed_files):
+        """
+        Parse changed files in a process pool of `loader_workers` processes
+        Yields (file info, documents, error) in input order; a failing,
+        crashing or timed-out file only affects its own entry
+        A file times out `loader_timeout` seconds after it was handed to a worker. The
+        pool is then restarted (a running task cannot be cancelled) and every file not
+        yet loaded is resubmitted, so only the hung file fails
+        When a worker dies the pool cannot tell whose file killed it, so every file that
+        was in flight is retried on its own; a file fails only if it breaks the pool alone
+        """
+        workers = self.config["loader_workers"]
+        if workers <= 1 or len(changed_files) <= 1:
+            for item in changed_files:
+                logger.info(f"Processing file: {item[0].name}")
+                try:
+                    yield item, self._load_document(item[0]), None
+                except Exception as e:
+                    yield item, None, e
+            return
+        
+        timeout = self.config["loader_timeout"]
+        remaining = iter(changed_files)
+        # [file info, future (None until submitted), submit time, suspect] in input order
+        pending = deque()
+        
+        def new_pool():
+            # Workers are not forked from this multi-threaded process (held locks, torch state):
+            # they fork from a fork server that has only imported this module
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
             else:
-                logger.warning(f"Unsupported file type: {file_path.suffix}")
-                return []
-            
-            return loader.load()
+                context = multiprocessing.get_context("spawn")
+            return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        
+        executor = new_pool()
+        
+        def in_flight():
+            return [entry for entry in pending if entry[1] is not None and not entry[1].done()]
+        
+        def fill():
+            # Up to two files per worker are buffered so workers keep going while the head is slow
+            while len(pending) < workers * 2:
+                item = next(remaining, None)
+                if item is None:
+                    break
+                pending.append([item, None, None, False])
+            # Submit in input order, at most one unfinished file per worker; a suspect runs alone
+            running = in_flight()
+            for entry in pending:
+                if entry[1] is not None:
+                    continue
+                if len(running) >= workers or any(other[3] for other in running) or (entry[3] and running):
+                    return
+                try:
+                    entry[1], entry[2] = executor.submit(load_document, entry[0][0]), time.monotonic()
+                except BrokenProcessPool:
+                    # A worker died since the last check: retry its files and start submitting again
+                    restart_pool(suspects=True)
+                    return fill()
+                running.append(entry)
+        
+        def restart_pool(suspects=False):
+            nonlocal executor
+            # Results already loaded, and suspects that broke the pool alone, are kept;
+            # everything else starts over in the new pool
+            for entry in pending:
+                future = entry[1]
+                if future is None or (future.done() and (entry[3] or not isinstance(future.exception(), BrokenProcessPool))):
+                    continue
+                entry[1], entry[2] = None, None
+                entry[3] = entry[3] or suspects
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = new_pool()
+        
+        try:
+            fill()
+            while pending:
+                entry = pending[0]
+                item = entry[0]
+                logger.info(f"Processing file: {item[0].name}")
+                
+                # Wait for the head file, refilling workers as other files finish
+                while not entry[1].done():
+                    left = entry[2] + timeout - time.monotonic()
+                    if left <= 0:
+                        break
+                    futures_wait([other[1] for other in in_flight()], timeout=left, return_when=FIRST_COMPLETED)
+                    fill()
+                
+                future = entry[1]
+                if not future.done():
+                    # Hung parser: only a new pool frees its worker
+                    pending.popleft()
+                    yield item, None, TimeoutError(f"Loading timed out after {timeout} seconds")
+                    restart_pool()
+                elif isinstance(future.exception(), BrokenProcessPool):
+                    if entry[3]:
+                        # It broke the pool while loading alone: this file crashes its worker
+                        pending.popleft()
+                        yield item, None, future.exception()
+                        restart_pool()
+                    else:
+                        logger.warning("A loader process died; retrying the files it was loading one at a time")
+                        restart_pool(suspects=True)
+                else:
+                    pending.popleft()
+                    try:
+                        yield item, future.result(), None
+                    except Exception as e:
+                        yield item, None, e
+                fill()
+        finally:
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _iter_embedding_batches(self, file_chunks):
+        """
+        Regroup per-file chunks into fixed-size embedding batches
+        Each batch lists files whose first chunk it carries ("started")
+        and files whose last chunk it carries ("completed")
+        """
+        batch_size = self.config["embedding_batch_size"]
+        
+        def new_batch():
+            return {"ids": [], "texts": [], "metadatas": [], "owners": [], "keys": set(), "started": [], "completed": []}
+        
+        batch = new_batch()
+        for key, file_path, entry, chunks in file_chunks:
+            batch["started"].append((key, file_path))
+            batch["keys"].add(key)
+            for position, (chunk_id, chunk) in enumerate(zip(entry["chunk_ids"], chunks)):
+                batch["ids"].append(chunk_id)
+                batch["texts"].append(chunk.page_content)
+                batch["metadatas"].append(chunk.metadata)
+                batch["owners"].append((key, entry, position))
+                batch["keys"].add(key)
+                if len(batch["ids"]) >= batch_size:
+                    yield batch
+                    batch = new_batch()
+            batch["completed"].append((key, entry))
+        
+        if batch["started"] or batch["completed"] or batch["ids"]:
+            yield batch
+    
+    def _iter_ingestion_batches(self, changed_files, stats: Dict[str, Any], failed_keys: set):
+        """
+        Run loading and splitting in a background thread, keeping at most
+        `ingest_max_in_flight` batches buffered ahead of the embedding stage
+        """
+        batches = queue.Queue(maxsize=max(1, self.config["ingest_max_in_flight"]))
+        stop = threading.Event()
+        done = object()
+        
+        def produce():
+            try:
+                for batch in self._iter_embedding_batches(self._iter_file_chunks(changed_files, stats, failed_keys)):
+                    while not stop.is_set():
+                        try:
+                            batches.put(batch, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                batches.put(e)
+            finally:
+                batches.put(done)
+        
+        producer = threading.Thread(target=produce, name="rag-ingest-loader", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+    
+    def _collapse_duplicates(self, batch: Dict[str, Any]):
+        """
+        Split a batch into chunks to store and near-duplicates of already stored chunks
+        A duplicate's manifest slot is pointed at the stored chunk and its file is recorded
+        as an extra source; returns (ids, texts, metadatas, IDs of stored chunks that gained sources)
+        Chunks of a file's previous version are never matched: they are released once
+        the file completes, and an edited chunk must replace them rather than resolve to them.
+        A match whose vector is gone (e.g. deleted by a run that crashed before committing
+        the near-duplicate index) is dropped from the index and the chunk is stored instead
+        """
+        ids, texts, metadatas = [], [], []
+        shared_ids = set()
+        previous_ids = {}
+        stored = {}
+        
+        for chunk_id, text, metadata, (key, entry, position) in zip(
+            batch["ids"], batch["texts"], batch["metadatas"], batch["owners"]
+        ):
+            if self.config["dedup_enabled"]:
+                if key not in previous_ids:
+                    old_entry = self.manifest.get(key)
+                    previous_ids[key] = set(old_entry.get("chunk_ids", [])) if old_entry else set()
+                signature = self.near_duplicates.hasher.signature(text)
+                numbers = numbers_key(text)
+                duplicate_of = self.near_duplicates.find_duplicate(signature, numbers, exclude=previous_ids[key])
+                if duplicate_of is not None and duplicate_of not in stored:
+                    stored[duplicate_of] = bool(
+                        self.vectorstore._collection.get(ids=[duplicate_of], include=[])["ids"]
+                    )
+                    if not stored[duplicate_of]:
+                        self.near_duplicates.discard(duplicate_of)
+                        duplicate_of = None
+                if duplicate_of is not None and duplicate_of != chunk_id:
+                    entry["chunk_ids"][position] = duplicate_of
+                    self.near_duplicates.add_reference(duplicate_of, key)
+                    shared_ids.add(duplicate_of)
+                    continue
+                self.near_duplicates.add(chunk_id, signature, numbers)
             
-        except Exception as e:
-            logger.error(f"Failed to load document {file_path}: {e}")
-            raise
+            self.near_duplicates.add_reference(chunk_id, key)
+            metadata["sources"] = json.dumps(self.near_duplicates.references(chunk_id), ensure_ascii=False)
+            stored[chunk_id] = True
+            ids.append(chunk_id)
+            texts.append(text)
+            metadatas.append(metadata)
+        
+        return ids, texts, metadatas, shared_ids
+    
+    def _release_chunks(self, relative_path: str, chunk_ids: List[str]):
+        """
+        Drop a file's references to chunks: chunks nobody references any more are deleted,
+        shared ones are re-tagged to a remaining source
+        """
+        to_delete, to_retag = [], []
+        for chunk_id in set(chunk_ids):
+            if self.near_duplicates.remove_reference(chunk_id, relative_path):
+                to_retag.append(chunk_id)
+            else:
+                to_delete.append(chunk_id)
+        
+        self._delete_chunks(to_delete)
+        self._retag_chunks(to_retag)
+        self.near_duplicates.commit()
+        self.lexical_index.flush()
+    
+    def _retag_chunks(self, chunk_ids):
+        """Refresh the source list of shared chunks, moving their location to a remaining source if needed"""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+        
+        stored = self.vectorstore._collection.get(ids=chunk_ids, include=["metadatas"])
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            sources = self.near_duplicates.references(chunk_id)
+            if not sources:
+                continue
+            if metadata.get("relative_path") not in sources:
+                metadata.update(self._file_metadata(self.uploads_dir / sources[0]))
+            metadata["sources"] = json.dumps(sources, ensure_ascii=False)
+            ids.append(chunk_id)
+            metadatas.append(metadata)
+        
+        if ids:
+            self.vectorstore._collection.update(ids=ids, metadatas=metadatas)
+            self._bump_generation()
+    
+    def _embed_and_upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Embed one batch of chunks and upsert it into the vector store"""
+        embeddings = self.embeddings.embed_documents(texts)
+        self.vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+        self.lexical_index.add_many(ids, texts)
+        self._bump_generation()
+    
+    def _manifest_key(self, file_path: Path) -> str:
+        """Manifest key of a file: its path relative to the uploads directory"""
+        return file_path.relative_to(self.uploads_dir).as_posix()
+    
+    def _file_metadata(self, file_path: Path) -> Dict[str, Any]:
+        """Location metadata stored on every chunk of a file"""
+        relative_path = PurePosixPath(self._manifest_key(file_path))
+        folder = relative_path.parent.as_posix()
+        return {
+            "source": file_path.name,
+            "file_path": str(file_path),
+            "relative_path": relative_path.as_posix(),
+            "folder": "" if folder == "." else folder,
+            "file_type": file_path.suffix.lower()
+        }
+    
+    def _manifest_keys_under(self, relative_paths: List[str]) -> List[str]:
+        """Manifest keys equal to or below any of the given relative paths"""
+        prefixes = [PurePosixPath(path).as_posix() for path in relative_paths]
+        return [
+            key for key in self.manifest.keys()
+            if any(key == prefix or key.startswith(prefix + "/") for prefix in prefixes)
+        ]
+    
+    def _remove_manifest_entry(self, key: str):
+        """Forget a file and delete its chunks"""
+        entry = self.manifest.remove(key)
+        if entry:
+            self._release_chunks(key, entry.get("chunk_ids", []))
+    
+    def _delete_chunks(self, chunk_ids: List[str]):
+        """Delete chunks from vector store by ID"""
+        if chunk_ids:
+            self.vectorstore.delete(ids=chunk_ids)
+            self.lexical_index.remove_many(chunk_ids)
+            self._bump_generation()
+    
+    def _delete_source_chunks(self, relative_path: str):
+        """Delete every stored chunk of a file by metadata, including ones the manifest does not know about"""
+        stored = self.vectorstore._collection.get(where={"$or": [
+            {"relative_path": relative_path},
+            # Chunks ingested before relative_path metadata existed
+            {"file_path": str(self.uploads_dir / relative_path)}
+        ]}, include=[])
+        self._delete_chunks(stored["ids"])
     
-    def search_documents(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
+    def _rebuild_lexical_index(self, page_size: int = 1000):
+        """Re-create the lexical index from the texts stored in the vector store"""
+        logger.info("Building lexical index from vector store")
+        self.lexical_index.clear()
+        collection = self.vectorstore._collection
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.lexical_index.add_many(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        self.lexical_index.flush()
+    
+    def _load_document(self, file_path: Path) -> List["LangChainDocument"]:
+        """Load a single document based on file type"""
+        return load_document(file_path)
+    
+    def search_documents(self, query: str, top_k: int = None, min_score: float = None,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents
+        In hybrid mode vector and BM25 candidates are merged with reciprocal rank fusion;
+        short keyword queries fully answered by BM25 skip the vector search.
+        relevance_score is cosine similarity (BM25 and fusion scores are returned as
+        bm25_score / fusion_score), except for keyword answers (lexical mode and the
+        shortcut), which never run the embedding model: unless the query's embedding is
+        already cached, their relevance_score is BM25 relative to the best score the query
+        could reach. In every mode, matches below min_score, or far below the best match
+        (adaptive k), are dropped, so the list may be empty
+        filters restrict the search to a folder, file types, sources or a modified-date
+        range before ranking (see _build_where); invalid filters raise ValueError
         Returns list of relevant chunks with metadata
         """
-        if not self.vectorstore:
+        return self.search_many([query], top_k, min_score, filters)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = None, min_score: float = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once, with the same semantics as search_documents
+        Queries that need an embedding are embedded in one model call, sent to the vector
+        store as one batch and scored together
+        Returns one result list per query, in order
+        """
+        if self.vectorstore is None:
             logger.warning("Vector store not initialized")
-            return []
+            return [[] for _ in queries]
         
         if top_k is None:
             top_k = self.config["top_k"]
+        if min_score is None:
+            min_score = self.config["min_relevance_score"]
+        mode = self.config["search_mode"]
+        where = self._build_where(filters)
         
         try:
-            logger.info(f"Searching for: '{query}' (top_k={top_k})")
+            self._sync_generation()
+            results = [None] * len(queries)
+            where_key = json.dumps(where, sort_keys=True) if where else None
+            mmr_key = (self.config["mmr_enabled"], self.config["mmr_fetch_k"], self.config["mmr_lambda"])
+            cache_keys = [
+                (normalize_text(query), top_k, min_score, mode, where_key, mmr_key, self._index_generation)
+                for query in queries
+            ]
+            pending = []
+            for i, cache_key in enumerate(cache_keys):
+                cached = self._search_cache.get(cache_key)
+                if cached is not None:
+                    results[i] = copy.deepcopy(cached)
+                else:
+                    pending.append(i)
             
-            # Perform similarity search
-            docs = self.vectorstore.similarity_search(query, k=top_k)
+            if len(pending) < len(queries):
+                logger.info(f"Search cache hits: {len(queries) - len(pending)}/{len(queries)} queries")
+            if not pending:
+                return results
             
-            # Format results
-            results = []
-            for i, doc in enumerate(docs):
-                results.append({
-                    "rank": i + 1,
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "relevance_score": 1.0 - (i / len(docs))  # Simple relevance scoring
-                })
+            if len(queries) == 1:
+                logger.info(f"Searching for: '{queries[0]}' (top_k={top_k}, min_score={min_score}, mode={mode})")
+            else:
+                logger.info(f"Searching {len(pending)} queries (top_k={top_k}, min_score={min_score}, mode={mode})")
+            
+            # Resolve the filter once; both retrievers only ever see matching chunks
+            allowed_ids = None
+            if where:
+                allowed_ids = self.vectorstore._collection.get(where=where, include=[])["ids"]
+                if not allowed_ids:
+                    for i in pending:
+                        results[i] = []
+                        self._search_cache.put(cache_keys[i], [])
+                    return results
+            
+            # BM25 first: it is cheap and may answer keyword queries on its own
+            lexical_pending, lexical_only_hits = [], []
+            vector_pending, lexical_hits = [], []
+            for i in pending:
+                hits = []
+                if mode != "vector":
+                    hits = [
+                        hit for hit in self.lexical_index.search(
+                            queries[i], k=max(top_k, self.config["lexical_candidates"]), allowed_chunk_ids=allowed_ids
+                        )
+                        if hit["coverage"] >= self.config["lexical_min_coverage"]
+                    ]
+                
+                if mode == "lexical" or self._lexical_shortcut_applies(queries[i], hits, top_k):
+                    lexical_pending.append(i)
+                    lexical_only_hits.append(hits[:top_k])
+                else:
+                    vector_pending.append(i)
+                    lexical_hits.append(hits)
             
-            logger.info(f"Found {len(results)} relevant documents")
+            # BM25 answers never run the embedding model; a query vector is used only if already cached
+            for i, hits in zip(lexical_pending, lexical_only_hits):
+                embedding = self._query_embedding_cache.get(normalize_text(queries[i]))
+                results[i] = self._lexical_results(hits, embedding, min_score)
+            
+            if vector_pending:
+                vector_results = self._vector_results(
+                    self._embed_queries([queries[i] for i in vector_pending]),
+                    top_k, min_score, lexical_hits if mode == "hybrid" else None,
+                    where=where, allowed_count=len(allowed_ids) if where else None
+                )
+                for i, query_results in zip(vector_pending, vector_results):
+                    results[i] = query_results
+            
+            for i in pending:
+                self._search_cache.put(cache_keys[i], copy.deepcopy(results[i]))
+            logger.info(f"Found {sum(len(results[i]) for i in pending)} relevant documents")
             return results
             
         except Exception as e:
             logger.error(f"Search failed: {e}")
             logger.error(traceback.format_exc())
+            return [[] for _ in queries]
+    
+    def _build_where(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Translate search filters into a vector store metadata filter
+        Supported keys: folder (prefix, includes subfolders), file_type (one or a list),
+        sources (file names or relative paths), modified_after / modified_before
+        (epoch seconds or ISO dates, both inclusive)
+        """
+        if not filters:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError("Filters must be an object")
+        unknown = set(filters) - {"folder", "file_type", "sources", "modified_after", "modified_before"}
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        
+        clauses = []
+        folder = (filters.get("folder") or "").strip("/")
+        if folder:
+            # Prefix match over the folders actually indexed, as an exact $in the store can use
+            prefix = PurePosixPath(folder).as_posix()
+            clauses.append({"folder": {"$in": self.manifest.folders_under(prefix) or [prefix]}})
+        
+        file_types = filters.get("file_type")
+        if file_types:
+            if isinstance(file_types, str):
+                file_types = [file_types]
+            clauses.append({"file_type": {"$in": [
+                ("" if str(file_type).startswith(".") else ".") + str(file_type).lower()
+                for file_type in file_types
+            ]}})
+        
+        sources = filters.get("sources")
+        if sources:
+            if isinstance(sources, str):
+                sources = [sources]
+            sources = [str(source) for source in sources]
+            clauses.append({"$or": [{"source": {"$in": sources}}, {"relative_path": {"$in": sources}}]})
+        
+        if filters.get("modified_after") is not None:
+            clauses.append({"modified": {"$gte": self._parse_timestamp(filters["modified_after"])}})
+        if filters.get("modified_before") is not None:
+            clauses.append({"modified": {"$lte": self._parse_timestamp(filters["modified_before"], end_of_day=True)}})
+        
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    @staticmethod
+    def _parse_timestamp(value, end_of_day: bool = False) -> float:
+        """Epoch seconds from a number or an ISO date/datetime; a bare date as an upper bound means its end"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"Invalid date: {value}")
+        if end_of_day and len(str(value)) == 10:
+            parsed += timedelta(days=1, microseconds=-1)
+        return parsed.timestamp()
+    
+    def _lexical_shortcut_applies(self, query: str, lexical_hits: list, top_k: int) -> bool:
+        """Short keyword queries whose top BM25 hits contain every query term need no vector search"""
+        if not self.config["lexical_shortcut"] or not lexical_hits:
+            return False
+        terms = set(tokenize(query))
+        if not terms or len(terms) > self.config["lexical_shortcut_max_terms"]:
+            return False
+        return all(hit["coverage"] >= 1.0 for hit in lexical_hits[:top_k])
+    
+    def _lexical_results(self, lexical_hits: list, embedding: Optional[List[float]],
+                         min_score: float) -> List[Dict[str, Any]]:
+        """
+        Format BM25 hits in BM25 order; the usual score cutoff applies to relevance_score
+        With a query embedding relevance_score is the cosine similarity of the stored chunk
+        vector to the query, without one it is the hit's relative BM25 score (see
+        LexicalIndex.search) and no distance is reported
+        """
+        if not lexical_hits:
+            return []
+        
+        include = ["documents", "metadatas"] + (["embeddings"] if embedding is not None else [])
+        stored = self.vectorstore._collection.get(ids=[hit["chunk_id"] for hit in lexical_hits], include=include)
+        if not stored["ids"]:
+            return []
+        if embedding is not None:
+            similarities = np.asarray(stored["embeddings"], dtype=np.float32) @ np.asarray(embedding, dtype=np.float32)
+        else:
+            relative_scores = {hit["chunk_id"]: hit["relative_score"] for hit in lexical_hits}
+            similarities = [relative_scores[chunk_id] for chunk_id in stored["ids"]]
+        by_id = {
+            chunk_id: (content, metadata, float(similarity))
+            for chunk_id, content, metadata, similarity in zip(
+                stored["ids"], stored["documents"], stored["metadatas"], similarities
+            )
+        }
+        
+        scored = [
+            (hit, *by_id[hit["chunk_id"]])
+            for hit in lexical_hits if hit["chunk_id"] in by_id
+        ]
+        return [
+            self._format_result(
+                i + 1, content, metadata,
+                relevance_score=similarity,
+                distance=self._distance_from_similarity(similarity) if embedding is not None else None,
+                bm25_score=hit["score"],
+                retrieval="lexical"
+            )
+            for i, (hit, content, metadata, similarity) in enumerate(self._apply_score_cutoff(scored, min_score))
+        ]
+    
+    def _vector_results(self, embeddings: List[List[float]], top_k: int, min_score: float,
+                        lexical_hits: Optional[List[list]] = None, where: Optional[Dict[str, Any]] = None,
+                        allowed_count: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Vector search for a batch of query embeddings, optionally fused with each
+        query's BM25 hits by reciprocal rank fusion
+        Without lexical_hits this is plain top_k similarity search; with where, the
+        store only considers matching chunks (allowed_count of them).
+        With MMR enabled, top_k is picked from mmr_fetch_k candidates by maximal marginal relevance
+        """
+        collection = self.vectorstore._collection
+        mmr = self.config["mmr_enabled"]
+        n_results = top_k
+        if mmr:
+            n_results = max(n_results, self.config["mmr_fetch_k"])
+        if lexical_hits is not None:
+            n_results = max(n_results, self.config["lexical_candidates"])
+        n_results = min(n_results, collection.count() if allowed_count is None else allowed_count)
+        if n_results <= 0:
+            return [[] for _ in embeddings]
+        
+        include = ["documents", "metadatas", "distances"]
+        if mmr:
+            include.append("embeddings")
+        found = collection.query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+        
+        # Candidate vectors for the MMR stage
+        vectors = {}
+        if mmr:
+            for ids, query_vectors in zip(found["ids"], found["embeddings"]):
+                vectors.update(zip(ids, query_vectors))
+        
+        scored_per_query = []
+        for ids, documents, metadatas, distances in zip(
+            found["ids"], found["documents"], found["metadatas"], found["distances"]
+        ):
+            similarities = self._similarity_from_distance(np.asarray(distances, dtype=np.float32))
+            scored_per_query.append([
+                (chunk_id, content, metadata, float(distance), float(similarity))
+                for chunk_id, content, metadata, distance, similarity in zip(
+                    ids, documents, metadatas, distances, similarities
+                )
+            ])
+        
+        if lexical_hits is None:
+            results = []
+            for scored in scored_per_query:
+                scored = self._apply_score_cutoff(scored, min_score)
+                results.append([
+                    self._format_result(i + 1, content, metadata, relevance_score=similarity, distance=distance,
+                                        retrieval="vector")
+                    for i, (chunk_id, content, metadata, distance, similarity) in enumerate(
+                        self._diversify(scored, [vectors.get(item[0]) for item in scored],
+                                        [item[-1] for item in scored], top_k)
+                    )
+                ])
+            return results
+        
+        # Reciprocal rank fusion over the full candidate lists: each list contributes 1 / (rrf_k + rank);
+        # the score cutoff is applied to the fused list, so lexical hits pass the same similarity bar
+        rrf_k = self.config["rrf_k"]
+        candidates_per_query = []
+        missing = {}
+        for query_index, (scored, hits) in enumerate(zip(scored_per_query, lexical_hits)):
+            candidates = {}
+            for rank, (chunk_id, content, metadata, distance, similarity) in enumerate(scored, start=1):
+                candidates[chunk_id] = {
+                    "content": content, "metadata": metadata, "distance": distance,
+                    "similarity": similarity, "bm25": None, "fusion": 1.0 / (rrf_k + rank)
+                }
+            for rank, hit in enumerate(hits, start=1):
+                candidate = candidates.get(hit["chunk_id"])
+                if candidate is None:
+                    candidate = candidates[hit["chunk_id"]] = {"bm25": None, "fusion": 0.0}
+                    missing.setdefault(hit["chunk_id"], []).append(query_index)
+                candidate["bm25"] = hit["score"]
+                candidate["fusion"] += 1.0 / (rrf_k + rank)
+            candidates_per_query.append(candidates)
+        
+        # Lexical-only hits still get a real similarity from their stored vectors,
+        # scored against every query in one matrix product
+        if missing:
+            stored = collection.get(ids=list(missing), include=["documents", "metadatas", "embeddings"])
+            if stored["ids"]:
+                similarities = np.asarray(stored["embeddings"], dtype=np.float32) @ np.asarray(embeddings, dtype=np.float32).T
+                for row, (chunk_id, content, metadata) in enumerate(
+                    zip(stored["ids"], stored["documents"], stored["metadatas"])
+                ):
+                    vectors[chunk_id] = stored["embeddings"][row]
+                    for query_index in missing[chunk_id]:
+                        similarity = float(similarities[row, query_index])
+                        candidates_per_query[query_index][chunk_id].update({
+                            "content": content, "metadata": metadata,
+                            "distance": self._distance_from_similarity(similarity), "similarity": similarity
+                        })
+        
+        results = []
+        for candidates in candidates_per_query:
+            ranked = sorted(
+                ((chunk_id, candidate) for chunk_id, candidate in candidates.items() if "content" in candidate),
+                key=lambda item: item[1]["fusion"], reverse=True
+            )
+            ranked = self._apply_score_cutoff(ranked, min_score, similarity=lambda item: item[1]["similarity"])
+            if ranked:
+                # Fusion scores relative to the best, so relevance and similarity share a 0..1 scale
+                best = ranked[0][1]["fusion"]
+                ranked = self._diversify(
+                    ranked, [vectors.get(chunk_id) for chunk_id, _ in ranked],
+                    [candidate["fusion"] / best for _, candidate in ranked], top_k
+                )
+            results.append([
+                self._format_result(
+                    i + 1, candidate["content"], candidate["metadata"],
+                    relevance_score=candidate["similarity"],
+                    distance=candidate["distance"],
+                    bm25_score=candidate["bm25"],
+                    fusion_score=candidate["fusion"],
+                    retrieval="hybrid"
+                )
+                for i, (chunk_id, candidate) in enumerate(ranked)
+            ])
+        return results
+    
+    def _diversify(self, items: list, item_vectors: list, relevance: List[float], top_k: int) -> list:
+        """Top_k of items (sorted best first) by maximal marginal relevance, or simply the first top_k"""
+        if not self.config["mmr_enabled"] or len(items) <= 1 or any(vector is None for vector in item_vectors):
+            return items[:top_k]
+        order = maximal_marginal_relevance(
+            np.asarray(relevance), np.asarray(item_vectors), top_k, self.config["mmr_lambda"]
+        )
+        return [items[i] for i in order]
+    
+    def _format_result(self, rank: int, content: str, metadata: Dict[str, Any], **scores) -> Dict[str, Any]:
+        """Search result dict shared by every retrieval mode"""
+        result = {
+            "rank": rank,
+            "content": content,
+            "metadata": metadata,
+            "source": metadata.get("source", "Unknown"),
+            "sources": self._chunk_sources(metadata)
+        }
+        result.update(scores)
+        return result
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries, reusing vectors of recently seen identical queries
+        All remaining queries go through the model in a single forward pass
+        """
+        keys = [normalize_text(query) for query in queries]
+        embeddings = {}
+        missing = {}
+        for key, query in zip(keys, queries):
+            embedding = self._query_embedding_cache.get(key)
+            if embedding is not None:
+                embeddings[key] = embedding
+            elif key not in missing:
+                missing[key] = query
+        
+        if missing:
+            for key, embedding in zip(missing, self.embeddings.embed_queries(list(missing.values()))):
+                self._query_embedding_cache.put(key, embedding)
+                embeddings[key] = embedding
+        
+        return [embeddings[key] for key in keys]
+    
+    def _bump_generation(self):
+        """Mark the index as changed; cached search results of older generations are never served"""
+        self._index_generation = self._generation.bump()
+    
+    def _sync_generation(self):
+        """
+        Pick up index changes made by another process sharing the index directory:
+        cached results of older generations stop matching, and the manifest and
+        lexical index are re-read (the numpy and IVF-PQ stores refresh themselves;
+        Chroma keeps its HNSW index in process memory, so share it through the rag-service)
+        """
+        generation = self._generation.current()
+        if generation == self._index_generation:
+            return
+        
+        # While this process is indexing, its own state is current; retry on a later search
+        if not self._index_lock.acquire(blocking=False):
+            return
+        try:
+            generation = self._generation.current()
+            if not self.lexical_index.reload():
+                return
+            self.manifest.reload()
+            self._index_generation = generation
+            logger.info(f"Index changed by another process (generation {generation}); reloaded")
+        finally:
+            self._index_lock.release()
+    
+    def _similarity_from_distance(self, distance):
+        """Convert Chroma distances (a float or an array) to cosine similarity (embeddings are unit-normalized)"""
+        metadata = self.vectorstore._collection.metadata or {}
+        if metadata.get("hnsw:space", "l2") == "l2":
+            # Chroma reports squared L2, which is 2 - 2 * cosine for unit vectors
+            return 1.0 - distance / 2.0
+        # Cosine and inner-product distances are 1 - similarity
+        return 1.0 - distance
+    
+    def _distance_from_similarity(self, similarity: float) -> float:
+        """Inverse of _similarity_from_distance"""
+        metadata = self.vectorstore._collection.metadata or {}
+        if metadata.get("hnsw:space", "l2") == "l2":
+            return 2.0 - 2.0 * similarity
+        return 1.0 - similarity
+    
+    def _apply_score_cutoff(self, scored: list, min_score: float, similarity=lambda item: item[-1]) -> list:
+        """
+        Drop matches whose similarity is below min_score, then adapt k: keep only matches
+        within adaptive_k_ratio of the best similarity; the order of scored is kept
+        similarity extracts the cosine similarity of an item (by default its last field)
+        """
+        scored = [item for item in scored if similarity(item) >= min_score]
+        if not scored:
             return []
+        
+        best = max(similarity(item) for item in scored)
+        if best <= 0:
+            return scored
+        floor = best * self.config["adaptive_k_ratio"]
+        return [item for item in scored if similarity(item) >= floor]
+    
+    def _chunk_sources(self, metadata: Dict[str, Any]) -> List[str]:
+        """All files a (possibly deduplicated) chunk came from"""
+        try:
+            return json.loads(metadata["sources"])
+        except (KeyError, TypeError, ValueError):
+            return [metadata.get("relative_path", metadata.get("source", "Unknown"))]
     
     def get_database_stats(self) -> Dict[str, Any]:
         """Get vector database statistics"""
         try:
-            if not self.vectorstore:
+            if self.vectorstore is None:
                 return {"status": "not_initialized", "count": 0}
             
             # Get collection info
@@ -294,7 +1677,16 @@ class RAGManager:
                 "document_count": count,
                 "embedding_model": self.config["embedding_model"],
                 "chunk_size": self.config["chunk_size"],
-                "collection_name": self.config["collection_name"]
+                "collection_name": self.config["collection_name"],
+                "vector_backend": self.config["vector_backend"],
+                "vector_index": collection.stats() if hasattr(collection, "stats") else None,
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+                "near_duplicates": self.near_duplicates.stats(),
+                "index_generation": self._index_generation,
+                "query_embedding_cache": self._query_embedding_cache.stats(),
+                "search_cache": self._search_cache.stats(),
+                "search_mode": self.config["search_mode"],
+                "lexical_index": self.lexical_index.stats()
             }
             
         except Exception as e:
@@ -304,20 +1696,70 @@ class RAGManager:
     def clear_database(self):
         """Clear all documents from vector database"""
         try:
-            if self.vectorstore:
-                # Delete the collection
-                self.vectorstore.delete_collection()
-                
-                # Recreate empty vector store
-                self._load_or_create_vectorstore()
-                
-                logger.info("Vector database cleared successfully")
-                return True
+            with self._index_lock:
+                if self.vectorstore is not None:
+                    # Delete the collection
+                    self.vectorstore.delete_collection()
+                    self._bump_generation()
+                    
+                    # Recreate empty vector store
+                    self._load_or_create_vectorstore()
+                    
+                    # Forget ingested files so the next run re-indexes everything
+                    self.manifest.clear()
+                    self.manifest.save()
+                    self.near_duplicates.clear()
+                    self.lexical_index.clear()
+                    
+                    logger.info("Vector database cleared successfully")
+                    return True
                 
         except Exception as e:
             logger.error(f"Failed to clear database: {e}")
             return False
     
+    def train_vector_index(self, sample_size: Optional[int] = None) -> bool:
+        """(Re)train the approximate vector index from a sample of stored vectors; False for exact backends"""
+        collection = self.vectorstore._collection if self.vectorstore is not None else None
+        if not hasattr(collection, "train"):
+            return False
+        
+        with self._index_lock:
+            collection.train(sample_size)
+            self._bump_generation()
+        return True
+    
+    def train_vector_index_if_due(self) -> bool:
+        """
+        Train the approximate vector index once it holds ivf_train_min_rows vectors
+        Called by the background ingestion job and indexer after they finish, so no
+        upsert waits for k-means; returns True if it trained
+        """
+        collection = self.vectorstore._collection if self.vectorstore is not None else None
+        if not getattr(collection, "training_due", False):
+            return False
+        return self.train_vector_index()
+    
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Run a dummy embedding and vector store read so the first user query does not pay
+        for lazy model setup (weights paged in, first forward pass)
+        """
+        start = time.perf_counter()
+        self.embeddings.embed_query("warm-up")
+        embedding_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        count = self.vectorstore._collection.count()
+        vector_store_ms = (time.perf_counter() - start) * 1000
+        
+        logger.info(f"Warm-up done: embedding {embedding_ms:.1f} ms, vector store {vector_store_ms:.1f} ms")
+        return {
+            "embedding_ms": round(embedding_ms, 1),
+            "vector_store_ms": round(vector_store_ms, 1),
+            "document_count": count
+        }
+    
     def is_ready(self) -> bool:
         """Check if RAG system is ready"""
         return (
@@ -328,14 +1770,56 @@ class RAGManager:
 
 # Global RAG manager instance
 rag_manager = None
+_rag_manager_lock = threading.Lock()
+_rag_start_lock = threading.Lock()
+_rag_init_thread = None
+_rag_status = {"state": "idle", "error": None, "started_at": None, "ready_at": None}
 
 def get_rag_manager() -> RAGManager:
-    """Get global RAG manager instance"""
+    """
+    Get global RAG manager instance, initializing it on first use (blocks until loaded)
+    With RAG_SERVICE_SOCKET set, calls go to the shared rag-service worker instead
+    of loading the embedding model in this process
+    """
     global rag_manager
-    if rag_manager is None:
-        try:
-            rag_manager = RAGManager()
-        except Exception as e:
-            logger.error(f"Failed to initialize RAG manager: {e}")
-            return None
+    with _rag_manager_lock:
+        if rag_manager is None:
+            _rag_status.update(state="loading", error=None, started_at=time.time(), ready_at=None)
+            try:
+                service_socket = os.getenv("RAG_SERVICE_SOCKET")
+                if service_socket:
+                    from rag_client import RemoteRAGManager
+                    rag_manager = RemoteRAGManager(service_socket)
+                else:
+                    rag_manager = RAGManager()
+                _rag_status.update(state="ready", ready_at=time.time())
+            except Exception as e:
+                logger.error(f"Failed to initialize RAG manager: {e}")
+                _rag_status.update(state="failed", error=str(e))
+                return None
+        return rag_manager
+
+def start_rag_manager():
+    """Initialize the global RAG manager in a background thread; returns immediately"""
+    global _rag_init_thread
+    if multiprocessing.parent_process() is not None:
+        # A loader worker re-importing the entry script (spawn/forkserver) never serves RAG
+        return
+    with _rag_start_lock:
+        if rag_manager is not None or (_rag_init_thread is not None and _rag_init_thread.is_alive()):
+            return
+        _rag_status.update(state="loading", error=None, started_at=time.time(), ready_at=None)
+        _rag_init_thread = threading.Thread(target=get_rag_manager, name="rag-init", daemon=True)
+        _rag_init_thread.start()
+
+def peek_rag_manager() -> Optional[RAGManager]:
+    """The global RAG manager if it is loaded, else None (never blocks)"""
     return rag_manager
+
+def get_rag_status() -> Dict[str, Any]:
+    """Readiness of the global RAG manager: idle, loading, ready or failed"""
+    status = dict(_rag_status)
+    if status["started_at"] is not None:
+        end = status["ready_at"] or time.time()
+        status["load_seconds"] = round(end - status["started_at"], 2)
+    return status
@@ -1385,14 +1385,20 @@ open() {
             const result = await response.json();
             
             if (result.success) {
+                // Processing runs as a background job; wait for it to finish
+                const job = await this.waitForRAGJob(result.job_id);
+                if (job.status !== 'completed') {
+                    throw new Error(job.error || `Processing ${job.status}`);
+                }
+                
                 this.updateRAGProgress(100, 'Processing complete!');
                 this.showNotification(
-                    `Successfully processed ${result.stats.processed_files} files, created ${result.stats.total_chunks} chunks`,
+                    `Successfully processed ${job.stats.processed_files} files, created ${job.stats.total_chunks} chunks`,
                     'success'
                 );
                 
                 // Update status
-                this.updateStatus(`RAG: ${result.stats.total_chunks} chunks ready`);
+                this.updateStatus(`RAG: ${job.stats.total_chunks} chunks ready`);
                 
                 // Hide progress after 3 seconds
                 setTimeout(() => {
@@ -1431,6 +1437,26 @@ open() {
         }
     }
     
+    async waitForRAGJob(jobId, intervalMs = 1000) {
+        // Poll the job status endpoint until the job reaches a terminal state
+        while (true) {
+            const response = await fetch(`/api/rag/jobs/${jobId}`);
+            const result = await response.json();
+            
+            if (!result.success) {
+                throw new Error(result.error || 'Failed to get job status');
+            }
+            
+            const job = result.job;
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+            
+            this.updateRAGProgress(job.progress, job.message);
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
     async getRagCompatibleFiles() {
         try {
             const response = await fetch('/api/files');
@@ -154,8 +154,14 @@ class RAGManager {
             const result = await response.json();
             
             if (result.success) {
+                // Processing runs as a background job; wait for it to finish
+                const job = await this.waitForJob(result.job_id);
+                if (job.status !== 'completed') {
+                    throw new Error(job.error || `Processing ${job.status}`);
+                }
+                
                 this.updateProgress(100, 'Processing complete!');
-                this.showSuccess(`Successfully processed ${result.stats.processed_files} files, created ${result.stats.total_chunks} chunks`);
+                this.showSuccess(`Successfully processed ${job.stats.processed_files} files, created ${job.stats.total_chunks} chunks`);
                 this.loadStats(); // Refresh stats
                 
                 // Reset button to normal state
@@ -181,6 +187,26 @@ class RAGManager {
         }
     }
     
+    async waitForJob(jobId, intervalMs = 1000) {
+        // Poll the job status endpoint until the job reaches a terminal state
+        while (true) {
+            const response = await fetch(`/api/rag/jobs/${jobId}`);
+            const result = await response.json();
+            
+            if (!result.success) {
+                throw new Error(result.error || 'Failed to get job status');
+            }
+            
+            const job = result.job;
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+            
+            this.updateProgress(job.progress, job.message);
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
     async clearDatabase() {
         if (!confirm('Are you sure you want to clear the RAG database? This action cannot be undone.')) {
             return;
@@ -214,7 +240,11 @@ class RAGManager {
             const response = await fetch('/api/rag/stats');
             const result = await response.json();
             
-            if (result.success) {
+            if (result.success && result.ready === false) {
+                // RAG still loading in the background: show it and check again shortly
+                this.showLoadingStats();
+                setTimeout(() => this.loadStats(), 2000);
+            } else if (result.success) {
                 this.updateStats(result.stats);
                 this.checkForUnprocessedFiles(result.stats);
             }
@@ -260,6 +290,13 @@ class RAGManager {
         }
     }
     
+    showLoadingStats() {
+        const docCountElement = document.getElementById('rag-doc-count');
+        if (docCountElement) {
+            docCountElement.textContent = 'Loading RAG...';
+        }
+    }
+    
     updateStats(stats) {
         const docCountElement = document.getElementById('rag-doc-count');
         if (docCountElement) {
@@ -157,6 +157,11 @@ function shouldRenderAsMarkdown(content) {
 
 // Handle message updates from server
 function handleMessageUpdate(data) {
+    // Messages dropped because the conversation continues from the edited one
+    (data.removed_ids || []).forEach(id => {
+        document.querySelector(`[data-id="${id}"]`)?.remove();
+    });
+    
     const messageElement = document.querySelector(`[data-id="${data.message_id}"]`);
     if (messageElement) {
         const contentDiv = messageElement.querySelector('.message-content, #ai-response');
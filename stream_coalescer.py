@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Stream Coalescer
+Merges streamed model deltas into fewer Socket.IO 'stream' events
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Any, List
+
+
+class StreamCoalescer:
+    """
+    Buffers deltas of one streamed answer and emits them as larger 'stream' payloads
+    ({'message_id', 'content', 'done': False}, the shape the client already appends)
+    A delta arriving after a quiet period of at least interval seconds is sent at once,
+    so the first token is not delayed; later deltas are buffered until interval has
+    passed since the last frame or max_bytes are waiting. flush() sends the rest and
+    must be called before the final done event
+    add() only flushes when a delta arrives, so a model that pauses mid-answer would leave
+    text buffered: the caller runs flush_if_due() about every interval seconds to send it
+    The methods may be called from different threads; frames are emitted in order
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], message_id: str,
+                 interval: float = 0.04, max_bytes: int = 512, clock: Callable[[], float] = time.monotonic):
+        self.emit = emit
+        self.message_id = message_id
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.frames = 0
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._last_flush = float("-inf")
+        self._lock = threading.Lock()
+
+    def add(self, content: str):
+        if not content:
+            return
+        with self._lock:
+            self._buffer.append(content)
+            self._buffered_bytes += len(content.encode("utf-8"))
+            if self._buffered_bytes >= self.max_bytes or self.clock() - self._last_flush >= self.interval:
+                self._flush()
+
+    def flush_if_due(self):
+        """Send buffered text once interval has passed since the last frame (deadline flush)"""
+        with self._lock:
+            if self.clock() - self._last_flush >= self.interval:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Emit the buffer as one frame (call with self._lock held, so frames leave in order)"""
+        if not self._buffer:
+            return
+        content = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = self.clock()
+        self.frames += 1
+        self.emit({
+            'message_id': self.message_id,
+            'content': content,
+            'done': False
+        })
@@ -0,0 +1,61 @@
+import os
+import sys
+import math
+import hashlib
+import itertools
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+
+class WordHashEmbeddings:
+    """Deterministic bag-of-words embeddings, so RAGManager tests need no model download"""
+
+    DIM = 64
+
+    def __init__(self, model_name=None, model_kwargs=None, encode_kwargs=None, **kwargs):
+        self.model_name = model_name
+
+    def _embed(self, text):
+        vector = [0.0] * self.DIM
+        for word in text.lower().split():
+            digest = hashlib.md5(word.strip(".,:;").encode("utf-8")).digest()
+            vector[digest[0] % self.DIM] += 1.0 if digest[1] % 2 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    """RAGManager over an empty uploads folder in tmp_path, loading files in-process"""
+    pytest.importorskip("langchain_community")
+    pytest.importorskip("chromadb")
+    import langchain_community.embeddings
+    import rag_manager
+
+    monkeypatch.setattr(langchain_community.embeddings, "HuggingFaceEmbeddings", WordHashEmbeddings)
+    manager = rag_manager.RAGManager(str(tmp_path))
+    manager.config["loader_workers"] = 1
+    return manager
+
+
+_mtimes = itertools.count(1_600_000_000)
+
+
+def write_upload(rag, relative_path, text):
+    """Write a file under uploads with a fresh mtime, so quick successive edits still look changed"""
+    path = rag.uploads_dir / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    mtime = next(_mtimes)
+    os.utime(path, (mtime, mtime))
+    return path
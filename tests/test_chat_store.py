@@ -0,0 +1,78 @@
+import pytest
+
+from chat_store import ChatStore, MemoryChatStore, SQLiteChatStore
+
+
+def message(message_id, role="user", content="", **extra):
+    return {"id": message_id, "role": role, "content": content, "edited": False, "tokens": None, **extra}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryChatStore()
+        return
+    store = SQLiteChatStore(tmp_path / "chats.sqlite3", flush_interval=60)
+    yield store
+    store.close()
+
+
+def test_missing_session(store):
+    assert store.load_session("nobody") is None
+
+
+def test_append_update_and_summary(store):
+    store.append_message("u1", 0, message("m1", content="Hello"))
+    store.append_message("u1", 1, message("m2", role="assistant", content="Hi", rag_sources=[{"source": "a.txt"}]))
+    store.update_message("u1", message("m1", content="Hello there", edited=True, tokens=3))
+    store.save_summary("u1", "Greetings", 1)
+
+    # Reads see writes still waiting for the background flush
+    session = store.load_session("u1")
+    assert [m["content"] for m in session["messages"]] == ["Hello there", "Hi"]
+    assert session["messages"][0]["edited"] is True
+    assert session["messages"][0]["tokens"] == 3
+    assert session["messages"][1]["rag_sources"] == [{"source": "a.txt"}]
+    assert (session["summary"], session["summarized"]) == ("Greetings", 1)
+    assert store.load_session("u2") is None
+
+
+def test_truncate(store):
+    for position, message_id in enumerate(["m1", "m2", "m3"]):
+        store.append_message("u1", position, message(message_id, content=message_id))
+    store.truncate("u1", 1)
+    assert [m["id"] for m in store.load_session("u1")["messages"]] == ["m1"]
+
+    # Updating a truncated message is a no-op, appending reuses its position
+    store.update_message("u1", message("m2", content="gone"))
+    store.append_message("u1", 1, message("m4", content="m4"))
+    assert [m["content"] for m in store.load_session("u1")["messages"]] == ["m1", "m4"]
+
+
+def test_sqlite_persists_across_reopen(tmp_path):
+    path = tmp_path / "chats.sqlite3"
+    store = SQLiteChatStore(path, flush_interval=60)
+    for position, message_id in enumerate(["m1", "m2", "m3"]):
+        store.append_message("u1", position, message(message_id, content=message_id))
+    store.truncate("u1", 2)
+    store.save_summary("u1", "Summary", 2)
+    assert store.stats()["pending_writes"] == 5
+    store.close()
+
+    reopened = SQLiteChatStore(path)
+    try:
+        session = reopened.load_session("u1")
+        assert [m["id"] for m in session["messages"]] == ["m1", "m2"]
+        assert session["summary"] == "Summary"
+        assert reopened.stats()["messages"] == 2
+    finally:
+        reopened.close()
+
+
+def test_chat_store_is_abstract():
+    class Incomplete(ChatStore):
+        def load_session(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
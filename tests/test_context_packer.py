@@ -0,0 +1,65 @@
+from context_packer import CONTEXT_HEADER, MAX_SENTENCE_CHARS, pack_context, split_sentences
+
+
+class WordCounter:
+    """One token per word, so budgets in these tests are easy to reason about"""
+
+    def count(self, text):
+        return len(text.split())
+
+
+def result(source, content):
+    return {"source": source, "content": content}
+
+
+def test_split_sentences():
+    assert split_sentences("First one. Second one!\nThird line") == ["First one.", "Second one!", "Third line"]
+    parts = split_sentences("word " * 300)
+    assert len(parts) > 1
+    assert all(len(part) <= MAX_SENTENCE_CHARS for part in parts)
+
+
+def test_packs_whole_sentences_within_budget():
+    counter = WordCounter()
+    results = [
+        result("a.txt", "Alpha one two three. Alpha four five six. Alpha seven eight nine."),
+        result("b.txt", "Beta one two three. Beta four five six.")
+    ]
+    context, used = pack_context(results, 30, counter)
+    assert counter.count(context) <= 30
+    assert CONTEXT_HEADER in context
+    assert used == results
+    assert "From a.txt:" in context and "From b.txt:" in context
+    assert "Alpha one two three." in context and "Beta one two three." in context
+    # Sentences are never cut in half
+    for sentence in split_sentences(" ".join(r["content"] for r in results)):
+        words = sentence.split()
+        assert (sentence in context) or (words[0] + " " + words[1] + " " + words[2] not in context)
+
+
+def test_repeated_sentences_are_sent_once():
+    overlap = "The shared paragraph explains the refund policy in detail."
+    results = [
+        result("a.txt", "Opening statement for the first file. " + overlap),
+        result("b.txt", overlap + " Closing remarks of the second file.")
+    ]
+    context, used = pack_context(results, 200, WordCounter())
+    assert context.count(overlap) == 1
+    assert "Closing remarks of the second file." in context
+    assert used == results
+
+
+def test_unused_results_are_not_returned():
+    results = [
+        result("a.txt", "Short first sentence."),
+        result("b.txt", "Short first sentence.")
+    ]
+    context, used = pack_context(results, 200, WordCounter())
+    assert used == results[:1]
+    assert "b.txt" not in context
+
+
+def test_nothing_fits():
+    results = [result("a.txt", "A sentence that is far longer than the remaining budget allows.")]
+    assert pack_context(results, 8, WordCounter()) == ("", [])
+    assert pack_context([], 1000, WordCounter()) == ("", [])
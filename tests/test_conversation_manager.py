@@ -0,0 +1,181 @@
+import threading
+import time
+
+import pytest
+
+import conversation_manager
+from chat_store import MemoryChatStore
+from conversation_manager import ConversationManager, TokenCounter
+
+# 40 characters: 10 estimated tokens plus the per-message overhead
+TEXT = "x" * 40
+TURN_TOKENS = 10 + TokenCounter.MESSAGE_OVERHEAD
+
+
+@pytest.fixture(autouse=True)
+def estimated_counts(monkeypatch):
+    monkeypatch.setattr(conversation_manager, "tiktoken", None)
+
+
+def wait_for_summary(manager, user_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while manager.stats(user_id)["summarizing"]:
+        assert time.monotonic() < deadline, "summary did not finish"
+        time.sleep(0.01)
+
+
+class Summarizer:
+    def __init__(self, release=None):
+        self.calls = []
+        self.release = release
+
+    def __call__(self, summary, turns):
+        if self.release is not None:
+            self.release.wait(5)
+        self.calls.append((summary, [turn["content"] for turn in turns]))
+        return f"summary {len(self.calls)}"
+
+
+def test_prompt_stays_within_budget():
+    manager = ConversationManager("S", max_prompt_tokens=5 + 3 * TURN_TOKENS)
+    for index in range(10):
+        manager.add_message("u1", "user" if index % 2 == 0 else "assistant", TEXT, message_id=f"m{index}")
+
+    messages = manager.build_messages("u1")
+    assert messages[0] == {"role": "system", "content": "S"}
+    assert len(messages) == 4
+    assert manager.count_tokens(messages) <= manager.max_prompt_tokens
+
+    # The newest turn is always sent, and the context only goes into the prompt
+    manager.add_message("u1", "user", "y" * 1000, message_id="long")
+    messages = manager.build_messages("u1", context="\nCONTEXT")
+    assert messages[-1]["content"] == "y" * 1000 + "\nCONTEXT"
+    assert "CONTEXT" not in manager.history("u1")[-1]["content"]
+
+
+def test_old_turns_are_summarized():
+    summarize = Summarizer()
+    store = MemoryChatStore()
+    manager = ConversationManager("S", store=store, summarize=summarize, summary_trigger_tokens=5 * TURN_TOKENS,
+                                  keep_recent_tokens=2 * TURN_TOKENS)
+    for index in range(6):
+        manager.add_message("u1", "user", f"{index}{TEXT[1:]}", message_id=f"m{index}")
+    wait_for_summary(manager, "u1")
+
+    stats = manager.stats("u1")
+    assert stats["summarized_turns"] == 4
+    assert stats["pending_tokens"] == 2 * TURN_TOKENS
+    assert summarize.calls == [("", [f"{index}{TEXT[1:]}" for index in range(4)])]
+    messages = manager.build_messages("u1")
+    assert messages[1]["content"].endswith("summary 1")
+    assert [message["content"][0] for message in messages[2:]] == ["4", "5"]
+
+    # The summary survives a reload from the store
+    reloaded = ConversationManager("S", store=store)
+    assert reloaded.build_messages("u1") == messages
+
+
+def test_editing_a_summarized_turn_drops_the_summary():
+    summarize = Summarizer()
+    manager = ConversationManager("S", summarize=summarize, summary_trigger_tokens=5 * TURN_TOKENS,
+                                  keep_recent_tokens=2 * TURN_TOKENS)
+    for index in range(6):
+        manager.add_message("u1", "user", TEXT, message_id=f"m{index}")
+    wait_for_summary(manager, "u1")
+
+    manager.update_message("u1", "m1", "edited")
+    stats = manager.stats("u1")
+    assert stats["summarized_turns"] == 0
+    assert stats["pending_tokens"] == 5 * TURN_TOKENS + manager.counter.count_message("edited")
+    assert all("summary" not in message["content"] for message in manager.build_messages("u1"))
+
+    # The next message rebuilds the summary from the edited turns
+    manager.add_message("u1", "user", TEXT, message_id="m6")
+    wait_for_summary(manager, "u1")
+    assert summarize.calls[-1][0] == ""
+    assert "edited" in summarize.calls[-1][1]
+
+
+def test_edit_during_summary_discards_the_stale_result():
+    release = threading.Event()
+    summarize = Summarizer(release)
+    manager = ConversationManager("S", summarize=summarize, summary_trigger_tokens=5 * TURN_TOKENS,
+                                  keep_recent_tokens=2 * TURN_TOKENS)
+    for index in range(6):
+        manager.add_message("u1", "user", TEXT, message_id=f"m{index}")
+    assert manager.stats("u1")["summarizing"]
+
+    manager.update_message("u1", "m0", "edited")
+    release.set()
+    manager._executor.shutdown(wait=True)
+    stats = manager.stats("u1")
+    assert (stats["summarized_turns"], stats["summary_tokens"]) == (0, 0)
+
+
+def test_token_counter_loads_in_the_background(monkeypatch):
+    release = threading.Event()
+
+    class Encoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    class FakeTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            release.wait(5)
+            return Encoding()
+
+    monkeypatch.setattr(conversation_manager, "tiktoken", FakeTiktoken)
+    counter = TokenCounter("gpt-3.5-turbo")
+    # Estimated while the encoding is still loading
+    assert counter.count("one two three four") == 5
+    assert not counter.wait(timeout=0.01)
+
+    release.set()
+    assert counter.wait(timeout=5)
+    assert counter.count("one two three four") == 4
+
+
+def test_token_counter_keeps_estimating_when_loading_fails(monkeypatch):
+    class FakeTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            raise OSError("no network")
+
+    monkeypatch.setattr(conversation_manager, "tiktoken", FakeTiktoken)
+    counter = TokenCounter("gpt-3.5-turbo")
+    assert not counter.wait(timeout=5)
+    assert counter.count("x" * 8) == 2
+
+
+def test_messages_are_found_and_edited_by_id():
+    store = MemoryChatStore()
+    manager = ConversationManager("S", store=store)
+    for index in range(5):
+        manager.add_message("u1", "user" if index % 2 == 0 else "assistant", f"message {index}", message_id=f"m{index}")
+
+    updated = manager.update_message("u1", "m2", "changed")
+    assert (updated["id"], updated["content"], updated["edited"]) == ("m2", "changed", True)
+    assert manager.update_message("u1", "missing", "x") is None
+    assert manager.update_message("u2", "m2", "x") is None
+
+    # A reused ID gets a fresh one instead of shadowing the earlier message
+    duplicate = manager.add_message("u1", "user", "again", message_id="m0")
+    assert duplicate["id"] != "m0"
+    assert manager.history("u1")[0]["content"] == "message 0"
+
+    assert manager.truncate("u1", "m3", inclusive=False) == ["m4", duplicate["id"]]
+    assert manager.truncate("u1", "m2") == ["m2", "m3"]
+    assert manager.truncate("u1", "m4") == []
+    # m1 is now the last turn, an assistant answer
+    assert manager.pop_last_assistant("u1")
+    assert not manager.pop_last_assistant("u1")
+
+    # Positions stay consistent after truncation, and in a manager reloaded from the store
+    manager.add_message("u1", "assistant", "answer", message_id="m9")
+    assert manager.update_message("u1", "m9", "better answer")["content"] == "better answer"
+    assert manager.stats("u1")["pending_tokens"] == sum(
+        manager.counter.count_message(message["content"]) for message in manager.history("u1"))
+    reloaded = ConversationManager("S", store=store)
+    assert [message["content"] for message in reloaded.history("u1")] == ["message 0", "better answer"]
+    assert reloaded.update_message("u1", "m0", "edited later")["content"] == "edited later"
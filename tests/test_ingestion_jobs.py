@@ -0,0 +1,114 @@
+import threading
+import time
+
+from ingestion_jobs import IngestionJobManager
+
+
+class FakeRAGManager:
+    """process_documents runs until released or cancelled, reporting progress on the way"""
+
+    def __init__(self, fail=False):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail = fail
+        self.runs = 0
+        self.trained = 0
+
+    def process_documents(self, progress_callback, cancel_event):
+        self.runs += 1
+        progress_callback(10, "Loading")
+        self.started.set()
+        while not self.release.is_set():
+            if cancel_event.is_set():
+                return {"processed_files": 0, "cancelled": True}
+            time.sleep(0.005)
+        if self.fail:
+            raise RuntimeError("disk full")
+        progress_callback(90, "Embedding")
+        return {"processed_files": 3, "cancelled": False}
+
+    def train_vector_index_if_due(self):
+        self.trained += 1
+        return False
+
+
+def wait_until_finished(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.005)
+
+
+def make_manager(rag):
+    events = []
+    manager = IngestionJobManager(lambda: rag, lambda event, data, room: events.append((event, data, room)),
+                                  min_emit_interval=60)
+    return manager, events
+
+
+def test_job_completes_and_reports_to_its_subscribers():
+    rag = FakeRAGManager()
+    manager, events = make_manager(rag)
+    job, merged = manager.submit("alice")
+    assert not merged
+    assert rag.started.wait(5)
+    assert manager.get(job.id).to_dict()["status"] == "running"
+
+    # A second request joins the running job instead of starting another one
+    same, merged = manager.submit("bob")
+    assert merged and same is job
+
+    rag.release.set()
+    wait_until_finished(job)
+    status = job.to_dict()
+    assert (status["status"], status["progress"], status["stats"]["processed_files"]) == ("completed", 100, 3)
+    assert rag.runs == 1 and rag.trained == 1
+
+    finished = [(data["status"], room) for event, data, room in events if event == "rag_job_finished"]
+    assert sorted(finished) == [("completed", "alice"), ("completed", "bob")]
+    # Progress is rate-limited: the 90% update came within min_emit_interval of the first one
+    assert [room for event, data, room in events if event == "rag_progress" and data["progress"] == 90] == []
+
+    next_job, merged = manager.submit("alice")
+    assert not merged and next_job is not job
+    wait_until_finished(next_job)
+
+
+def test_cancel_stops_the_job():
+    rag = FakeRAGManager()
+    manager, events = make_manager(rag)
+    job, _ = manager.submit("alice")
+    assert rag.started.wait(5)
+
+    assert manager.cancel(job.id)
+    wait_until_finished(job)
+    assert job.status == "cancelled"
+    assert rag.trained == 0
+    assert not manager.cancel(job.id)
+    assert not manager.cancel("unknown")
+
+
+def test_failed_job_records_the_error():
+    rag = FakeRAGManager(fail=True)
+    rag.release.set()
+    manager, _ = make_manager(rag)
+    job, _ = manager.submit(None)
+    wait_until_finished(job)
+    assert (job.status, job.error) == ("failed", "disk full")
+
+    job, _ = IngestionJobManager(lambda: None, lambda *args: None).submit(None)
+    wait_until_finished(job)
+    assert job.status == "failed"
+
+
+def test_old_finished_jobs_are_pruned():
+    rag = FakeRAGManager()
+    rag.release.set()
+    manager = IngestionJobManager(lambda: rag, lambda *args: None, max_finished_jobs=2)
+    jobs = []
+    for _ in range(4):
+        job, _ = manager.submit(None)
+        wait_until_finished(job)
+        jobs.append(job)
+    assert manager.get(jobs[0].id) is None
+    assert all(manager.get(job.id) is job for job in jobs[2:])
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from ivfpq_index import IVFPQCollection
+
+DIM = 32
+
+
+def clustered_vectors(rows, clusters=32, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, DIM)
+    vectors = centers[rng.randint(clusters, size=rows)] + 0.3 * rng.randn(rows, DIM)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def make_collection(path, **options):
+    options = {"nlist": 16, "nprobe": 4, "m": 8, "refine_factor": 4, "train_min_rows": 1000, **options}
+    return IVFPQCollection(path, **options)
+
+
+def fill(collection, vectors, start=0):
+    collection.upsert([f"v{start + i}" for i in range(len(vectors))], vectors.tolist(),
+                      metadatas=[{"n": start + i} for i in range(len(vectors))])
+
+
+def recall(collection, vectors, queries, k=10):
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    found = collection.query(queries.tolist(), n_results=k, include=[])["ids"]
+    hits = sum(len({f"v{i}" for i in truth} & set(ids)) for truth, ids in zip(exact, found))
+    return hits / (k * len(queries))
+
+
+@pytest.fixture
+def trained(tmp_path):
+    vectors = clustered_vectors(4000)
+    collection = make_collection(tmp_path)
+    fill(collection, vectors)
+    collection.train()
+    return collection, vectors
+
+
+def test_upsert_never_trains(tmp_path):
+    collection = make_collection(tmp_path, train_min_rows=500)
+    fill(collection, clustered_vectors(400))
+    assert not collection.training_due
+    fill(collection, clustered_vectors(200, seed=1), start=400)
+    assert not collection.trained
+    assert collection.training_due
+
+    collection.train()
+    assert collection.trained and not collection.training_due
+    assert collection.stats()["encoded_rows"] == 600
+
+
+def test_recall_grows_with_nprobe(trained):
+    collection, vectors = trained
+    queries = clustered_vectors(50, seed=7)
+
+    collection.refine_factor = 10
+    recalls = []
+    for nprobe in (1, 4, 16):
+        collection.nprobe = nprobe
+        recalls.append(recall(collection, vectors, queries))
+    assert recalls == sorted(recalls)
+    # Probing every list leaves only PQ error, which the exact re-rank mostly removes
+    assert recalls[-1] >= 0.95
+
+
+def test_scores_are_exact(trained):
+    collection, vectors = trained
+    result = collection.query([vectors[123].tolist()], n_results=3, include=["distances", "metadatas"])
+    assert result["ids"][0][0] == "v123"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert result["metadatas"][0][0] == {"n": 123}
+
+
+def test_filtered_query(trained):
+    collection, vectors = trained
+    result = collection.query([vectors[5].tolist()], n_results=5, where={"n": {"$in": [5, 6, 7]}}, include=[])
+    assert sorted(result["ids"][0]) == ["v5", "v6", "v7"]
+
+
+def test_queries_do_not_encode(trained, tmp_path, monkeypatch):
+    reader, _ = trained
+    writer = make_collection(tmp_path)
+    # A writer that appended rows but has not encoded them yet
+    monkeypatch.setattr(writer, "_encode_pending", lambda: None)
+    extra = clustered_vectors(10, seed=3)
+    fill(writer, extra, start=4000)
+    codes_size = reader.codes_path.stat().st_size
+
+    result = reader.query([extra[4].tolist()], n_results=1, include=[])
+    assert result["ids"][0] == ["v4004"]
+    assert reader.codes_path.stat().st_size == codes_size
+    assert reader.stats()["encoded_rows"] == 4000
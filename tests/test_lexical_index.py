@@ -0,0 +1,106 @@
+import pytest
+
+from lexical_index import LexicalIndex, fold_accents, stem, tokenize
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("számla", "száml"),
+    ("számlát", "száml"),
+    ("számlák", "száml"),
+    ("számlákban", "száml"),
+    ("házban", "ház"),
+    ("házakból", "ház"),
+    ("adó", "adó"),
+    ("2024", "2024"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_tokenize_drops_stopwords_and_folds_accents():
+    assert tokenize("A szerződés és az adó") == ["szerzodes", "ado"]
+    assert tokenize("Fizetési HATÁRIDŐ") == tokenize("fizetesi hatarido")
+    assert fold_accents("őűáé") == "ouae"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(tmp_path / "lexical.sqlite3")
+
+
+def add_documents(index):
+    index.add_many(
+        ["invoice", "contract", "report"],
+        ["A számlák fizetési határideje 30 nap.", "A szerződésről mindkét fél döntött.", "Az éves jelentés a bevételekről szól."]
+    )
+
+
+def chunk_ids(hits):
+    return [hit["chunk_id"] for hit in hits]
+
+
+def test_search_matches_inflected_forms(index):
+    add_documents(index)
+    hits = index.search("számla")
+    assert chunk_ids(hits) == ["invoice"]
+    assert hits[0]["score"] > 0 and hits[0]["coverage"] == 1.0
+    assert chunk_ids(index.search("szerzodes")) == ["contract"]
+    assert index.search("ismeretlen") == []
+
+
+def test_readding_a_chunk_replaces_it(index):
+    add_documents(index)
+    index.add_many(["invoice"], ["Az ajánlat holnap lejár."])
+    assert index.search("számla") == []
+    assert chunk_ids(index.search("ajánlat")) == ["invoice"]
+    assert len(index) == 3
+
+
+def test_tombstones_and_compaction(index):
+    add_documents(index)
+    index.remove_many(["invoice", "missing"])
+    assert index.search("számla") == []
+    assert index.stats()["tombstones"] == 1
+    assert len(index) == 2
+
+    index.compact()
+    assert index.stats()["tombstones"] == 0
+    assert chunk_ids(index.search("szerződés")) == ["contract"]
+    assert chunk_ids(index.search("jelentés")) == ["report"]
+
+
+def test_allowed_chunk_ids(index):
+    add_documents(index)
+    assert chunk_ids(index.search("számla szerződés", allowed_chunk_ids=["contract"])) == ["contract"]
+
+
+def test_persists_across_reopen(index, tmp_path):
+    add_documents(index)
+    index.remove_many(["report"])
+    index.flush()
+
+    reopened = LexicalIndex(tmp_path / "lexical.sqlite3")
+    assert len(reopened) == 2
+    assert chunk_ids(reopened.search("számlák")) == ["invoice"]
+    assert reopened.search("jelentés") == []
+
+
+def test_reload_sees_other_writers(index, tmp_path):
+    other = LexicalIndex(tmp_path / "lexical.sqlite3")
+    add_documents(other)
+    other.flush()
+
+    assert index.search("számla") == []
+    assert index.reload()
+    assert chunk_ids(index.search("számla")) == ["invoice"]
+
+    index.remove_many(["invoice"])
+    # Unflushed local changes are never thrown away
+    assert not index.reload()
+
+
+def test_relative_score(index):
+    add_documents(index)
+    full, = index.search("számla fizetés")
+    partial, = index.search("számla ismeretlen")
+    assert 0 < partial["relative_score"] < full["relative_score"] <= 1
@@ -0,0 +1,42 @@
+import numpy as np
+
+from rag_manager import maximal_marginal_relevance
+
+
+def reference_mmr(relevance, vectors, k, lambda_mult):
+    """Textbook MMR, one candidate at a time, starting from the most relevant one"""
+    vectors = [np.asarray(vector) / np.linalg.norm(vector) for vector in vectors]
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(relevance)):
+        def score(i):
+            redundancy = max(float(vectors[i] @ vectors[j]) for j in selected)
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+        selected.append(max((i for i in range(len(relevance)) if i not in selected), key=score))
+    return selected
+
+
+def test_matches_reference_implementation():
+    rng = np.random.RandomState(0)
+    for lambda_mult in (0.0, 0.3, 0.7, 1.0):
+        vectors = rng.randn(25, 8)
+        relevance = rng.rand(25)
+        assert maximal_marginal_relevance(relevance, vectors, 6, lambda_mult) == \
+            reference_mmr(relevance, vectors, 6, lambda_mult)
+
+
+def test_duplicates_are_pushed_down():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.01], [0.0, 1.0]])
+    relevance = np.array([0.9, 0.89, 0.6])
+    assert maximal_marginal_relevance(relevance, vectors, 2, lambda_mult=0.5) == [0, 2]
+    # Pure relevance keeps the ranking
+    assert maximal_marginal_relevance(relevance, vectors, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_k_bounds():
+    vectors = np.eye(3)
+    relevance = np.array([0.1, 0.3, 0.2])
+    assert maximal_marginal_relevance(relevance, vectors, 0) == []
+    assert sorted(maximal_marginal_relevance(relevance, vectors, 10)) == [0, 1, 2]
+    assert maximal_marginal_relevance(relevance, vectors, 1) == [1]
+    # Zero vectors do not divide by zero
+    assert maximal_marginal_relevance(relevance, np.zeros((3, 2)), 2) == [1, 2]
@@ -0,0 +1,76 @@
+import pytest
+
+from near_duplicates import NearDuplicateIndex, numbers_key
+
+TEXT = ("The board approved the new budget after a lengthy discussion about priorities "
+        "for the coming year, including hiring, marketing and infrastructure spending.")
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(tmp_path / "duplicates.sqlite3")
+
+
+def store(index, chunk_id, text, relative_path):
+    index.add(chunk_id, index.hasher.signature(text), numbers_key(text))
+    index.add_reference(chunk_id, relative_path)
+
+
+def lookup(index, text, exclude=()):
+    return index.find_duplicate(index.hasher.signature(text), numbers_key(text), exclude=exclude)
+
+
+def test_numbers_key():
+    assert numbers_key("Invoice 1001, 250 EUR") == numbers_key("invoice 1001 total 250")
+    assert numbers_key("Invoice 1001") != numbers_key("Invoice 1002")
+    assert numbers_key("12 3") != numbers_key("1 23")
+
+
+def test_near_identical_text_is_found(index):
+    store(index, "a", TEXT, "a.txt")
+    assert lookup(index, TEXT) == "a"
+    assert lookup(index, TEXT.replace("lengthy", "long")) == "a"
+    assert lookup(index, "Customer satisfaction improved while support tickets declined noticeably.") is None
+
+
+def test_different_numbers_are_not_duplicates(index):
+    text = TEXT + " Invoice 1001."
+    store(index, "a", text, "a.txt")
+    assert lookup(index, text) == "a"
+    assert lookup(index, text.replace("1001", "1002")) is None
+
+
+def test_excluded_chunks_are_skipped(index):
+    store(index, "a", TEXT, "a.txt")
+    assert lookup(index, TEXT, exclude=["a"]) is None
+
+
+def test_references(index):
+    store(index, "a", TEXT, "a.txt")
+    index.add_reference("a", "b.txt")
+    assert index.references("a") == ["a.txt", "b.txt"]
+
+    index.rename_references("b.txt", "c.txt")
+    assert index.chunks_for("c.txt") == ["a"]
+    assert index.chunks_for("b.txt") == []
+
+    assert index.remove_reference("a", "a.txt") == ["c.txt"]
+    assert lookup(index, TEXT) == "a"
+    # Dropping the last reference drops the chunk itself
+    assert index.remove_reference("a", "c.txt") == []
+    assert lookup(index, TEXT) is None
+    assert index.stats() == {"indexed_chunks": 0, "references": 0}
+
+
+def test_persists_after_commit(index, tmp_path):
+    store(index, "a", TEXT, "a.txt")
+    index.commit()
+    reopened = NearDuplicateIndex(tmp_path / "duplicates.sqlite3")
+    assert lookup(reopened, TEXT) == "a"
+
+
+def test_discard(index):
+    store(index, "a", TEXT, "a.txt")
+    index.discard("a")
+    assert lookup(index, TEXT) is None
+    assert index.chunks_for("a.txt") == []
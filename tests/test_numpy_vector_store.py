@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from numpy_vector_store import NumpyCollection, NumpyVectorStore, where_to_sql
+
+DIM = 16
+
+
+def random_vectors(rows, seed=0):
+    return np.random.RandomState(seed).randn(rows, DIM).astype(np.float32)
+
+
+def fill(collection, vectors, start=0):
+    collection.upsert([f"v{start + i}" for i in range(len(vectors))], vectors.tolist(),
+                      documents=[f"doc {start + i}" for i in range(len(vectors))],
+                      metadatas=[{"folder": "even" if (start + i) % 2 == 0 else "odd", "n": start + i}
+                                 for i in range(len(vectors))])
+
+
+def exact_top(vectors, query, k, rows=None):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    candidates = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    best = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+    return [f"v{row}" for row in best], 1.0 - scores[best]
+
+
+@pytest.mark.parametrize("block_rows", [7, 65536])
+def test_query_matches_brute_force(tmp_path, block_rows):
+    vectors = random_vectors(100)
+    collection = NumpyCollection(tmp_path, block_rows=block_rows)
+    fill(collection, vectors)
+    queries = random_vectors(3, seed=1)
+
+    result = collection.query(queries.tolist(), n_results=5)
+    for query, ids, distances in zip(queries, result["ids"], result["distances"]):
+        expected_ids, expected_distances = exact_top(vectors, query, 5)
+        assert ids == expected_ids
+        assert np.allclose(distances, expected_distances, atol=1e-5)
+    assert result["documents"][0][0] == f"doc {result['ids'][0][0][1:]}"
+
+    # A filter is applied before ranking, so every query still gets n_results matches
+    result = collection.query(queries.tolist(), n_results=5, where={"folder": "odd"}, include=["metadatas"])
+    for query, ids, metadatas in zip(queries, result["ids"], result["metadatas"]):
+        assert ids == exact_top(vectors, query, 5, rows=range(1, 100, 2))[0]
+        assert all(metadata["folder"] == "odd" for metadata in metadatas)
+    assert result["documents"] is None
+
+
+def test_upsert_replaces_and_delete_tombstones(tmp_path):
+    vectors = random_vectors(10)
+    collection = NumpyCollection(tmp_path)
+    fill(collection, vectors)
+    collection.upsert(["v3"], [(-vectors[3]).tolist()], documents=["replaced"], metadatas=[{"n": 3}])
+    collection.delete(ids=["v4"])
+    collection.delete(where={"folder": "odd"})
+
+    # v3 lost its folder when it was replaced, so the filtered delete keeps it
+    assert collection.count() == 5
+    assert collection.get(ids=["v3", "v4"])["ids"] == ["v3"]
+    assert collection.get(ids=["v3"])["documents"] == ["replaced"]
+    ids = collection.query([vectors[3].tolist()], n_results=10, include=[])["ids"][0]
+    assert sorted(ids) == ["v0", "v2", "v3", "v6", "v8"]
+    assert ids[-1] == "v3"
+
+    with pytest.raises(ValueError):
+        collection.upsert(["bad"], [[1.0, 2.0]])
+
+
+def test_changes_persist_and_reach_other_readers(tmp_path):
+    vectors = random_vectors(20)
+    writer = NumpyCollection(tmp_path)
+    fill(writer, vectors[:10])
+    reader = NumpyCollection(tmp_path)
+    assert reader.count() == 10
+
+    fill(writer, vectors[10:], start=10)
+    writer.update(ids=["v0"], metadatas=[{"folder": "moved", "n": 0}])
+    writer.delete(ids=["v1"])
+    assert reader.count() == 19
+    assert reader.get(where={"folder": "moved"})["ids"] == ["v0"]
+    query = vectors[15].tolist()
+    assert reader.query([query], n_results=1, include=[])["ids"] == [["v15"]]
+    writer.close()
+    reader.close()
+
+    reopened = NumpyCollection(tmp_path, dtype="float16")
+    assert reopened.dtype == np.float32
+    assert reopened.count() == 19
+    assert reopened.query([query], n_results=1, include=[])["ids"] == [["v15"]]
+
+
+def test_compaction_drops_deleted_rows(tmp_path):
+    vectors = random_vectors(30)
+    store = NumpyVectorStore(tmp_path, block_rows=8, compact_ratio=0.3)
+    collection = store._collection
+    fill(collection, vectors)
+    store.delete(ids=[f"v{i}" for i in range(5)])
+    store.persist()
+    assert collection._row_count == 30
+
+    store.delete(ids=[f"v{i}" for i in range(5, 12)])
+    store.persist()
+    assert collection._row_count == collection.count() == 18
+    assert collection.get(ids=["v12"], include=["embeddings"])["embeddings"][0] == pytest.approx(
+        (vectors[12] / np.linalg.norm(vectors[12])).tolist(), abs=1e-6)
+    assert collection.query([vectors[20].tolist()], n_results=1, include=[])["ids"] == [["v20"]]
+
+
+def test_float16_matrix(tmp_path):
+    vectors = random_vectors(50)
+    collection = NumpyCollection(tmp_path, dtype="float16")
+    fill(collection, vectors)
+    assert collection.matrix_path.stat().st_size == 50 * DIM * 2
+    assert collection.query([vectors[7].tolist()], n_results=1, include=[])["ids"] == [["v7"]]
+
+
+def test_where_to_sql():
+    sql, params = where_to_sql({"$and": [{"folder": {"$in": ["a", "b"]}}, {"modified": {"$gte": 10}}]})
+    assert sql == "(json_extract(metadata, '$.folder') IN (?,?) AND json_extract(metadata, '$.modified') >= ?)"
+    assert params == ["a", "b", 10]
+    with pytest.raises(ValueError):
+        where_to_sql({"folder') OR 1=1 --": "x"})
@@ -0,0 +1,80 @@
+import threading
+import time
+import types
+
+import rag_indexer
+from rag_indexer import BackgroundIndexer
+
+
+class FakeRAGManager:
+    def __init__(self):
+        self.calls = []
+        self.applied = threading.Event()
+
+    def index_paths(self, paths):
+        self.calls.append(("index", list(paths)))
+
+    def remove_paths(self, paths):
+        self.calls.append(("remove", list(paths)))
+
+    def move_path(self, old, new):
+        self.calls.append(("move", old, new))
+
+    def train_vector_index_if_due(self):
+        self.applied.set()
+
+
+def test_events_are_applied_in_order_with_creations_batched():
+    rag = FakeRAGManager()
+    indexer = BackgroundIndexer(lambda: rag)
+    events = [
+        ("created", "a.txt", None),
+        ("created", "docs/b.txt", None),
+        ("moved", "docs", "archive/docs"),
+        ("deleted", "a.txt", None),
+        ("created", "c.txt", None),
+        ("renamed", "c.txt", None)
+    ]
+    # Apply one burst directly, as the worker thread does after draining the queue
+    indexer._apply(rag, events)
+    assert rag.calls == [
+        ("index", ["a.txt", "docs/b.txt"]),
+        ("move", "docs", "archive/docs"),
+        ("remove", ["a.txt"]),
+        ("index", ["c.txt"])
+    ]
+
+
+def test_unavailable_rag_manager_is_retried_with_backoff(monkeypatch):
+    rag = FakeRAGManager()
+    attempts = []
+    delays = []
+
+    def get_rag_manager():
+        attempts.append(time.monotonic())
+        return rag if len(attempts) > 3 else None
+
+    monkeypatch.setattr(rag_indexer, "time", types.SimpleNamespace(sleep=delays.append))
+    indexer = BackgroundIndexer(get_rag_manager, retry_seconds=30, max_retry_seconds=90)
+    indexer.handle_change("created", "a.txt")
+    indexer.handle_change("deleted", "b.txt")
+    assert rag.applied.wait(5)
+
+    # One retry per delay rather than per event, doubling up to max_retry_seconds
+    assert delays == [30, 60, 90]
+    assert rag.calls == [("index", ["a.txt"]), ("remove", ["b.txt"])]
+
+
+def test_errors_do_not_stop_the_indexer():
+    rag = FakeRAGManager()
+
+    def remove_paths(paths):
+        raise OSError("locked")
+
+    rag.remove_paths = remove_paths
+    indexer = BackgroundIndexer(lambda: rag)
+    indexer.handle_change("deleted", "a.txt")
+    time.sleep(0.05)
+    indexer.handle_change("created", "b.txt")
+    assert rag.applied.wait(5)
+    assert rag.calls == [("index", ["b.txt"])]
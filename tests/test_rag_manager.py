@@ -0,0 +1,274 @@
+import os
+
+import pytest
+
+from conftest import write_upload
+
+REPORT = " ".join([
+    "The quarterly report covers revenue growth across all regions and product lines.",
+    "Customer satisfaction improved steadily while support tickets declined noticeably.",
+    "The board approved the new budget after a lengthy discussion about priorities."
+] * 3)
+
+INVOICE = ("Invoice number {number}. Customer: Acme Trading Ltd, 12 Main Street. Amount due: {amount} EUR. "
+           "Payment terms: 30 days net. Thank you for your business with us.")
+
+
+def stored_documents(rag):
+    return rag.vectorstore._collection.get(include=["documents"])["documents"]
+
+
+def test_edited_file_is_reindexed(rag):
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    # A small edit keeps every chunk a near-duplicate of the file's own previous version
+    write_upload(rag, "report.txt", REPORT.replace("after a lengthy", "after 99999 lengthy", 1))
+    rag.process_documents()
+
+    assert any("99999" in text for text in stored_documents(rag))
+    assert not any("after a lengthy" in text and "99999" not in text for text in stored_documents(rag))
+    results = rag.search_documents("99999", min_score=0.0)
+    assert results and "99999" in results[0]["content"]
+
+
+def test_templated_documents_with_different_numbers_are_kept(rag):
+    write_upload(rag, "invoice_1.txt", INVOICE.format(number=1001, amount=250))
+    write_upload(rag, "invoice_2.txt", INVOICE.format(number=1002, amount=975))
+    write_upload(rag, "invoice_3.txt", INVOICE.format(number=1001, amount=250) + " ")
+    rag.process_documents()
+
+    documents = stored_documents(rag)
+    assert sum("1001" in text for text in documents) == 1
+    assert sum("1002" in text for text in documents) == 1
+
+    results = rag.search_documents("invoice 1002 amount", min_score=0.0)
+    assert any("1002" in result["content"] for result in results)
+    results = rag.search_documents("invoice 1001 amount", min_score=0.0)
+    first = next(result for result in results if "1001" in result["content"])
+    assert first["sources"] == ["invoice_1.txt", "invoice_3.txt"]
+
+
+def test_min_score_applies_in_every_search_mode(rag):
+    write_upload(rag, "zoo.txt", "Zebra invoice 4711 for the zoo. The zebra invoice was paid in March.")
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    rag.config["search_mode"] = "vector"
+    best = rag.search_documents("zebra invoice", min_score=0.0)[0]
+    assert best["source"] == "zoo.txt"
+    similarity = best["relevance_score"]
+
+    for mode in ("hybrid", "lexical"):
+        rag.config["search_mode"] = mode
+        assert rag.search_documents("zebra invoice", min_score=similarity + 0.01) == []
+
+        results = rag.search_documents("zebra invoice", min_score=similarity - 0.01)
+        assert results and results[0]["source"] == "zoo.txt"
+        # relevance_score is cosine similarity in every mode, BM25 is reported separately
+        assert abs(results[0]["relevance_score"] - similarity) < 1e-4
+        assert results[0]["bm25_score"] > 0
+        assert all(result["relevance_score"] >= similarity - 0.01 for result in results)
+
+
+def test_edit_after_crash_before_manifest_save(rag):
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    # A run that stored chunks but crashed before saving the manifest
+    rag.manifest.remove("report.txt")
+    rag.manifest.save()
+    write_upload(rag, "report.txt", REPORT.replace("lengthy", "long"))
+    stats = rag.process_documents()
+
+    assert stats["total_chunks"] > 0
+    assert any("after a long discussion" in text for text in stored_documents(rag))
+    assert rag.search_documents("board approved budget", min_score=0.0)
+
+
+def test_duplicate_of_a_deleted_chunk_is_stored(rag):
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    # Vectors gone while the near-duplicate index still knows the chunks
+    rag.vectorstore.delete(ids=rag.vectorstore._collection.get(include=[])["ids"])
+    write_upload(rag, "copy.txt", REPORT)
+    rag.process_documents()
+
+    results = rag.search_documents("board approved budget", min_score=0.0)
+    assert results and results[0]["source"] == "copy.txt"
+
+
+def test_keyword_answers_do_not_run_the_embedding_model(rag, monkeypatch):
+    write_upload(rag, "zoo.txt", "Zebra invoice 4711 for the zoo. The zebra invoice was paid in March.")
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    def embed(*args):
+        raise AssertionError("embedding model called")
+
+    monkeypatch.setattr(rag.embeddings.embeddings, "embed_query", embed)
+    monkeypatch.setattr(rag.embeddings.embeddings, "embed_documents", embed)
+
+    # Lexical shortcut in hybrid mode: a short query fully matched by BM25
+    results = rag.search_documents("4711", min_score=0.0)
+    assert [result["source"] for result in results] == ["zoo.txt"]
+    assert results[0]["retrieval"] == "lexical"
+    assert 0 < results[0]["relevance_score"] <= 1
+    assert rag.search_documents("4711", min_score=results[0]["relevance_score"] + 0.01) == []
+
+    rag.config["search_mode"] = "lexical"
+    results = rag.search_many(["zebra invoice", "quarterly revenue growth"], min_score=0.0)
+    assert results[0][0]["source"] == "zoo.txt"
+    assert results[1][0]["source"] == "report.txt"
+
+
+def crash_on_marked_files(file_path):
+    """Loader for pool workers: kills the worker on files named *crash*"""
+    from rag_manager import load_document
+
+    if "crash" in file_path.name:
+        os._exit(1)
+    return load_document(file_path)
+
+
+def test_a_crashing_loader_fails_only_its_own_file(rag, monkeypatch):
+    import rag_manager
+
+    monkeypatch.setattr(rag_manager, "load_document", crash_on_marked_files)
+    rag.config["loader_workers"] = 2
+    names = ["a.txt", "b_crash.txt", "c.txt", "d.txt", "e.txt"]
+    for name in names:
+        write_upload(rag, name, f"Document {name} talks about topic {name} at length.")
+
+    stats = rag.process_documents()
+    assert (stats["processed_files"], stats["failed_files"]) == (4, 1)
+    assert "b_crash.txt" in stats["errors"][0]
+    assert sorted(rag.manifest.keys()) == ["a.txt", "c.txt", "d.txt", "e.txt"]
+
+
+def sources_for(rag, filters):
+    return sorted(result["metadata"]["relative_path"]
+                  for result in rag.search_documents("travel policy", top_k=10, min_score=0.0, filters=filters))
+
+
+def test_search_filters(rag):
+    rag.config["adaptive_k_ratio"] = 0.0
+    for path in ["root.txt", "hr/policy.txt", "hr/2024/leave.txt", "hrx/other.txt", "finance/budget.txt"]:
+        write_upload(rag, path, f"The travel policy for {path} explains costs, approvals and reimbursement.")
+    rag.process_documents()
+
+    assert sources_for(rag, {"folder": "hr"}) == ["hr/2024/leave.txt", "hr/policy.txt"]
+    assert sources_for(rag, {"folder": "/hr/2024/"}) == ["hr/2024/leave.txt"]
+    assert sources_for(rag, {"sources": ["finance/budget.txt", "root.txt"]}) == ["finance/budget.txt", "root.txt"]
+    assert sources_for(rag, {"folder": "hr", "file_type": "pdf"}) == []
+    assert sources_for(rag, {"folder": "missing"}) == []
+    with pytest.raises(ValueError):
+        rag.search_documents("travel policy", filters={"owner": "me"})
+
+    rag.remove_paths(["hr/2024"])
+    assert rag.manifest.folders_under("hr") == ["hr"]
+    assert sources_for(rag, {"folder": "hr"}) == ["hr/policy.txt"]
+
+
+def test_manifest_folders(tmp_path):
+    from rag_manager import IngestionManifest
+
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    for key in ["a.txt", "docs/b.txt", "docs/c.txt", "docs/sub/d.txt", "docsx/e.txt"]:
+        manifest.set(key, {"chunk_ids": []})
+    assert manifest.folders_under("docs") == ["docs", "docs/sub"]
+    assert manifest.folders_under("") == ["", "docs", "docs/sub", "docsx"]
+
+    manifest.remove("docs/b.txt")
+    assert manifest.folders_under("docs") == ["docs", "docs/sub"]
+    manifest.remove("docs/sub/d.txt")
+    assert manifest.folders_under("docs") == ["docs"]
+
+    manifest.save()
+    assert IngestionManifest(tmp_path / "manifest.json").folders_under("docs") == ["docs"]
+
+
+def test_unchanged_files_are_skipped(rag, monkeypatch):
+    import rag_manager
+
+    write_upload(rag, "report.txt", REPORT)
+    invoice = write_upload(rag, "invoice.txt", INVOICE.format(number=1001, amount=250))
+    stats = rag.process_documents()
+    assert (stats["processed_files"], stats["skipped_files"]) == (2, 0)
+    chunk_count = len(stored_documents(rag))
+
+    def load(file_path):
+        raise AssertionError(f"{file_path.name} loaded again")
+
+    load_document = rag_manager.load_document
+
+    # Same size and mtime, or only touched: nothing is loaded or embedded
+    monkeypatch.setattr(rag_manager, "load_document", load)
+    os.utime(invoice, (1_700_000_000, 1_700_000_000))
+    stats = rag.process_documents()
+    assert (stats["total_files"], stats["processed_files"], stats["skipped_files"]) == (2, 0, 2)
+    assert rag.manifest.get("invoice.txt")["mtime"] == 1_700_000_000
+    monkeypatch.setattr(rag_manager, "load_document", load_document)
+
+    # A restarted manager reads the manifest and still skips both files
+    reloaded = rag_manager.RAGManager(str(rag.base_dir))
+    reloaded.config["loader_workers"] = 1
+    assert reloaded.process_documents()["skipped_files"] == 2
+
+    write_upload(rag, "invoice.txt", INVOICE.format(number=1002, amount=975))
+    stats = rag.process_documents()
+    assert (stats["processed_files"], stats["skipped_files"]) == (1, 1)
+    documents = stored_documents(rag)
+    assert len(documents) == chunk_count
+    assert any("1002" in text for text in documents)
+    assert not any("1001" in text for text in documents)
+
+    invoice.unlink()
+    stats = rag.process_documents()
+    assert stats["removed_files"] == 1
+    assert rag.manifest.keys() == ["report.txt"]
+    assert not any("Invoice" in text for text in stored_documents(rag))
+
+
+def test_moves_retag_chunks_without_reembedding(rag, monkeypatch):
+    write_upload(rag, "docs/report.txt", REPORT)
+    write_upload(rag, "docs/invoice.txt", INVOICE.format(number=1001, amount=250))
+    rag.process_documents()
+
+    def embed(*args):
+        raise AssertionError("embedding model called")
+
+    embed_documents = rag.embeddings.embeddings.embed_documents
+    monkeypatch.setattr(rag.embeddings.embeddings, "embed_documents", embed)
+    (rag.uploads_dir / "archive").mkdir()
+    (rag.uploads_dir / "docs").rename(rag.uploads_dir / "archive" / "docs")
+    assert rag.move_path("docs", "archive/docs") == 2
+    assert sorted(rag.manifest.keys()) == ["archive/docs/invoice.txt", "archive/docs/report.txt"]
+    results = rag.search_documents("board approved budget", min_score=0.0, filters={"folder": "archive"})
+    assert results[0]["metadata"]["relative_path"] == "archive/docs/report.txt"
+    assert rag.search_documents("board approved budget", min_score=0.0, filters={"folder": "docs"}) == []
+
+    monkeypatch.setattr(rag.embeddings.embeddings, "embed_documents", embed_documents)
+    write_upload(rag, "new.txt", "Freshly uploaded note about the zebra invoice.")
+    assert rag.index_paths(["new.txt"])["processed_files"] == 1
+    assert rag.remove_paths(["archive"]) == 2
+    assert rag.manifest.keys() == ["new.txt"]
+    assert [result["source"] for result in rag.search_documents("board approved budget", min_score=0.0)] == ["new.txt"]
+
+
+def test_mmr_keeps_near_identical_chunks_from_crowding_results(rag):
+    rag.config.update(adaptive_k_ratio=0.0, search_mode="vector")
+    for number in (1001, 1002, 1003):
+        write_upload(rag, f"invoice_{number}.txt", INVOICE.format(number=number, amount=250))
+    write_upload(rag, "report.txt", REPORT)
+    rag.process_documents()
+
+    rag.config["mmr_enabled"] = False
+    plain = [result["source"] for result in rag.search_documents("invoice amount due", top_k=2, min_score=-1.0)]
+    assert plain[0].startswith("invoice") and plain[1].startswith("invoice")
+
+    rag.config.update(mmr_enabled=True, mmr_lambda=0.3)
+    diverse = [result["source"] for result in rag.search_documents("invoice amount due", top_k=2, min_score=-1.0)]
+    assert diverse[0] == plain[0]
+    assert diverse[1] == "report.txt"
@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag-service"))
+
+from rag_client import RAGServiceError, RemoteRAGManager
+from models.pending_request import PendingRequest
+from services.batcher import MicroBatcher
+from services.rag_service import RAGService
+
+
+def submit_all(submit, payloads):
+    """Submit payloads from one thread each; returns results (or exceptions) in payload order"""
+    results = [None] * len(payloads)
+
+    def run(i):
+        try:
+            results[i] = submit(payloads[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(payloads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_requests_queued_during_a_batch_are_handled_together():
+    first_batch = threading.Event()
+    release = threading.Event()
+    sizes = []
+
+    def handler(batch):
+        sizes.append(len(batch))
+        first_batch.set()
+        release.wait(5)
+        for request in batch:
+            request.set_result(request.payload["n"] * 2)
+
+    batcher = MicroBatcher(handler, max_batch_size=4, max_batch_wait_ms=0)
+    blocker = threading.Thread(target=batcher.submit, args=({"n": 0},))
+    blocker.start()
+    assert first_batch.wait(5)
+
+    results = []
+    pending = threading.Thread(target=lambda: results.extend(submit_all(batcher.submit, [{"n": n} for n in range(1, 7)])))
+    pending.start()
+    while batcher.stats()["queued"] < 6:
+        time.sleep(0.001)
+    release.set()
+    pending.join(5)
+    blocker.join(5)
+
+    assert results == [n * 2 for n in range(1, 7)]
+    assert sizes == [1, 4, 2]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["requests"], stats["largest_batch"]) == (3, 7, 4)
+
+
+def test_requests_within_the_wait_window_share_a_batch():
+    sizes = []
+
+    def handler(batch):
+        sizes.append(len(batch))
+        for request in batch:
+            request.set_result(None)
+
+    batcher = MicroBatcher(handler, max_batch_size=32, max_batch_wait_ms=200)
+    submit_all(batcher.submit, [{}] * 5)
+    assert sum(sizes) == 5 and len(sizes) < 5
+
+
+def test_handler_errors_reach_every_caller():
+    def failing(batch):
+        raise RuntimeError("model crashed")
+
+    results = submit_all(MicroBatcher(failing, max_batch_wait_ms=0).submit, [{}, {}])
+    assert all(isinstance(result, RuntimeError) and "model crashed" in str(result) for result in results)
+
+    # A request the handler forgot to answer fails instead of hanging
+    with pytest.raises(RuntimeError, match="not answered"):
+        MicroBatcher(lambda batch: None, max_batch_wait_ms=0).submit({})
+
+
+class FakeRAGManager:
+    def __init__(self):
+        self.calls = []
+
+    def search_many(self, queries, top_k=None, min_score=None, filters=None):
+        self.calls.append((list(queries), top_k))
+        if filters == {"bad": True}:
+            raise ValueError("Unsupported filter: bad")
+        if filters == {"boom": True}:
+            raise RuntimeError("index corrupted")
+        return [[{"content": query, "top_k": top_k}] for query in queries]
+
+    def is_ready(self):
+        return True
+
+    def get_database_stats(self):
+        return {"status": "ready"}
+
+    def process_documents(self, progress_callback=None, cancel_event=None):
+        progress_callback(50, "Halfway")
+        return {"processed_files": 1, "cancelled": cancel_event.is_set()}
+
+
+def test_searches_with_the_same_parameters_become_one_call():
+    rag = FakeRAGManager()
+    service = RAGService(rag)
+    requests = [
+        PendingRequest({"queries": ["a"], "top_k": 3, "min_score": None, "filters": None}),
+        PendingRequest({"queries": ["x"], "top_k": 5, "min_score": None, "filters": None}),
+        PendingRequest({"queries": ["b", "c"], "top_k": 3, "min_score": None, "filters": None}),
+        PendingRequest({"queries": ["y"], "top_k": 5, "min_score": None, "filters": {"bad": True}})
+    ]
+    service._search_batch(requests)
+
+    assert rag.calls == [(["a", "b", "c"], 3), (["x"], 5), (["y"], 5)]
+    assert [[hits[0]["content"] for hits in request.wait()] for request in requests[:3]] == [["a"], ["x"], ["b", "c"]]
+    # A failing group does not affect the others
+    with pytest.raises(ValueError):
+        requests[3].wait()
+
+
+def test_remote_calls_over_the_socket(tmp_path):
+    rag = FakeRAGManager()
+    service = RAGService(rag, max_batch_wait_ms=0)
+    socket_path = str(tmp_path / "rag.sock")
+    threading.Thread(target=service.serve_forever, args=(socket_path,), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(socket_path):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    remote = RemoteRAGManager(socket_path, timeout=5)
+    assert remote.is_ready()
+    assert remote.search_documents("hello", top_k=2) == [{"content": "hello", "top_k": 2}]
+    assert remote.get_database_stats()["rag_service"]["requests"] == 1
+
+    progress = []
+    stats = remote.process_documents(lambda value, status: progress.append((value, status)))
+    assert stats == {"processed_files": 1, "cancelled": False}
+    assert progress == [(50, "Halfway")]
+
+    # Invalid input keeps its type, other failures become RAGServiceError
+    with pytest.raises(ValueError):
+        remote.search_documents("hello", filters={"bad": True})
+    with pytest.raises(RAGServiceError, match="index corrupted"):
+        remote.search_documents("hello", filters={"boom": True})
@@ -0,0 +1,98 @@
+import threading
+
+from stream_coalescer import StreamCoalescer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def coalescer(interval=0.04, max_bytes=512):
+    frames = []
+    clock = Clock()
+    stream = StreamCoalescer(frames.append, "m1", interval=interval, max_bytes=max_bytes, clock=clock)
+    return stream, frames, clock
+
+
+def contents(frames):
+    return [frame["content"] for frame in frames]
+
+
+def test_first_delta_is_sent_at_once():
+    stream, frames, clock = coalescer()
+    stream.add("Hello")
+    assert frames == [{"message_id": "m1", "content": "Hello", "done": False}]
+
+
+def test_deltas_are_buffered_until_the_interval_passes():
+    stream, frames, clock = coalescer()
+    stream.add("a")
+    clock.now = 0.01
+    stream.add("b")
+    stream.add("")
+    clock.now = 0.03
+    stream.add("c")
+    assert contents(frames) == ["a"]
+
+    clock.now = 0.05
+    stream.add("d")
+    assert contents(frames) == ["a", "bcd"]
+
+
+def test_max_bytes_flushes_early():
+    stream, frames, clock = coalescer(max_bytes=4)
+    stream.add("a")
+    stream.add("é")
+    stream.add("é")
+    assert contents(frames) == ["a", "éé"]
+
+
+def test_deadline_flush_sends_text_buffered_during_a_pause():
+    stream, frames, clock = coalescer()
+    stream.add("a")
+    clock.now = 0.01
+    stream.add("b")
+    stream.flush_if_due()
+    assert contents(frames) == ["a"]
+
+    # The model pauses: no delta arrives, the timer sends what is waiting
+    clock.now = 0.05
+    stream.flush_if_due()
+    assert contents(frames) == ["a", "b"]
+    stream.flush_if_due()
+    assert contents(frames) == ["a", "b"]
+
+
+def test_flush_sends_the_rest_without_empty_frames():
+    stream, frames, clock = coalescer()
+    stream.add("a")
+    stream.add("b")
+    stream.flush()
+    stream.flush()
+    assert contents(frames) == ["a", "b"]
+    assert stream.frames == 2
+
+
+def test_concurrent_deadline_flushes_keep_the_text_in_order():
+    frames = []
+    stream = StreamCoalescer(frames.append, "m1", interval=0, max_bytes=1 << 20)
+    done = threading.Event()
+
+    def tick():
+        while not done.is_set():
+            stream.flush_if_due()
+
+    ticker = threading.Thread(target=tick)
+    ticker.start()
+    deltas = [f"{index} " for index in range(5000)]
+    for delta in deltas:
+        stream.add(delta)
+    done.set()
+    ticker.join()
+    stream.flush()
+    assert "".join(contents(frames)) == "".join(deltas)
+    assert all(contents(frames))